@@ -1,17 +1,42 @@
 import os
+import tempfile
 from datetime import datetime, timedelta
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, jsonify, redirect, request, send_file, send_from_directory
 from flask_cors import CORS
 from dotenv import load_dotenv
+from PIL import Image
 
 from .extensions import db, jwt
 from .models.user import User
 from .models.application import Application
 from .models.news import News
+from .models.stats import StatSummary
+from .models.idempotency import IdempotencyKey
+from .models.image_metadata import ImageMetadata
 from .routes.auth import auth_bp
 from .routes.public import public_bp
 from .routes.admin import admin_bp
 from .routes.events import events_bp
+from .routes.metrics import metrics_bp
+from .routes.uploads import uploads_bp
+from .utils.stats import init_stats_listeners, ensure_stats
+from .utils.request_timing import init_request_timing
+from .utils.metrics import init_metrics
+from .utils.profiler import init_profiler
+from .utils.slow_queries import init_slow_query_log
+from .utils.memory import init_memory_diagnostics
+from .utils.logging_setup import init_logging, parse_mapping
+from .utils.rate_limit import init_rate_limit, parse_rules
+from .utils.idempotency import ensure_schema as ensure_idempotency_schema, init_idempotency
+from .utils.load_shedding import init_load_shedding
+from .utils.uploads import init_uploads
+from .utils.storage import init_storage
+from .utils.upload_gc import init_upload_gc
+from .utils.backup import init_backup
+from .utils.db_routing import init_db_routing
+from .utils.view_counts import init_view_counts
+from .utils import image_variants, storage
+from .utils.image_variants import init_image_variants
 
 
 def create_app():
@@ -20,15 +45,109 @@ def create_app():
 
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///slac.db")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    # Limites de subida para formularios/archivos (evita 413)
-    app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH_MB", "32")) * 1024 * 1024
-    # Werkzeug usa este límite para datos de formulario en memoria
+    # Lecturas públicas: réplica, "primary" (sin enrutar) o, sin valor, una conexión de solo lectura al SQLite
+    app.config["DATABASE_READ_URL"] = os.getenv("DATABASE_READ_URL")
+    app.config["SQLITE_WAL"] = os.getenv("SQLITE_WAL", "1").lower() not in ("0", "false", "no")
+    app.config["DB_READ_POOL_SIZE"] = int(os.getenv("DB_READ_POOL_SIZE", "5"))
+    # Techo absoluto del cuerpo de una request (los límites por ruta van en BODY_LIMITS)
+    app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH_MB", "64")) * 1024 * 1024
+    # Campos de texto de formularios (en memoria); los archivos se escriben a disco
     app.config["MAX_FORM_MEMORY_SIZE"] = int(os.getenv("MAX_FORM_MEMORY_SIZE_MB", "32")) * 1024 * 1024
+    # Límite para rutas sin entrada en BODY_LIMITS (JSON: login, inscripciones, etc.)
+    app.config["BODY_LIMIT_DEFAULT"] = int(os.getenv("BODY_LIMIT_DEFAULT_KB", "1024")) * 1024
+    # Límites por endpoint en MB, p. ej. "public.create_application=61,public.news_create=11"
+    body_limits = {
+        "public.create_application": 61,  # 3 PDFs de 20 MB + campos
+        "public.news_create": 11,
+        "admin.edit_news": 11,
+        "admin.admin_events_upload_image": 11,
+    }
+    body_limits.update(parse_mapping(os.getenv("BODY_LIMITS_MB"), int))
+    app.config["BODY_LIMITS"] = {endpoint: mb * 1024 * 1024 for endpoint, mb in body_limits.items()}
+    # Subidas por fragmentos: tamaño máximo de cada PUT y vida de una sesión sin terminar
+    app.config["UPLOAD_CHUNK_SIZE"] = int(os.getenv("UPLOAD_CHUNK_SIZE_MB", "8")) * 1024 * 1024
+    app.config["UPLOAD_SESSION_TTL"] = int(os.getenv("UPLOAD_SESSION_TTL", "86400"))
+    # Bytes reservados por subidas sin terminar: en total y por usuario/IP (el volumen también guarda la base)
+    app.config["UPLOAD_STAGING_MAX_BYTES"] = int(os.getenv("UPLOAD_STAGING_MAX_MB", "200")) * 1024 * 1024
+    app.config["UPLOAD_STAGING_PER_CLIENT_BYTES"] = int(os.getenv("UPLOAD_STAGING_PER_CLIENT_MB", "60")) * 1024 * 1024
+    app.config["BODY_LIMITS"].setdefault("uploads.upload_chunk", app.config["UPLOAD_CHUNK_SIZE"])
     
     # JWT Configuration para Flask-JWT-Extended 4.6.0
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET", "change-this-secret")
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(days=3)
 
+    # Logging estructurado (JSON) vía QueueHandler/QueueListener
+    app.config["LOG_LEVEL"] = os.getenv("LOG_LEVEL", "INFO").upper()
+    app.config["LOG_FORMAT"] = os.getenv("LOG_FORMAT", "json")
+    # Niveles por logger, p. ej. "app.request=WARNING,sqlalchemy.engine=INFO"
+    app.config["LOG_LEVELS"] = parse_mapping(os.getenv("LOG_LEVELS"))
+    app.config["LOG_DEBUG_SAMPLE_RATE"] = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1"))
+    # Muestreo de líneas < WARNING por logger, p. ej. "app.request=0.1"
+    app.config["LOG_SAMPLING"] = parse_mapping(os.getenv("LOG_SAMPLING"), float)
+    app.config["LOG_FILE"] = os.getenv("LOG_FILE")
+    # stdout (por defecto) o stderr
+    app.config["LOG_STREAM"] = os.getenv("LOG_STREAM", "stdout").lower()
+
+    # Instrumentación por request (Server-Timing + log estructurado)
+    app.config["SERVER_TIMING_ENABLED"] = os.getenv("SERVER_TIMING_ENABLED", "1").lower() in ("1", "true", "yes")
+    # Máximo de queries SQL por request antes de registrar un warning (0 desactiva)
+    app.config["REQUEST_QUERY_BUDGET"] = int(os.getenv("REQUEST_QUERY_BUDGET", "20"))
+    app.config["REQUEST_LOG_LEVEL"] = os.getenv("REQUEST_LOG_LEVEL", "INFO").upper()
+
+    # Métricas Prometheus compartidas entre workers (endpoint deshabilitado sin token)
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+    app.config["METRICS_DIR"] = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "slacc-metrics"))
+    app.config["METRICS_FLUSH_INTERVAL"] = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+    # Profiler por muestreo: bajo demanda (token firmado) o aleatorio con PROFILE_SAMPLE_RATE
+    app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "slacc-profiles"))
+    app.config["PROFILE_SECRET"] = os.getenv("PROFILE_SECRET")
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    app.config["PROFILE_INTERVAL_MS"] = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    app.config["PROFILE_MAX_FILES"] = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+    # Log de queries lentas con EXPLAIN (agregado entre workers)
+    app.config["SLOW_QUERY_MS"] = float(os.getenv("SLOW_QUERY_MS", "100"))
+    app.config["SLOW_QUERY_LOG_INTERVAL"] = float(os.getenv("SLOW_QUERY_LOG_INTERVAL", "60"))
+    app.config["SLOW_QUERY_DIR"] = os.getenv("SLOW_QUERY_DIR", os.path.join(tempfile.gettempdir(), "slacc-slow-queries"))
+
+    # Diagnóstico de memoria por worker (RSS compartido entre workers)
+    app.config["MEMORY_DIR"] = os.getenv("MEMORY_DIR", os.path.join(tempfile.gettempdir(), "slacc-memory"))
+
+    # Rate limiting por IP/email (token bucket en SQLite compartido entre workers)
+    app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+    app.config["RATELIMIT_DB"] = os.getenv("RATELIMIT_DB", os.path.join(tempfile.gettempdir(), "slacc-ratelimit.db"))
+    # Proxies delante de la app cuyo X-Forwarded-For es confiable (Render: 1)
+    app.config["RATELIMIT_PROXY_COUNT"] = int(os.getenv("RATELIMIT_PROXY_COUNT", "0"))
+    # Reglas "ruta.dimensión=capacidad/segundos", p. ej. "login.ip=20/60,login.email=5/300"
+    app.config["RATELIMIT_RULES"] = parse_rules(os.getenv("RATELIMIT_RULES"))
+
+    # Segundos durante los que se repite la respuesta de un POST con Idempotency-Key
+    app.config["IDEMPOTENCY_TTL"] = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+    # Reserva de una clave mientras corre la request original (vence si el worker muere)
+    app.config["IDEMPOTENCY_LEASE"] = int(os.getenv("IDEMPOTENCY_LEASE", "60"))
+
+    # Deadline por request (desde X-Request-Start del proxy) y descarte de rutas de baja prioridad
+    app.config["REQUEST_DEADLINE_MS"] = int(os.getenv("REQUEST_DEADLINE_MS", "25000"))
+    app.config["SHED_QUEUE_WAIT_MS"] = int(os.getenv("SHED_QUEUE_WAIT_MS", "1000"))
+    # Solo si el proxy reemplaza X-Request-Start del cliente por el suyo
+    app.config["SHED_TRUST_REQUEST_START"] = os.getenv("SHED_TRUST_REQUEST_START", "0").lower() in ("1", "true", "yes")
+    # Tope de cada muestra de espera en la media móvil
+    app.config["SHED_MAX_WAIT_SAMPLE_MS"] = int(os.getenv("SHED_MAX_WAIT_SAMPLE_MS", "2000"))
+    # Requests simultáneas por proceso antes de descartar (0 = sin límite; gunicorn sync atiende 1)
+    app.config["SHED_MAX_IN_FLIGHT"] = int(os.getenv("SHED_MAX_IN_FLIGHT", "0"))
+    app.config["SHED_LOW_PRIORITY"] = tuple(
+        e.strip() for e in os.getenv("SHED_LOW_PRIORITY", "public.instagram_recent,public.members_list").split(",") if e.strip()
+    )
+
+    # Variantes redimensionadas de /uploads (?w=&fmt=) y su cache LRU en disco
+    app.config["IMAGE_VARIANT_WIDTHS"] = tuple(
+        int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "160,320,400,640,960,1280").split(",") if w.strip()
+    )
+    app.config["IMAGE_CACHE_MAX_BYTES"] = int(os.getenv("IMAGE_CACHE_MAX_MB", "100")) * 1024 * 1024
+    # Tamaño objetivo de las imágenes subidas: se baja la calidad hasta caber (0 = sin objetivo)
+    app.config["IMAGE_BYTE_BUDGET"] = int(os.getenv("IMAGE_BYTE_BUDGET_KB", "350")) * 1024
+
     # CORS Configuration
     cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:5174")
     origins_list = [origin.strip() for origin in cors_origins.split(",")]
@@ -36,23 +155,80 @@ def create_app():
         r"/api/*": {
             "origins": origins_list,
             "supports_credentials": True,
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Profile", "X-Request-ID", "Idempotency-Key", "Upload-Offset", "X-Chunk-SHA256"],
+            "expose_headers": ["Server-Timing", "X-Profile-Id", "X-Request-ID", "Idempotent-Replayed", "Upload-Offset"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
         }
     })
 
-    # Uploads (simula bucket)
+    # Uploads: UPLOAD_DIR recibe y procesa los archivos; con STORAGE_BACKEND=local también los guarda
     app.config["UPLOAD_DIR"] = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "..", "uploads"))
     upload_dir = os.path.abspath(app.config["UPLOAD_DIR"]) 
     os.makedirs(upload_dir, exist_ok=True)
 
+    # Almacenamiento de los archivos aceptados: local o s3 (AWS, R2, MinIO...)
+    app.config["STORAGE_BACKEND"] = os.getenv("STORAGE_BACKEND", "local").strip().lower()
+    app.config["S3_BUCKET"] = os.getenv("S3_BUCKET")
+    app.config["S3_PREFIX"] = os.getenv("S3_PREFIX", "uploads")
+    app.config["S3_ENDPOINT_URL"] = os.getenv("S3_ENDPOINT_URL")
+    app.config["S3_REGION"] = os.getenv("S3_REGION")
+    # Sin estas, boto3 usa su cadena habitual (AWS_ACCESS_KEY_ID, rol de la instancia...)
+    app.config["S3_ACCESS_KEY_ID"] = os.getenv("S3_ACCESS_KEY_ID")
+    app.config["S3_SECRET_ACCESS_KEY"] = os.getenv("S3_SECRET_ACCESS_KEY")
+    # CDN o bucket público; sin ella /uploads redirige a URLs prefirmadas
+    app.config["STORAGE_PUBLIC_URL"] = os.getenv("STORAGE_PUBLIC_URL")
+    app.config["STORAGE_URL_TTL"] = int(os.getenv("STORAGE_URL_TTL", "3600"))
+    # Cuota del volumen para el reporte de uso (el disco de Render es de 1 GB)
+    app.config["STORAGE_QUOTA_BYTES"] = int(os.getenv("STORAGE_QUOTA_MB", "1024")) * 1024 * 1024
+
+    # GC de archivos huérfanos: un lote cada GC_INTERVAL segundos (0 = solo por script)
+    app.config["GC_INTERVAL"] = int(os.getenv("GC_INTERVAL", "300"))
+    app.config["GC_BATCH_SIZE"] = int(os.getenv("GC_BATCH_SIZE", "200"))
+    app.config["GC_MIN_AGE"] = int(os.getenv("GC_MIN_AGE", "3600"))
+    app.config["GC_QUARANTINE_DAYS"] = int(os.getenv("GC_QUARANTINE_DAYS", "7"))
+
+    # Respaldos en línea de la base y los archivos (ver utils/backup.py)
+    # Sin valor no hay respaldos: debe estar en otro disco que UPLOAD_DIR (o BACKUP_ALLOW_SAME_DISK=1)
+    app.config["BACKUP_DIR"] = os.getenv("BACKUP_DIR")
+    app.config["BACKUP_ALLOW_SAME_DISK"] = os.getenv("BACKUP_ALLOW_SAME_DISK", "0").lower() in ("1", "true", "yes")
+    # Espacio libre que un respaldo nunca consume en el disco destino
+    app.config["BACKUP_MIN_FREE_BYTES"] = int(os.getenv("BACKUP_MIN_FREE_MB", "100")) * 1024 * 1024
+    app.config["BACKUP_KEEP"] = int(os.getenv("BACKUP_KEEP", "7"))
+    # Cada cuántos snapshots se archiva de nuevo el total de los archivos
+    app.config["BACKUP_FULL_EVERY"] = int(os.getenv("BACKUP_FULL_EVERY", "7"))
+    app.config["BACKUP_PAGES"] = int(os.getenv("BACKUP_PAGES", "256"))
+
+    # Contadores de vistas: en memoria por worker, escritos en lote cada VIEW_FLUSH_INTERVAL segundos
+    app.config["VIEW_FLUSH_INTERVAL"] = int(os.getenv("VIEW_FLUSH_INTERVAL", "30"))
+    app.config["VIEW_RETENTION_DAYS"] = int(os.getenv("VIEW_RETENTION_DAYS", "90"))
+    app.config["POPULAR_CACHE_TTL"] = int(os.getenv("POPULAR_CACHE_TTL", "300"))
+
+    init_logging(app)
+    init_uploads(app)
+    init_storage(app)
+    init_image_variants(app)
+    init_db_routing(app)
     db.init_app(app)
     jwt.init_app(app)
+    init_stats_listeners()
+    init_request_timing(app)
+    init_metrics(app)
+    init_load_shedding(app)
+    init_profiler(app)
+    init_slow_query_log(app)
+    init_memory_diagnostics(app)
+    init_rate_limit(app)
+    init_idempotency(app)
+    init_upload_gc(app)
+    init_backup(app)
+    init_view_counts(app)
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(public_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(events_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(uploads_bp)
 
     @app.get("/api/health")
     def health():
@@ -62,7 +238,9 @@ def create_app():
 
     with app.app_context():
         db.create_all()
+        ensure_idempotency_schema()
         _bootstrap_owner()
+        ensure_stats()
 
     return app
 
@@ -93,7 +271,32 @@ def _register_static_uploads(app: Flask):
     upload_dir = os.path.abspath(app.config["UPLOAD_DIR"]) 
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        return send_from_directory(upload_dir, filename)
+        # Archivos ocultos (p. ej. .incoming/, subidas en curso) no se sirven
+        if any(part.startswith(".") for part in filename.split("/")):
+            return jsonify({"message": "No encontrado"}), 404
+        # Variante redimensionada: /uploads/<file>?w=400&fmt=webp
+        try:
+            variant = image_variants.parse_request(filename, request.args)
+        except image_variants.VariantError as e:
+            return jsonify({"error": str(e)}), 400
+        store = storage.get_storage()
+        if variant is None:
+            if store.serves_files:
+                return send_from_directory(upload_dir, filename)
+            # El archivo está en el bucket: redirigir sin pasar los bytes por el worker
+            response = redirect(store.url(filename), 302)
+            response.cache_control.public = True
+            response.cache_control.max_age = 300 if store.public_url is None else 24 * 3600
+            return response
+        width, fmt = variant
+        try:
+            path = image_variants.get_variant(filename, width, fmt)
+        except FileNotFoundError:
+            return jsonify({"message": "No encontrado"}), 404
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            app.logger.warning("No se pudo generar la variante de %s: %s", filename, e)
+            return jsonify({"error": "No se pudo procesar la imagen"}), 422
+        return send_file(path, mimetype=image_variants.mimetype(fmt), max_age=30 * 24 * 3600, conditional=True)
     
     # También registrar como ruta estática para mayor compatibilidad
     app.static_folder = upload_dir
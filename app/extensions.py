@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
+from .utils.db_routing import RoutingSession
 
-db = SQLAlchemy()
+# Lecturas de vistas @read_only al bind "read" (ver utils/db_routing.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 jwt = JWTManager()
 
 
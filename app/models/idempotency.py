@@ -0,0 +1,20 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class IdempotencyKey(db.Model):
+  """Primera respuesta de un POST enviado con ``Idempotency-Key``, para repetirla en reintentos.
+
+  status: pending (la request original sigue en curso) | done
+  """
+  __tablename__ = "idempotency_key"
+
+  key_hash = db.Column(db.String(64), primary_key=True)  # sha256(ruta + cliente + key)
+  scope = db.Column(db.String(100), nullable=False)  # "POST /api/events/3/enroll ip:1.2.3.4"
+  request_hash = db.Column(db.String(64))  # sha256 del cuerpo y los campos del formulario
+  status = db.Column(db.String(20), nullable=False, default="pending")
+  response_status = db.Column(db.Integer)
+  response_body = db.Column(db.Text)
+  response_mimetype = db.Column(db.String(100))
+  created_at = db.Column(db.DateTime, default=datetime.utcnow)
+  expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,24 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class ImageMetadata(db.Model):
+  """Datos de layout de una imagen subida, para reservar espacio y mostrar un placeholder."""
+  __tablename__ = "image_metadata"
+
+  file_url = db.Column(db.String(500), primary_key=True)  # "/uploads/<archivo>"
+  width = db.Column(db.Integer)
+  height = db.Column(db.Integer)
+  bytes = db.Column(db.Integer)
+  dominant_color = db.Column(db.String(7))  # "#rrggbb"
+  lqip = db.Column(db.Text)  # data URI WebP de ~16px
+  created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+  def to_dict(self):
+    return {
+      "width": self.width,
+      "height": self.height,
+      "bytes": self.bytes,
+      "dominant_color": self.dominant_color,
+      "lqip": self.lqip,
+    }
@@ -0,0 +1,16 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class StatSummary(db.Model):
+  """Agregados del dashboard admin, mantenidos incrementalmente en cada escritura.
+
+  scope: applications (key = status) | members (key = membership_type) | event (key = event_id)
+  """
+  __tablename__ = "stat_summary"
+
+  scope = db.Column(db.String(30), primary_key=True)
+  key = db.Column(db.String(50), primary_key=True)
+  count = db.Column(db.Integer, nullable=False, default=0)
+  total = db.Column(db.Float, nullable=False, default=0)  # Monto acumulado (ingresos por evento)
+  updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,18 @@
+from ..extensions import db
+
+
+class ViewCount(db.Model):
+  """Vistas de una noticia o evento por hora, escritas en lotes por utils/view_counts.py.
+
+  hour: horas desde epoch (UTC), así cualquier ventana móvil es un rango de enteros
+  """
+  __tablename__ = "view_count"
+
+  entity = db.Column(db.String(20), primary_key=True)  # news | event
+  entity_id = db.Column(db.Integer, primary_key=True)
+  hour = db.Column(db.Integer, primary_key=True)
+  count = db.Column(db.Integer, nullable=False, default=0)
+
+  __table_args__ = (
+    db.Index("ix_view_count_entity_hour", "entity", "hour"),
+  )
@@ -1,6 +1,6 @@
 import os
 from datetime import datetime, timezone
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import func
 from ..extensions import db
@@ -8,11 +8,30 @@ from ..models.application import Application
 from ..models.news import News
 from ..models.user import User
 from ..models.event import Event, EventEnrollment
+from ..utils.file_validation import validate_image
 from ..utils.image_processing import process_uploaded_image
+from ..utils.uploads import save_upload
+from ..utils import backup, image_metadata, storage, upload_gc
+from ..utils.stats import drop_event_stats, get_stats
+from ..utils.profiler import SAFE_NAME, issue_token, list_profiles
+from ..utils.slow_queries import top_offenders
+from ..utils import memory
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
 
 
+@admin_bp.get("/stats")
+@jwt_required()
+def admin_stats():
+  """Agregados del dashboard desde las filas de resumen (una sola consulta)"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  return jsonify(get_stats())
+
+
 @admin_bp.get("/applications")
 @jwt_required()
 def list_applications():
@@ -277,22 +296,24 @@ def edit_news(news_id):
                 filepath = os.path.join(current_app.config["UPLOAD_DIR"], filename)
                 
                 # Guardar la nueva imagen
-                image_file.save(filepath)
+                save_upload(image_file, filepath)
+                
+                # Validar tipo y dimensiones antes de decodificar
+                is_valid, result = validate_image(filepath)
+                if not is_valid:
+                    os.remove(filepath)
+                    return jsonify({"error": f"Imagen inválida: {result}"}), 400
                 
                 # Optimize the image
-                optimize_success, optimize_msg = process_uploaded_image(filepath, max_width=1920, max_height=1080, quality=85)
+                meta = {}
+                optimize_success, optimize_msg, filepath = process_uploaded_image(filepath, max_width=1920, max_height=1080, quality=85, metadata=meta)
                 if optimize_success:
-                    print(f"Image optimized: {optimize_msg}")
-                
-                # Eliminar imagen anterior si existe
-                if news.image_url and os.path.exists(os.path.join(current_app.config["UPLOAD_DIR"], news.image_url.lstrip('/uploads/'))):
-                    try:
-                        os.remove(os.path.join(current_app.config["UPLOAD_DIR"], news.image_url.lstrip('/uploads/')))
-                    except OSError:
-                        pass
+                    current_app.logger.debug("Image optimized: %s", optimize_msg)
                 
-                # Actualizar URL de la imagen
-                news.image_url = f"/uploads/{filename}"
+                # Actualizar URL de la imagen (la anterior queda en cuarentena tras el commit)
+                image_metadata.forget(news.image_url)
+                news.image_url = storage.store(filepath)
+                image_metadata.record(news.image_url, meta)
         
         db.session.commit()
         return jsonify({"message": "Noticia actualizada correctamente"})
@@ -553,14 +574,23 @@ def admin_events_upload_image(event_id: int):
   filename = f"event-{uuid.uuid4().hex}.{f.filename.rsplit('.', 1)[-1].lower()}"
   upload_dir = os.path.abspath(current_app.config["UPLOAD_DIR"]) 
   path = os.path.join(upload_dir, filename)
-  f.save(path)
+  save_upload(f, path)
+
+  # Validar tipo y dimensiones antes de decodificar
+  is_valid, result = validate_image(path)
+  if not is_valid:
+    os.remove(path)
+    return jsonify({"error": f"Imagen inválida: {result}"}), 400
   
   # Optimize the image
-  optimize_success, optimize_msg = process_uploaded_image(path, max_width=1920, max_height=1080, quality=85)
+  meta = {}
+  optimize_success, optimize_msg, path = process_uploaded_image(path, max_width=1920, max_height=1080, quality=85, metadata=meta)
   if optimize_success:
-    print(f"Image optimized: {optimize_msg}")
+    current_app.logger.debug("Image optimized: %s", optimize_msg)
   
-  event.image_url = f"/uploads/{filename}"
+  image_metadata.forget(event.image_url)
+  event.image_url = storage.store(path)
+  image_metadata.record(event.image_url, meta)
   db.session.commit()
   return jsonify({"image_url": event.image_url})
 
@@ -576,7 +606,10 @@ def admin_events_delete(event_id: int):
   
   # Delete associated enrollments first (cascade delete)
   EventEnrollment.query.filter_by(event_id=event_id).delete()
+  # El borrado masivo no pasa por el ORM: quitar también su resumen
+  drop_event_stats(event_id)
   
+  # Su imagen queda en cuarentena tras el commit (upload_gc)
   db.session.delete(event)
   db.session.commit()
   return jsonify({"message": "Eliminado"})
@@ -682,3 +715,204 @@ def admin_create_member():
   })
   return jsonify(resp), 201
 
+
+# ===== Profiling =====
+@admin_bp.post("/profiles/token")
+@jwt_required()
+def admin_profile_token():
+  """Emite un token firmado de un solo uso para perfilar una request (header X-Profile)"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  data = request.get_json(silent=True) or {}
+  method = str(data.get("method") or "GET").upper()
+  path = data.get("path")
+  if method not in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+    return jsonify({"error": "method inválido"}), 400
+  if not isinstance(path, str) or not path.startswith("/"):
+    return jsonify({"error": "path es requerido y debe empezar con /"}), 400
+  ttl = data.get("ttl_seconds", 600)
+  if isinstance(ttl, bool) or not isinstance(ttl, int) or not 1 <= ttl <= 3600:
+    return jsonify({"error": "ttl_seconds debe ser un entero entre 1 y 3600"}), 400
+  token, expires = issue_token(current_app, method, path, ttl)
+  return jsonify({
+    "token": token,
+    "method": method,
+    "path": path,
+    "expires_at": datetime.fromtimestamp(expires, timezone.utc).isoformat(),
+  })
+
+
+@admin_bp.get("/profiles")
+@jwt_required()
+def admin_profiles_list():
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  return jsonify(list_profiles(current_app.config["PROFILE_DIR"]))
+
+
+@admin_bp.get("/profiles/<name>")
+@jwt_required()
+def admin_profiles_download(name):
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  if not SAFE_NAME.match(name):
+    return jsonify({"error": "Perfil no encontrado"}), 404
+  return send_from_directory(os.path.abspath(current_app.config["PROFILE_DIR"]), name,
+                             mimetype="text/plain", as_attachment=True)
+
+
+@admin_bp.get("/slow-queries")
+@jwt_required()
+def admin_slow_queries():
+  """Queries lentas agrupadas por fingerprint, ordenadas por tiempo total"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+  return jsonify(top_offenders(limit))
+
+
+# ===== Diagnóstico de memoria =====
+@admin_bp.get("/memory")
+@jwt_required()
+def admin_memory_workers():
+  """RSS de cada worker vivo"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  return jsonify({"pid": os.getpid(), "workers": memory.workers()})
+
+
+@admin_bp.post("/memory/tracemalloc")
+@jwt_required()
+def admin_memory_tracemalloc():
+  """Activa o desactiva tracemalloc en todos los workers (cada uno lo aplica antes de su próxima request)"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  data = request.get_json(silent=True) or {}
+  try:
+    nframes = min(max(int(data.get("nframes") or 10), 1), 50)
+  except (TypeError, ValueError):
+    return jsonify({"error": "nframes inválido"}), 400
+  control = memory.set_tracing(bool(data.get("enabled", True)), nframes)
+  return jsonify({"pid": os.getpid(), "tracing": control["tracing"], "nframes": control["nframes"]})
+
+
+@admin_bp.post("/memory/snapshot")
+@jwt_required()
+def admin_memory_snapshot():
+  """Pide un snapshot a todos los workers; el que atiende lo toma ya, el resto antes de su próxima request"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  try:
+    return jsonify(memory.request_snapshot())
+  except RuntimeError as e:
+    return jsonify({"error": str(e), "pid": os.getpid()}), 409
+
+
+@admin_bp.get("/memory/top")
+@jwt_required()
+def admin_memory_top():
+  """Top de sitios de asignación de un worker (?worker=<pid>, por defecto el actual; ?compare=1 para diferencia entre los dos últimos snapshots)"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+  compare = (request.args.get("compare") or "").lower() in ("1", "true", "yes")
+  group_by = request.args.get("group_by", "lineno")
+  if group_by not in ("lineno", "filename", "traceback"):
+    return jsonify({"error": "group_by inválido"}), 400
+  worker = request.args.get("worker", type=int)
+  try:
+    return jsonify(memory.top_allocations(limit, compare, group_by, worker))
+  except RuntimeError as e:
+    return jsonify({"error": str(e), "pid": os.getpid()}), 409
+
+
+# ===== Almacenamiento =====
+@admin_bp.get("/storage/usage")
+@jwt_required()
+def admin_storage_usage():
+  """Uso del almacenamiento por categoría frente a la cuota"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  return jsonify(upload_gc.usage_report())
+
+
+# ===== Respaldos =====
+@admin_bp.get("/backups")
+@jwt_required()
+def admin_list_backups():
+  """Snapshots disponibles, del más nuevo al más antiguo"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  try:
+    manifests = backup.list_snapshots()
+  except backup.BackupError as e:
+    return jsonify({"message": str(e)}), 409
+  snapshots = []
+  for manifest in reversed(manifests):
+    uploads = manifest.get("uploads")
+    snapshots.append({
+      "id": manifest["id"],
+      "created_at": manifest["created_at"],
+      "database_bytes": manifest["database"]["bytes"],
+      "full": bool(uploads) and uploads["base"] is None,
+      "base": uploads["base"] if uploads else None,
+      "archived_files": uploads["archived"] if uploads else 0,
+      "archived_bytes": uploads["archived_bytes"] if uploads else 0,
+      "duration_s": manifest.get("duration_s"),
+    })
+  return jsonify(snapshots)
+
+
+@admin_bp.post("/backups")
+@jwt_required()
+def admin_create_backup():
+  """Inicia un snapshot en un proceso aparte (python -m scripts.backup create) y responde 202"""
+  uid = int(get_jwt_identity())
+  user = User.query.get(uid)
+  if not user or user.role != "admin":
+    return jsonify({"message":"Forbidden"}), 403
+
+  try:
+    backup.database_path()
+    directory = backup.check_target()
+  except backup.BackupError as e:
+    return jsonify({"message": str(e)}), 409
+  if backup.running():
+    return jsonify({"message":"Ya hay un respaldo en curso"}), 409
+
+  snapshot_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+  if os.path.exists(os.path.join(directory, snapshot_id)):
+    return jsonify({"message":"Ya se creó un snapshot en este segundo"}), 409
+
+  pid = backup.start_background(snapshot_id)
+  return jsonify({"id": snapshot_id, "pid": pid, "message":"Respaldo iniciado"}), 202
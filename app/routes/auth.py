@@ -3,11 +3,13 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from ..extensions import db
 from ..models.user import User
+from ..utils.rate_limit import rate_limit
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api")
 
 
 @auth_bp.post("/auth/login")
+@rate_limit("login")
 def login():
   data = request.get_json() or {}
   email = data.get("email", "").strip().lower()
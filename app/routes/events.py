@@ -4,12 +4,17 @@ from ..extensions import db
 from sqlalchemy import or_
 from ..models.event import Event, EventEnrollment
 from ..models.user import User
+from ..utils.rate_limit import rate_limit
+from ..utils.idempotency import idempotent
+from ..utils.db_routing import read_only
+from ..utils import image_metadata, view_counts
 from datetime import datetime, timezone
 
 events_bp = Blueprint("events", __name__, url_prefix="/api")
 
 
 @events_bp.get("/events")
+@read_only
 def list_events():
     event_type = (request.args.get("type") or "").strip().lower()
     past = (request.args.get("past") or "").strip().lower() in ("1", "true", "yes")
@@ -58,10 +63,12 @@ def list_events():
             data["is_enrolled"] = enrollment is not None
         
         result.append(data)
+    image_metadata.embed(result)
     return jsonify(result)
 
 
 @events_bp.get("/events/<int:event_id>")
+@read_only
 def event_detail(event_id: int):
     event = Event.query.get_or_404(event_id)
     data = event.to_dict()
@@ -100,10 +107,14 @@ def event_detail(event_id: int):
     except Exception:
         pass
     
+    image_metadata.embed([data])
+    view_counts.record("event", event.id)
     return jsonify(data)
 
 
 @events_bp.post("/events/<int:event_id>/enroll")
+@idempotent
+@rate_limit("enroll")
 def enroll_event(event_id: int):
     event = Event.query.get_or_404(event_id)
 
@@ -0,0 +1,20 @@
+import hmac
+from flask import Blueprint, Response, current_app, request
+from ..utils.metrics import collect, flush, render
+
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/api")
+
+
+@metrics_bp.get("/metrics")
+def metrics():
+  """Métricas de todos los workers en formato de texto Prometheus (requiere METRICS_TOKEN)"""
+  token = current_app.config.get("METRICS_TOKEN")
+  if not token:
+    return Response("metrics disabled\n", status=404, mimetype="text/plain")
+  supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip() or request.args.get("token")
+  if not supplied or not hmac.compare_digest(supplied.encode(), token.encode()):
+    return Response("forbidden\n", status=403, mimetype="text/plain")
+
+  directory = current_app.config["METRICS_DIR"]
+  flush(directory, force=True)
+  return Response(render(*collect(directory)), mimetype="text/plain; version=0.0.4")
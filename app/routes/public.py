@@ -8,6 +8,14 @@ from ..models.news import News
 from ..models.application import Application
 from ..utils.file_validation import validate_image, validate_document, get_safe_filename
 from ..utils.image_processing import process_uploaded_image
+from ..utils.uploads import save_upload
+from ..utils import image_metadata, storage, view_counts
+from ..utils.request_timing import track
+from ..utils.rate_limit import rate_limit
+from ..utils.idempotency import idempotent
+from ..utils.load_shedding import http_timeout
+from ..utils.db_routing import read_only
+from ..utils import metrics
 
 public_bp = Blueprint("public", __name__, url_prefix="/api")
 
@@ -20,6 +28,8 @@ ALLOWED_NEWS_CATEGORIES = (
 
 
 @public_bp.post("/applications")
+@idempotent
+@rate_limit("applications")
 def create_application():
   from datetime import datetime as dt
   # Acepta JSON (legacy) o multipart/form-data con PDF
@@ -95,17 +105,19 @@ def create_application():
           namef = get_safe_filename(f.filename)
           upload_dir = os.path.abspath(current_app.config["UPLOAD_DIR"]) 
           path = os.path.join(upload_dir, namef)
-          f.save(path)
+          save_upload(f, path)
           
           # Validate file type after saving
           is_valid, result = validate_document(path)
           if not is_valid:
             os.remove(path)  # Delete invalid file
+            # Descarta la postulación ya enviada con flush (y libera el lock de escritura)
+            db.session.rollback()
             return jsonify({"error": f"Archivo inválido: {result}"}), 400
           
           att = ApplicationAttachment()
           att.application_id = app_row.id
-          att.file_url = f"/uploads/{namef}"
+          att.file_url = storage.store(path)
           db.session.add(att)
 
     db.session.commit()
@@ -125,6 +137,7 @@ def create_application():
 
 
 @public_bp.get("/news")
+@read_only
 def news_list():
   from ..models.user import User
   q = News.query.filter_by(status="published").filter(News.category.in_(ALLOWED_NEWS_CATEGORIES))
@@ -151,10 +164,51 @@ def news_list():
       "author_name": author_name
     })
   
+  # Dimensiones, color y placeholder de cada imagen en una sola query
+  image_metadata.embed(result)
   return jsonify(result)
 
 
+@public_bp.get("/news/popular")
+@read_only
+def news_popular():
+  """Noticias más leídas en una ventana móvil (?days=7&limit=5&category=...)"""
+  from ..models.user import User
+  days = min(max(request.args.get("days", 7, type=int), 1), current_app.config["VIEW_RETENTION_DAYS"])
+  limit = min(max(request.args.get("limit", 5, type=int), 1), 20)
+  category = (request.args.get("category") or "").strip().lower()
+  if category not in ALLOWED_NEWS_CATEGORIES:
+    category = None
+
+  def build():
+    views = view_counts.window_totals("news", days * 24)
+    q = db.session.query(News, views.c.views).join(views, views.c.entity_id == News.id).filter(
+      News.status == "published", News.category.in_(ALLOWED_NEWS_CATEGORIES)
+    )
+    if category:
+      q = q.filter(News.category == category)
+    rows = q.order_by(views.c.views.desc(), News.created_at.desc()).limit(limit).all()
+
+    # Autores en una sola query
+    author_ids = {n.created_by_user_id for n, _ in rows if n.created_by_user_id}
+    authors = dict(db.session.query(User.id, User.name).filter(User.id.in_(author_ids))) if author_ids else {}
+    result = [{
+      "id": n.id,
+      "title": n.title,
+      "excerpt": n.excerpt,
+      "image_url": n.image_url,
+      "category": n.category,
+      "created_at": n.created_at.isoformat() if n.created_at else None,
+      "author_name": authors.get(n.created_by_user_id),
+      "views": int(count),
+    } for n, count in rows]
+    return image_metadata.embed(result)
+
+  return jsonify(view_counts.cached_ranking(("news", days, limit, category), build))
+
+
 @public_bp.get("/news/<int:news_id>")
+@read_only
 def news_detail(news_id):
     """Obtener una noticia específica por ID"""
     from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
@@ -175,18 +229,20 @@ def news_detail(news_id):
                 is_admin = True
     except Exception as e:
         # Si hay error verificando JWT, continuar como usuario no autenticado
-        print(f"JWT verification failed: {e}")
+        current_app.logger.debug("JWT verification failed: %s", e)
     
     # Admin puede ver cualquier noticia
     if is_admin:
-        return jsonify(news.to_dict())
+        return jsonify(image_metadata.embed([news.to_dict()])[0])
     
     # Usuario no autenticado o no admin solo puede ver noticias publicadas
     # y dentro de las categorías habilitadas.
     if news.status != "published" or news.category not in ALLOWED_NEWS_CATEGORIES:
         return jsonify({"error": "Noticia no encontrada"}), 404
     
-    return jsonify(news.to_dict())
+    # Solo lecturas públicas: las vistas del admin no cuentan para la popularidad
+    view_counts.record("news", news.id)
+    return jsonify(image_metadata.embed([news.to_dict()])[0])
 
 
 @public_bp.get("/instagram/recent")
@@ -220,6 +276,7 @@ def instagram_recent():
                 "permalink": INSTAGRAM_PERMALINK
             },
         ]
+        metrics.inc("instagram_fetch_total", outcome="placeholder")
         return jsonify(placeholder[:limit])
 
     try:
@@ -229,7 +286,8 @@ def instagram_recent():
             f"&limit={limit}"
             f"&access_token={access_token}"
         )
-        resp = requests.get(url, timeout=8)
+        with track("http"):
+            resp = requests.get(url, timeout=http_timeout(8))
         resp.raise_for_status()
         data = resp.json().get("data", [])
         # Filtrar sólo imágenes/video con media_url
@@ -242,8 +300,10 @@ def instagram_recent():
             }
             for d in data if d.get("media_url")
         ]
+        metrics.inc("instagram_fetch_total", outcome="ok")
         return jsonify(cleaned)
     except Exception as e:
+        metrics.inc("instagram_fetch_total", outcome="error")
         current_app.logger.error(f"Instagram error: {e}")
         return jsonify({"error": "instagram_fetch_failed"}), 502
 
@@ -252,16 +312,18 @@ def instagram_recent():
 def news_create():
   try:
     uid = int(get_jwt_identity())
-    print(f"Creating news for user {uid}")
     
     # multipart/form-data
     title = (request.form.get("title") or "").strip()
     excerpt = (request.form.get("excerpt") or "").strip()
     content = (request.form.get("content") or "").strip()
     image_url = None
+    meta = {}
     
-    print(f"Form data: title={title}, excerpt={excerpt}, content={content[:50]}...")
-    print(f"Files: {list(request.files.keys())}")
+    current_app.logger.debug("Creating news", extra={"data": {
+      "user_id": uid, "title_length": len(title), "content_length": len(content),
+      "files": list(request.files.keys()),
+    }})
     
     if "image" in request.files and request.files["image"]:
       f = request.files["image"]
@@ -269,8 +331,7 @@ def news_create():
         name = get_safe_filename(f.filename)
         upload_dir = os.path.abspath(current_app.config["UPLOAD_DIR"]) 
         path = os.path.join(upload_dir, name)
-        print(f"Saving image to {path}")
-        f.save(path)
+        save_upload(f, path)
         
         # Validate file type after saving
         is_valid, result = validate_image(path)
@@ -279,17 +340,16 @@ def news_create():
           return jsonify({"error": f"Imagen inválida: {result}"}), 400
         
         # Optimize the image
-        optimize_success, optimize_msg = process_uploaded_image(path, max_width=1920, max_height=1080, quality=85)
+        optimize_success, optimize_msg, path = process_uploaded_image(path, max_width=1920, max_height=1080, quality=85, metadata=meta)
         if optimize_success:
-          print(f"Image optimized: {optimize_msg}")
+          current_app.logger.debug("Image optimized: %s", optimize_msg)
         
-        image_url = f"/uploads/{name}"
+        # La extensión sigue al formato elegido por el encoder
+        image_url = storage.store(path)
     
     if not image_url:
       image_url = "https://images.unsplash.com/photo-1532012197267-da84d127e765?auto=format&fit=crop&w=1400&q=60"
     
-    print(f"Final image_url: {image_url}")
-    
     n = News()
     n.title = title
     n.excerpt = excerpt
@@ -302,16 +362,18 @@ def news_create():
     n.status = "pending"
     n.created_by_user_id = uid
     db.session.add(n)
+    image_metadata.record(image_url, meta)
     db.session.commit()
-    print(f"News created with ID {n.id}")
+    current_app.logger.info("News created", extra={"data": {"news_id": n.id, "user_id": uid}})
     return jsonify({"id": n.id, "status": n.status}), 201
     
   except Exception as e:
-    print(f"Error creating news: {e}")
+    current_app.logger.exception("Error creating news")
     return jsonify({"error": str(e)}), 500
 
 
 @public_bp.get("/members")
+@read_only
 def members_list():
   """Obtener lista de miembros activos para directorio público"""
   from ..models.user import User
@@ -0,0 +1,199 @@
+from flask import Blueprint, jsonify, request, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from ..extensions import db
+from ..models.user import User
+from ..models.application import Application, ApplicationAttachment
+from ..models.news import News
+from ..models.event import Event
+from ..utils import chunked_uploads
+from ..utils.chunked_uploads import UploadError
+from ..utils.image_processing import process_uploaded_image
+from ..utils import image_metadata, storage
+from ..utils.rate_limit import client_ip, rate_limit
+
+uploads_bp = Blueprint("uploads", __name__, url_prefix="/api")
+
+# Destino -> tipos de archivo que acepta
+TARGET_KINDS = {
+  "application": ("document",),
+  "news": ("image",),
+  "event": ("image",),
+}
+
+# Solo se abren sesiones que algún destino pueda recibir
+ATTACHABLE_KINDS = {kind for kinds in TARGET_KINDS.values() for kind in kinds}
+
+# Sin sesión iniciada solo se suben documentos (postulaciones)
+ANONYMOUS_KINDS = ("document",)
+
+# Máximo de adjuntos por postulación para quien no es admin (igual que el formulario)
+MAX_APPLICATION_ATTACHMENTS = 3
+
+
+def _current_user():
+  try:
+    verify_jwt_in_request(optional=True)
+    uid = get_jwt_identity()
+    if uid:
+      return User.query.get(int(uid))
+  except Exception:
+    pass
+  return None
+
+
+def _error(e: UploadError):
+  resp = jsonify({"error": e.message, "offset": e.offset})
+  resp.status_code = e.status
+  if e.offset is not None:
+    resp.headers["Upload-Offset"] = str(e.offset)
+  return resp
+
+
+def _session_response(state, status=200):
+  resp = jsonify(chunked_uploads.public_state(state))
+  resp.status_code = status
+  resp.headers["Upload-Offset"] = str(state["received"])
+  return resp
+
+
+def _load_own_session(upload_id):
+  state = chunked_uploads.load_session(upload_id)
+  user = _current_user()
+  if state["owner_id"] is not None and (not user or user.id != state["owner_id"]):
+    raise UploadError("Subida no encontrada", 404)
+  return state, user
+
+
+@uploads_bp.post("/uploads")
+@rate_limit("uploads")
+def upload_init():
+  """Crea una sesión de subida por fragmentos: {filename, size, kind}"""
+  data = request.get_json() or {}
+  user = _current_user()
+  kind = (data.get("kind") or "").strip().lower()
+  if not user and kind in ATTACHABLE_KINDS and kind not in ANONYMOUS_KINDS:
+    return jsonify({"error": "Inicie sesión para subir este tipo de archivo"}), 401
+  try:
+    state = chunked_uploads.create_session(
+      (data.get("filename") or "").strip(),
+      data.get("size"),
+      kind,
+      owner_id=user.id if user else None,
+      client=f"user:{user.id}" if user else f"ip:{client_ip()}",
+      kinds=ATTACHABLE_KINDS,
+    )
+  except UploadError as e:
+    return _error(e)
+  return _session_response(state, 201)
+
+
+@uploads_bp.get("/uploads/<upload_id>")
+def upload_status(upload_id):
+  """Offset actual, para retomar una subida interrumpida"""
+  try:
+    state, _ = _load_own_session(upload_id)
+  except UploadError as e:
+    return _error(e)
+  return _session_response(state)
+
+
+@uploads_bp.put("/uploads/<upload_id>")
+def upload_chunk(upload_id):
+  """Recibe un fragmento en el offset indicado (Upload-Offset o ?offset=)"""
+  raw_offset = request.headers.get("Upload-Offset", request.args.get("offset"))
+  try:
+    offset = int(raw_offset)
+  except (TypeError, ValueError):
+    return jsonify({"error": "Upload-Offset requerido"}), 400
+  if request.content_length is None:
+    return jsonify({"error": "Content-Length requerido"}), 411
+  try:
+    _load_own_session(upload_id)
+    state = chunked_uploads.write_chunk(
+      upload_id, offset, request.stream, request.content_length,
+      checksum=request.headers.get("X-Chunk-SHA256"),
+    )
+  except UploadError as e:
+    return _error(e)
+  return _session_response(state)
+
+
+def _resolve_target(kind, target, target_id, user, data):
+  """Valida destino y permisos antes de mover el archivo. Devuelve el registro destino."""
+  if target not in TARGET_KINDS:
+    raise UploadError("Destino inválido")
+  if kind not in TARGET_KINDS[target]:
+    raise UploadError(f"Un archivo de tipo {kind} no se puede adjuntar a {target}")
+  is_admin = bool(user and user.role == "admin")
+
+  if target == "application":
+    row = Application.query.get(target_id)
+    if not row:
+      raise UploadError("Postulación no encontrada", 404)
+    if not is_admin:
+      # El postulante se identifica con el email con que postuló
+      email = (data.get("email") or "").strip().lower()
+      if row.status != "pending" or not email or email != (row.email or "").lower():
+        raise UploadError("Forbidden", 403)
+      if ApplicationAttachment.query.filter_by(application_id=row.id).count() >= MAX_APPLICATION_ATTACHMENTS:
+        raise UploadError("La postulación ya tiene el máximo de documentos")
+    return row
+
+  if target == "news":
+    row = News.query.get(target_id)
+    if not row:
+      raise UploadError("Noticia no encontrada", 404)
+    if not is_admin and not (user and row.created_by_user_id == user.id):
+      raise UploadError("Forbidden", 403)
+    return row
+
+  row = Event.query.get(target_id)
+  if not row:
+    raise UploadError("Evento no encontrado", 404)
+  if not is_admin:
+    raise UploadError("Forbidden", 403)
+  return row
+
+
+@uploads_bp.post("/uploads/<upload_id>/finalize")
+def upload_finalize(upload_id):
+  """Verifica el SHA-256 y adjunta el archivo: {sha256, target, target_id[, email]}"""
+  data = request.get_json() or {}
+  try:
+    target_id = int(data.get("target_id"))
+  except (TypeError, ValueError):
+    return jsonify({"error": "target_id requerido"}), 400
+  target = (data.get("target") or "").strip().lower()
+
+  try:
+    state, user = _load_own_session(upload_id)
+    row = _resolve_target(state["kind"], target, target_id, user, data)
+    path, file_url = chunked_uploads.finalize(upload_id, data.get("sha256"))
+  except UploadError as e:
+    return _error(e)
+
+  meta = {}
+  if state["kind"] == "image":
+    optimize_success, optimize_msg, path = process_uploaded_image(path, max_width=1920, max_height=1080, quality=85, metadata=meta)
+    if optimize_success:
+      current_app.logger.debug("Image optimized: %s", optimize_msg)
+  file_url = storage.store(path)
+
+  try:
+    if target == "application":
+      att = ApplicationAttachment()
+      att.application_id = row.id
+      att.file_url = file_url
+      db.session.add(att)
+    else:
+      # La imagen anterior queda en cuarentena tras el commit (upload_gc)
+      image_metadata.forget(row.image_url)
+      row.image_url = file_url
+      image_metadata.record(file_url, meta)
+    db.session.commit()
+  except Exception:
+    db.session.rollback()
+    storage.delete_url(file_url)
+    raise
+
+  return jsonify({"file_url": file_url, "target": target, "target_id": row.id}), 201
@@ -0,0 +1,402 @@
+"""
+Online snapshots of the SQLite database and the uploaded files.
+
+A snapshot is a directory ``BACKUP_DIR/<id>/`` holding:
+
+- ``db.sqlite3``: a copy made with SQLite's online backup API, in steps
+  of ``BACKUP_PAGES`` pages with a short pause between steps. Each step
+  holds a read lock for a few milliseconds, so writers in the web workers
+  wait at most that long and never see an error. If a worker writes
+  between two steps, SQLite restarts the copy on its own. The copy is
+  checked with ``PRAGMA integrity_check`` before it is kept.
+- ``uploads.tar.gz``: only the files that are new or changed since the
+  previous snapshot (a full copy every ``BACKUP_FULL_EVERY`` snapshots),
+  streamed file by file.
+- ``manifest.json``: the database's sha256, the complete file list at
+  that point in time and the snapshot this one builds on (``base``).
+
+The snapshot is built in a hidden temporary directory and renamed when
+complete, so an interrupted run never leaves a half-written snapshot.
+Retention keeps the newest ``BACKUP_KEEP`` snapshots plus whatever older
+ones their incremental chains need.
+
+Restoring rebuilds the uploads from the chain and writes the database
+to new paths; it never overwrites the live files. The database copy must
+pass the integrity check and match the manifest's hash.
+With ``STORAGE_BACKEND=s3`` the files live in the bucket (use bucket
+versioning) and only the database is snapshotted.
+
+``BACKUP_DIR`` must be set explicitly and must be on a different filesystem
+than ``UPLOAD_DIR``. A backup on the disk it protects does not survive
+losing that disk, and its archives could fill the volume the database
+writes to. ``BACKUP_ALLOW_SAME_DISK=1`` overrides this. Every write is also
+preceded by a free-space check that keeps ``BACKUP_MIN_FREE_BYTES`` free.
+The admin endpoint runs ``scripts.backup`` in a separate process
+(``start_background``), so a long archive never ties up a web worker.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from ..extensions import db
+from . import storage
+from .upload_gc import UPLOAD_EXTENSIONS
+
+DB_FILE = "db.sqlite3"
+UPLOADS_FILE = "uploads.tar.gz"
+MANIFEST_FILE = "manifest.json"
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_dir():
+    directory = current_app.config["BACKUP_DIR"]
+    if not directory:
+        raise BackupError("Configure BACKUP_DIR (idealmente en otro disco que UPLOAD_DIR)")
+    return directory
+
+
+def _device(path):
+    # El directorio puede no existir todavía: se mira el ancestro más cercano que exista
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(path).st_dev
+
+
+def check_target():
+    """Falla si BACKUP_DIR no está configurado o comparte disco con UPLOAD_DIR (sin permiso explícito)."""
+    config = current_app.config
+    directory = backup_dir()
+    if not config["BACKUP_ALLOW_SAME_DISK"] and _device(directory) == _device(config["UPLOAD_DIR"]):
+        raise BackupError("BACKUP_DIR está en el mismo disco que UPLOAD_DIR; use otro volumen "
+                          "o BACKUP_ALLOW_SAME_DISK=1")
+    return directory
+
+
+def _ensure_space(directory, needed):
+    free = shutil.disk_usage(directory).free
+    reserve = current_app.config["BACKUP_MIN_FREE_BYTES"]
+    if free - needed < reserve:
+        raise BackupError(f"Espacio insuficiente en {directory}: se necesitan {needed} bytes "
+                          f"y quedan {free} (reserva {reserve})")
+
+
+def database_path():
+    url = db.engine.url
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        raise BackupError("El respaldo en línea solo está disponible para SQLite en archivo")
+    return url.database
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def integrity_check(path):
+    """Resultado de ``PRAGMA integrity_check`` ("ok" si la base está sana)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    return "; ".join(row[0] for row in rows)
+
+
+def copy_database(source_path, target_path, pages=256, pause=0.02):
+    """Copia en línea con la API de backup, de a ``pages`` páginas. Devuelve los pasos dados."""
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=pause)
+    finally:
+        target.close()
+        source.close()
+    return steps
+
+
+def list_snapshots(directory=None):
+    """Manifests de los snapshots completos, del más antiguo al más nuevo."""
+    directory = directory or backup_dir()
+    snapshots = []
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return snapshots
+    for name in names:
+        if name.startswith("."):
+            continue
+        try:
+            with open(os.path.join(directory, name, MANIFEST_FILE)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _upload_files():
+    """{clave: [bytes, mtime]} de los archivos publicados en disco local."""
+    store = storage.get_storage()
+    if not store.serves_files:
+        return None
+    return {
+        key: [size, mtime]
+        for key, size, mtime in store.list()
+        if os.path.splitext(key)[1].lower() in UPLOAD_EXTENSIONS
+    }
+
+
+def _archive_uploads(path, root, keys):
+    # Modo stream ("w|gz"): escribe a medida que lee, sin armar el tar en memoria
+    archived = []
+    with tarfile.open(path, "w|gz") as tar:
+        for key in keys:
+            try:
+                tar.add(os.path.join(root, key), arcname=key, recursive=False)
+            except FileNotFoundError:
+                # Borrado (o enviado a cuarentena) mientras se respaldaba
+                continue
+            archived.append(key)
+    return archived
+
+
+def create_snapshot(snapshot_id=None):
+    """Crea un snapshot y aplica la retención. Devuelve su manifest."""
+    config = current_app.config
+    directory = check_target()
+    os.makedirs(directory, exist_ok=True)
+    snapshot_id = snapshot_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    final = os.path.join(directory, snapshot_id)
+    if os.path.exists(final):
+        raise BackupError(f"El snapshot {snapshot_id} ya existe")
+
+    source = database_path()
+    previous = list_snapshots(directory)
+    work = tempfile.mkdtemp(dir=directory, prefix=f".tmp-{snapshot_id}-")
+    started = time.monotonic()
+    try:
+        db_path = os.path.join(work, DB_FILE)
+        _ensure_space(work, sum(os.path.getsize(p) for p in (source, source + "-wal") if os.path.exists(p)))
+        steps = copy_database(source, db_path, config["BACKUP_PAGES"], config["BACKUP_PAUSE"])
+        integrity = integrity_check(db_path)
+        if integrity != "ok":
+            raise BackupError(f"La copia no pasó integrity_check: {integrity}")
+        manifest = {
+            "id": snapshot_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "database": {"file": DB_FILE, "bytes": os.path.getsize(db_path), "sha256": _sha256(db_path), "steps": steps},
+            "uploads": None,
+        }
+
+        files = _upload_files()
+        if files is not None:
+            last = next((s for s in reversed(previous) if s.get("uploads")), None)
+            chain = _chain(previous, last["id"]) if last else []
+            full = not last or len(chain) >= config["BACKUP_FULL_EVERY"]
+            known = {} if full else last["uploads"]["files"]
+            changed = sorted(k for k, meta in files.items() if known.get(k) != meta)
+            # Cota superior: las imágenes y PDF casi no se comprimen
+            _ensure_space(work, sum(files[k][0] for k in changed))
+            archived = _archive_uploads(os.path.join(work, UPLOADS_FILE), os.path.abspath(config["UPLOAD_DIR"]), changed)
+            manifest["uploads"] = {
+                "file": UPLOADS_FILE,
+                "base": None if full else last["id"],
+                "files": {k: v for k, v in files.items() if k in known or k in archived},
+                "archived": len(archived),
+                "archived_bytes": sum(files[k][0] for k in archived),
+            }
+
+        manifest["duration_s"] = round(time.monotonic() - started, 3)
+        with open(os.path.join(work, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.rename(work, final)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    apply_retention(directory, config["BACKUP_KEEP"])
+    return manifest
+
+
+def _chain(snapshots, snapshot_id):
+    """Snapshots necesarios para reconstruir los archivos de ``snapshot_id``, desde el completo."""
+    by_id = {s["id"]: s for s in snapshots}
+    chain = []
+    current = by_id.get(snapshot_id)
+    while current is not None:
+        chain.append(current)
+        base = (current.get("uploads") or {}).get("base")
+        if base is None:
+            break
+        current = by_id.get(base)
+        if current is None:
+            raise BackupError(f"Falta el snapshot base {base} de {chain[-1]['id']}")
+    return list(reversed(chain))
+
+
+def apply_retention(directory, keep):
+    """Borra snapshots viejos salvo los ``keep`` más nuevos y sus bases. Devuelve los borrados."""
+    snapshots = list_snapshots(directory)
+    if keep <= 0 or len(snapshots) <= keep:
+        return []
+    needed = set()
+    for snapshot in snapshots[-keep:]:
+        needed.update(s["id"] for s in _chain(snapshots, snapshot["id"]))
+    removed = [s["id"] for s in snapshots if s["id"] not in needed]
+    for snapshot_id in removed:
+        shutil.rmtree(os.path.join(directory, snapshot_id), ignore_errors=True)
+    return removed
+
+
+def verify_snapshot(snapshot_id, directory=None):
+    """Comprueba hash e integridad de la base y que los tar de la cadena se puedan leer."""
+    directory = directory or backup_dir()
+    snapshots = list_snapshots(directory)
+    chain = _chain(snapshots, snapshot_id)
+    if not chain:
+        raise BackupError(f"Snapshot {snapshot_id} no encontrado")
+    manifest = chain[-1]
+    db_path = os.path.join(directory, snapshot_id, DB_FILE)
+    if _sha256(db_path) != manifest["database"]["sha256"]:
+        raise BackupError("El hash de la base no coincide con el manifest")
+    integrity = integrity_check(db_path)
+    if integrity != "ok":
+        raise BackupError(f"La base del snapshot no pasó integrity_check: {integrity}")
+    archived = 0
+    for snapshot in chain:
+        if snapshot.get("uploads"):
+            with tarfile.open(os.path.join(directory, snapshot["id"], UPLOADS_FILE), "r|gz") as tar:
+                archived += sum(1 for _ in tar)
+    return {"id": snapshot_id, "integrity": integrity, "chain": [s["id"] for s in chain], "archived_files": archived}
+
+
+def restore_snapshot(snapshot_id, db_target, uploads_target=None, directory=None):
+    """Escribe la base (y los archivos) del snapshot en rutas nuevas, verificando la base antes.
+
+    No sobrescribe nada: ``db_target`` no debe existir y ``uploads_target``
+    debe estar vacío o no existir. Para volver a producción se detiene el
+    servicio y se mueven los archivos restaurados a su lugar.
+    """
+    directory = directory or backup_dir()
+    if os.path.exists(db_target):
+        raise BackupError(f"{db_target} ya existe")
+    if uploads_target and os.path.isdir(uploads_target) and os.listdir(uploads_target):
+        raise BackupError(f"{uploads_target} no está vacío")
+    result = verify_snapshot(snapshot_id, directory)
+    chain = _chain(list_snapshots(directory), snapshot_id)
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_target)), exist_ok=True)
+    tmp = db_target + ".restoring"
+    shutil.copyfile(os.path.join(directory, snapshot_id, DB_FILE), tmp)
+    if integrity_check(tmp) != "ok":
+        os.remove(tmp)
+        raise BackupError("La base restaurada no pasó integrity_check")
+    os.replace(tmp, db_target)
+
+    restored = 0
+    uploads = chain[-1].get("uploads")
+    if uploads_target and uploads:
+        wanted = set(uploads["files"])
+        os.makedirs(uploads_target, exist_ok=True)
+        # Del completo al más nuevo: la última versión de cada archivo gana
+        for snapshot in chain:
+            if not snapshot.get("uploads"):
+                continue
+            with tarfile.open(os.path.join(directory, snapshot["id"], UPLOADS_FILE), "r|gz") as tar:
+                for member in tar:
+                    if member.isfile() and member.name in wanted:
+                        tar.extract(member, uploads_target, filter="data")
+                        restored += 1
+        missing = [k for k in wanted if not os.path.isfile(os.path.join(uploads_target, k))]
+        if missing:
+            raise BackupError(f"Faltan {len(missing)} archivos en la cadena de snapshots")
+    result.update(db_target=db_target, uploads_target=uploads_target, restored_files=restored)
+    return result
+
+
+class BackupLock:
+    """Un solo respaldo a la vez entre workers y scripts (flock no bloqueante)."""
+
+    def __init__(self, directory=None):
+        self.path = os.path.join(directory or backup_dir(), ".lock")
+        self._file = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            raise BackupError("Ya hay un respaldo en curso")
+        return self
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def running():
+    """True si otro proceso tiene el lock de respaldo."""
+    try:
+        BackupLock().acquire().release()
+        return False
+    except BackupError:
+        return True
+
+
+def start_background(snapshot_id):
+    """Lanza ``python -m scripts.backup create`` en otro proceso. Devuelve su pid."""
+    directory = check_target()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".backup.log"), "ab") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "scripts.backup", "create", "--id", snapshot_id],
+            cwd=os.path.dirname(current_app.root_path),
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    # Recoger el proceso al terminar para no dejar zombies en el worker
+    threading.Thread(target=process.wait, daemon=True).start()
+    return process.pid
+
+
+def init_backup(app):
+    app.config.setdefault("BACKUP_DIR", None)
+    app.config.setdefault("BACKUP_ALLOW_SAME_DISK", False)
+    app.config.setdefault("BACKUP_MIN_FREE_BYTES", 100 * 1024 * 1024)
+    app.config.setdefault("BACKUP_KEEP", 7)
+    app.config.setdefault("BACKUP_FULL_EVERY", 7)
+    app.config.setdefault("BACKUP_PAGES", 256)
+    app.config.setdefault("BACKUP_PAUSE", 0.02)
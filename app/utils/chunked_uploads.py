@@ -0,0 +1,308 @@
+"""
+Resumable chunked uploads.
+
+An upload session is created with the final size and kind, then the client
+PUTs consecutive chunks at the offset the server reports and finally asks to
+finalize it with the SHA-256 of the whole file. Partial state lives on the
+upload volume under ``UPLOAD_DIR/.incoming/chunked``: ``<id>.part`` with the
+bytes received so far and ``<id>.json`` with the session metadata, so any
+worker can continue an upload and a client can resume after a dropped
+connection by asking for the current offset. Writers take an exclusive
+``flock`` on the part file; the offset only advances after a chunk was fully
+written (and matched its ``X-Chunk-SHA256`` when sent). The magic bytes are
+checked with the first chunk, and the complete file goes through the same
+validators as regular uploads before it is moved into ``UPLOAD_DIR``.
+
+A new session reserves its full declared size. Sessions are refused once
+the unfinished ones add up to ``UPLOAD_STAGING_MAX_BYTES`` overall, or
+``UPLOAD_STAGING_PER_CLIENT_BYTES`` for one user or IP. The volume also
+holds the database. Expired sessions are purged on every new session
+(under a lock, so the check is atomic across workers) and from the GC tick.
+"""
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from .file_validation import (
+    ALLOWED_DOCUMENT_EXTENSIONS, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS,
+    IMAGE_SIGNATURES, MAX_DOCUMENT_SIZE, MAX_IMAGE_SIZE, MAX_VIDEO_SIZE,
+    get_safe_filename, validate_document, validate_file_extension, validate_image, validate_video,
+)
+from .uploads import incoming_dir
+
+# tipo -> (extensiones, tamaño máximo, validador del archivo completo)
+KINDS = {
+    "document": (ALLOWED_DOCUMENT_EXTENSIONS, MAX_DOCUMENT_SIZE, validate_document),
+    "image": (ALLOWED_IMAGE_EXTENSIONS, MAX_IMAGE_SIZE, validate_image),
+    "video": (ALLOWED_VIDEO_EXTENSIONS, MAX_VIDEO_SIZE, validate_video),
+}
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+_READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Error del protocolo con su status HTTP (y el offset actual cuando aplica)."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+def sessions_dir():
+    return os.path.join(incoming_dir(), "chunked")
+
+
+def _paths(upload_id):
+    base = os.path.join(sessions_dir(), upload_id)
+    return base + ".json", base + ".part"
+
+
+def _save_state(state):
+    state_path, _ = _paths(state["id"])
+    tmp = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path)
+
+
+def _read_state(upload_id):
+    state_path, _ = _paths(upload_id)
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_session(upload_id):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _staged(now, client):
+    """Purga las sesiones vencidas y suma los bytes reservados: (total, de ``client``)."""
+    total = mine = 0
+    for name in os.listdir(sessions_dir()):
+        upload_id, ext = os.path.splitext(name)
+        if ext != ".json" or not _SESSION_ID.match(upload_id):
+            continue
+        state = _read_state(upload_id)
+        if state is None:
+            continue
+        if state["expires_at"] < now:
+            _remove_session(upload_id)
+            continue
+        total += state["size"]
+        if state.get("client") == client:
+            mine += state["size"]
+    return total, mine
+
+
+def create_session(filename, size, kind, owner_id=None, client=None, kinds=None):
+    """Nueva sesión. ``client`` ("user:<id>" o "ip:<ip>") es la clave de la cuota por cliente."""
+    if kind not in KINDS or (kinds is not None and kind not in kinds):
+        raise UploadError("Tipo de archivo inválido")
+    extensions, max_size, _ = KINDS[kind]
+    if not validate_file_extension(filename, extensions):
+        raise UploadError(f"Extensión no permitida para {kind}")
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("Tamaño inválido")
+    if size > max_size:
+        raise UploadError(f"Archivo demasiado grande (máx {max_size // (1024 * 1024)}MB)", 413)
+
+    config = current_app.config
+    os.makedirs(sessions_dir(), exist_ok=True)
+    with open(os.path.join(sessions_dir(), ".lock"), "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        now = time.time()
+        total, mine = _staged(now, client)
+        if total + size > config["UPLOAD_STAGING_MAX_BYTES"]:
+            raise UploadError("No hay espacio para más subidas en curso; intente más tarde", 507)
+        if mine + size > config["UPLOAD_STAGING_PER_CLIENT_BYTES"]:
+            raise UploadError("Demasiadas subidas en curso; termine o espere a que venzan las anteriores", 429)
+        state = {
+            "id": secrets.token_hex(16),
+            "filename": os.path.basename(filename),
+            "kind": kind,
+            "size": size,
+            "received": 0,
+            "owner_id": owner_id,
+            "client": client,
+            "created_at": now,
+            "expires_at": now + config["UPLOAD_SESSION_TTL"],
+        }
+        _, part_path = _paths(state["id"])
+        open(part_path, "wb").close()
+        _save_state(state)
+    return state
+
+
+def load_session(upload_id):
+    """Estado de la sesión; 404 si no existe o expiró."""
+    if not _SESSION_ID.match(upload_id or ""):
+        raise UploadError("Subida no encontrada", 404)
+    state = _read_state(upload_id)
+    if state is None:
+        raise UploadError("Subida no encontrada", 404)
+    if state["expires_at"] < time.time():
+        _remove_session(upload_id)
+        raise UploadError("Subida no encontrada", 404)
+    return state
+
+
+class _Locked:
+    """``flock`` exclusivo sobre el ``.part``: un solo writer por sesión entre workers."""
+
+    def __init__(self, upload_id):
+        self.upload_id = upload_id
+        self.file = None
+
+    def __enter__(self):
+        _, part_path = _paths(self.upload_id)
+        try:
+            self.file = open(part_path, "r+b")
+        except FileNotFoundError:
+            raise UploadError("Subida no encontrada", 404)
+        try:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            raise UploadError("Otro fragmento de esta subida está en curso", 409)
+        return self.file
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+def _check_signature(kind, filename, head):
+    ext = os.path.splitext(filename)[1].lower()
+    if kind == "image" and not any(head.startswith(sig) for sig in IMAGE_SIGNATURES):
+        raise UploadError("El archivo no es una imagen válida", offset=0)
+    if kind == "document" and ext == ".pdf" and not head.startswith(b"%PDF"):
+        raise UploadError("El archivo no es un PDF válido", offset=0)
+
+
+def write_chunk(upload_id, offset, stream, length, checksum=None):
+    """Escribe ``length`` bytes de ``stream`` en ``offset``. Devuelve el estado actualizado."""
+    with _Locked(upload_id) as part:
+        # Releer con el lock tomado: otro worker pudo haber avanzado el offset
+        state = load_session(upload_id)
+        if offset != state["received"]:
+            raise UploadError("Offset incorrecto", 409, offset=state["received"])
+        if length <= 0 or offset + length > state["size"]:
+            raise UploadError("El fragmento excede el tamaño declarado", offset=state["received"])
+        if offset == 0 and length < min(12, state["size"]):
+            raise UploadError("El primer fragmento es demasiado pequeño", offset=0)
+
+        digest = hashlib.sha256()
+        written = 0
+        head = b""
+        part.seek(offset)
+        while written < length:
+            data = stream.read(min(_READ_SIZE, length - written))
+            if not data:
+                break
+            if offset == 0 and len(head) < 12:
+                head += data[:12 - len(head)]
+                if len(head) >= min(12, state["size"]):
+                    _check_signature(state["kind"], state["filename"], head)
+            part.write(data)
+            digest.update(data)
+            written += len(data)
+        if written != length:
+            raise UploadError("Fragmento incompleto", offset=state["received"])
+        if checksum and not hmac.compare_digest(digest.hexdigest(), checksum.strip().lower()):
+            raise UploadError("El checksum del fragmento no coincide", offset=state["received"])
+        part.flush()
+        os.fsync(part.fileno())
+
+        state["received"] = offset + written
+        _save_state(state)
+        return state
+
+
+def finalize(upload_id, sha256):
+    """Verifica tamaño, hash y contenido y mueve el archivo a ``UPLOAD_DIR``.
+
+    Devuelve (ruta absoluta, url pública). La sesión deja de existir.
+    """
+    with _Locked(upload_id) as part:
+        state = load_session(upload_id)
+        if state["received"] != state["size"]:
+            raise UploadError("La subida está incompleta", 409, offset=state["received"])
+
+        digest = hashlib.sha256()
+        part.seek(0)
+        for block in iter(lambda: part.read(_READ_SIZE), b""):
+            digest.update(block)
+        if not hmac.compare_digest(digest.hexdigest(), (sha256 or "").strip().lower()):
+            raise UploadError("El hash SHA-256 no coincide")
+
+        name = get_safe_filename(state["filename"])
+        path = os.path.join(os.path.abspath(current_app.config["UPLOAD_DIR"]), name)
+        _, part_path = _paths(upload_id)
+        # Se valida todavía en .incoming (no se sirve), con la extensión final
+        # porque los validadores la miran; solo un archivo válido llega a UPLOAD_DIR
+        staged = os.path.join(sessions_dir(), upload_id + os.path.splitext(name)[1])
+        os.replace(part_path, staged)
+        try:
+            _, _, validator = KINDS[state["kind"]]
+            is_valid, result = validator(staged)
+            if not is_valid:
+                raise UploadError(f"Archivo inválido: {result}")
+            os.chmod(staged, 0o644)
+            os.replace(staged, path)
+        except BaseException:
+            try:
+                os.remove(staged)
+            except FileNotFoundError:
+                pass
+            _remove_session(upload_id)
+            raise
+        _remove_session(upload_id)
+        return path, f"/uploads/{name}"
+
+
+def public_state(state):
+    return {
+        "id": state["id"],
+        "filename": state["filename"],
+        "kind": state["kind"],
+        "size": state["size"],
+        "offset": state["received"],
+        "chunk_size": current_app.config["UPLOAD_CHUNK_SIZE"],
+        "expires_at": datetime.utcfromtimestamp(state["expires_at"]).isoformat(),
+    }
+
+
+def purge_expired(now=None):
+    """Elimina sesiones vencidas (metadatos y bytes parciales). Devuelve cuántas."""
+    now = now or time.time()
+    removed = 0
+    try:
+        names = os.listdir(sessions_dir())
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        upload_id, ext = os.path.splitext(name)
+        if ext != ".json" or not _SESSION_ID.match(upload_id):
+            continue
+        state = _read_state(upload_id)
+        if state is not None and state["expires_at"] < now:
+            _remove_session(upload_id)
+            removed += 1
+    return removed
@@ -0,0 +1,229 @@
+"""
+Copy of the application tables from one database to another: SQLite to
+Postgres when we outgrow the single file, or SQLite to SQLite to move it.
+
+Tables are copied in foreign-key order (``metadata.sorted_tables``) with
+keyset pagination on the primary key. Only one batch is held in memory,
+whatever the table size. Each batch is inserted with its original primary
+keys in one target transaction, together with the checkpoint row recording
+the last key copied. An interrupted run resumes where the last committed
+batch left off, without duplicates or gaps. Postgres sequences are moved
+past the copied ids afterwards, so new rows do not collide.
+
+Before copying, ``preflight`` looks for rows the target would reject:
+SQLite does not enforce foreign keys or ``String(n)`` lengths, Postgres
+does. After copying, ``verify`` compares row counts and an order-independent
+checksum of every row on both sides.
+
+The source should not receive writes during the copy. Either stop the
+service, or migrate from a snapshot made with ``utils/backup.py``.
+Postgres needs a driver that is not in requirements.txt
+(``pip install psycopg2-binary``).
+"""
+import hashlib
+import json
+import logging
+import time
+
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, Text, func, select, text, tuple_
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TABLE = "migration_checkpoint"
+
+
+class MigrationError(Exception):
+    pass
+
+
+def normalize_url(url):
+    # Render y Heroku entregan postgres://; SQLAlchemy 2 solo acepta postgresql://
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def checkpoint_table():
+    return Table(
+        CHECKPOINT_TABLE, MetaData(),
+        Column("table_name", String(100), primary_key=True),
+        Column("last_key", Text),  # JSON con la última PK copiada
+        Column("rows", Integer, nullable=False, default=0),
+        Column("done", Boolean, nullable=False, default=False),
+    )
+
+
+def select_tables(metadata, names=None):
+    """Tablas en orden de dependencias; con ``names``, solo esas (y sus padres deben estar)."""
+    tables = metadata.sorted_tables
+    if not names:
+        return tables
+    unknown = set(names) - {t.name for t in tables}
+    if unknown:
+        raise MigrationError(f"Tablas desconocidas: {', '.join(sorted(unknown))}")
+    selected = [t for t in tables if t.name in names]
+    for table in selected:
+        for fk in table.foreign_keys:
+            if fk.column.table.name not in names:
+                raise MigrationError(f"{table.name} depende de {fk.column.table.name}: inclúyala también")
+    return selected
+
+
+def _after(pk, last):
+    if len(pk) == 1:
+        return pk[0] > last[0]
+    return tuple_(*pk) > tuple_(*last)
+
+
+def iter_batches(conn, table, batch_size, after=None):
+    """Filas de ``table`` en lotes ordenados por PK, desde la clave ``after`` (exclusiva)."""
+    pk = list(table.primary_key.columns)
+    while True:
+        query = select(table).order_by(*pk).limit(batch_size)
+        if after is not None:
+            query = query.where(_after(pk, after))
+        rows = conn.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after = [rows[-1]._mapping[c] for c in pk]
+
+
+def preflight(source, tables):
+    """Filas que el destino rechazaría: FKs huérfanas y textos más largos que su columna."""
+    problems = []
+    with source.connect() as conn:
+        for table in tables:
+            for fk in table.foreign_keys:
+                parent = fk.column.table.alias()
+                orphans = conn.execute(
+                    select(func.count()).select_from(
+                        table.outerjoin(parent, fk.parent == parent.c[fk.column.name])
+                    ).where(fk.parent.isnot(None), parent.c[fk.column.name].is_(None))
+                ).scalar()
+                if orphans:
+                    problems.append(f"{table.name}.{fk.parent.name}: {orphans} filas apuntan a un "
+                                    f"{fk.column.table.name} inexistente")
+            for column in table.columns:
+                length = getattr(column.type, "length", None)
+                if isinstance(column.type, String) and length:
+                    too_long = conn.execute(
+                        select(func.count()).select_from(table).where(func.length(column) > length)
+                    ).scalar()
+                    if too_long:
+                        problems.append(f"{table.name}.{column.name}: {too_long} valores superan {length} caracteres")
+    return problems
+
+
+def copy_table(source, target, table, checkpoints, batch_size=5000, pause=0.0):
+    """Copia (o retoma) una tabla. Devuelve las filas copiadas en total."""
+    pk = list(table.primary_key.columns)
+    with target.connect() as conn:
+        state = conn.execute(select(checkpoints).where(checkpoints.c.table_name == table.name)).first()
+        if state is None:
+            existing = conn.execute(select(func.count()).select_from(table)).scalar()
+            if existing:
+                raise MigrationError(f"{table.name} ya tiene {existing} filas en el destino y no hay checkpoint")
+    if state is not None and state.done:
+        return state.rows
+    if state is None:
+        with target.begin() as conn:
+            conn.execute(checkpoints.insert().values(table_name=table.name, rows=0, done=False))
+    after = json.loads(state.last_key) if state is not None and state.last_key else None
+    copied = state.rows if state is not None else 0
+    started = time.monotonic()
+
+    with source.connect() as conn:
+        for rows in iter_batches(conn, table, batch_size, after):
+            last = [rows[-1]._mapping[c] for c in pk]
+            copied += len(rows)
+            # Lote y checkpoint en la misma transacción: o quedan ambos o ninguno
+            with target.begin() as tconn:
+                tconn.execute(table.insert(), [dict(row._mapping) for row in rows])
+                tconn.execute(
+                    checkpoints.update().where(checkpoints.c.table_name == table.name)
+                    .values(last_key=json.dumps(last), rows=copied)
+                )
+            logger.info("%s: %s filas (%.0f/s)", table.name, copied,
+                        len(rows) / max(time.monotonic() - started, 1e-6))
+            started = time.monotonic()
+            if pause:
+                time.sleep(pause)
+
+    with target.begin() as tconn:
+        tconn.execute(checkpoints.update().where(checkpoints.c.table_name == table.name).values(done=True))
+    return copied
+
+
+def reset_sequences(target, tables):
+    """Deja las secuencias de Postgres después del mayor id copiado. Devuelve las tablas ajustadas."""
+    if target.dialect.name != "postgresql":
+        # SQLite sin AUTOINCREMENT toma max(rowid) + 1: no hay nada que ajustar
+        return []
+    preparer = target.dialect.identifier_preparer
+    adjusted = []
+    with target.begin() as conn:
+        for table in tables:
+            column = table.autoincrement_column
+            if column is None:
+                continue
+            name = preparer.format_table(table)
+            conn.execute(
+                text(f"SELECT setval(pg_get_serial_sequence(:table, :column), "
+                     f"COALESCE((SELECT MAX({preparer.quote(column.name)}) FROM {name}), 0) + 1, false)"),
+                {"table": name, "column": column.name},
+            )
+            adjusted.append(table.name)
+    return adjusted
+
+
+def table_digest(conn, table, batch_size=5000):
+    """(filas, checksum) independiente del orden: la collation de las PK de texto cambia entre motores."""
+    count = total = 0
+    for rows in iter_batches(conn, table, batch_size):
+        for row in rows:
+            digest = hashlib.sha256(json.dumps(list(row), default=str).encode()).digest()
+            total = (total + int.from_bytes(digest[:8], "big")) % 2 ** 64
+            count += 1
+    return count, f"{total:016x}"
+
+
+def verify(source, target, tables, batch_size=5000):
+    """Compara conteo y checksum de cada tabla. Devuelve {tabla: {...}}."""
+    report = {}
+    with source.connect() as sconn, target.connect() as tconn:
+        for table in tables:
+            source_rows, source_sum = table_digest(sconn, table, batch_size)
+            target_rows, target_sum = table_digest(tconn, table, batch_size)
+            report[table.name] = {
+                "source_rows": source_rows,
+                "target_rows": target_rows,
+                "checksum": source_sum,
+                "ok": source_rows == target_rows and source_sum == target_sum,
+            }
+    return report
+
+
+def migrate(source, target, metadata, tables=None, batch_size=5000, pause=0.0):
+    """Preflight, esquema, copia por lotes, secuencias y verificación. Devuelve el reporte."""
+    tables = select_tables(metadata, tables)
+    problems = preflight(source, tables)
+    if problems:
+        raise MigrationError("El destino rechazaría filas del origen:\n  " + "\n  ".join(problems))
+
+    checkpoints = checkpoint_table()
+    metadata.create_all(target, tables=tables)
+    checkpoints.create(target, checkfirst=True)
+    copied = {}
+    for table in tables:
+        copied[table.name] = copy_table(source, target, table, checkpoints, batch_size, pause)
+    sequences = reset_sequences(target, tables)
+
+    report = verify(source, target, tables, batch_size)
+    ok = all(entry["ok"] for entry in report.values())
+    if ok:
+        # Terminada y verificada: un nuevo intento debe partir de un destino vacío
+        checkpoints.drop(target)
+    return {"ok": ok, "copied": copied, "sequences": sequences, "tables": report}
@@ -0,0 +1,120 @@
+"""
+Read/write routing for ``db.session``.
+
+Views decorated with ``@read_only`` (the public GETs: news, events,
+members) run their queries on the ``read`` bind: a separate engine with
+its own pool, without autoflush. Everything else (admin, enrollments,
+applications, auth) stays on the primary, as before. Inside a read-only
+request, once the session has something to flush, every later query goes
+to the primary too, so a request always reads its own writes (without
+autoflush, pending changes are not visible to any query until a flush).
+
+The read bind comes from ``DATABASE_READ_URL``:
+
+- a URL: a replica (Postgres streaming replica, LiteFS, etc.).
+- unset, with SQLite: a second, read-only connection to the same file
+  (``mode=ro``), with the database switched to WAL. In WAL mode readers
+  never take the write lock and a writer never waits for readers, so
+  anonymous traffic stops competing with admin writes. It also sees
+  every commit immediately.
+- ``primary``: no routing; everything uses the primary engine.
+"""
+import os
+import sqlite3
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+READ_BIND = "read"
+
+# session.info: la sesión ya escribió en esta request (lee del primario desde entonces)
+WROTE = "db_routing_wrote"
+
+
+def _reading():
+    return has_request_context() and g.get("db_read", False)
+
+
+class RoutingSession(Session):
+    """``db.session`` que manda las lecturas de vistas ``@read_only`` al bind ``read``."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and _reading()
+            and not self._flushing
+            and not self.info.get(WROTE)
+        ):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        if self._flushing:
+            self.info[WROTE] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Decorador de vista: consultas en el bind de lectura y sin autoflush."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read = True
+        session = current_app.extensions["sqlalchemy"].session
+        with session.no_autoflush:
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def sqlite_path(app, url):
+    """Ruta absoluta de un SQLite en archivo (relativa a instance_path, como Flask-SQLAlchemy) o None."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return None
+    path = url.database[5:] if url.query.get("uri") else url.database
+    if path.startswith("file:"):
+        path = path[5:]
+    return path if os.path.isabs(path) else os.path.join(app.instance_path, path)
+
+
+def enable_wal(path):
+    """Pasa el archivo a journal_mode=WAL (queda guardado en el archivo). Devuelve el modo final."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        return conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def read_bind(app):
+    """Opciones del engine de lectura para SQLALCHEMY_BINDS, o None sin enrutamiento."""
+    configured = app.config["DATABASE_READ_URL"]
+    if configured == "primary":
+        return None
+    if configured:
+        url = configured
+    else:
+        path = sqlite_path(app, app.config["SQLALCHEMY_DATABASE_URI"])
+        # Sin WAL una conexión de lectura bloquearía los commits: se queda en el primario
+        if path is None or not app.config["SQLITE_WAL"]:
+            return None
+        url = f"sqlite:///file:{path}?mode=ro&uri=true"
+    size = app.config["DB_READ_POOL_SIZE"]
+    return {"url": url, "pool_size": size, "max_overflow": size, "pool_pre_ping": True}
+
+
+def init_db_routing(app):
+    """Configura WAL y el bind ``read``; debe correr antes de ``db.init_app``."""
+    app.config.setdefault("DATABASE_READ_URL", None)
+    app.config.setdefault("SQLITE_WAL", True)
+    app.config.setdefault("DB_READ_POOL_SIZE", 5)
+
+    path = sqlite_path(app, app.config["SQLALCHEMY_DATABASE_URI"])
+    if path is not None and app.config["SQLITE_WAL"]:
+        enable_wal(path)
+    options = read_bind(app)
+    if options is not None:
+        binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+        binds[READ_BIND] = options
+        app.config["SQLALCHEMY_BINDS"] = binds
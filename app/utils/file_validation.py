@@ -1,6 +1,8 @@
 """File upload validation utilities for secure file handling"""
 import os
 
+from PIL import Image
+
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
 ALLOWED_DOCUMENT_EXTENSIONS = {'.pdf', '.doc', '.docx'}
@@ -11,6 +13,14 @@ MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
 MAX_DOCUMENT_SIZE = 20 * 1024 * 1024  # 20MB
 MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100MB
 
+# Image dimension limits, checked from the header before decoding: a few MB of
+# compressed data can expand to GBs of pixels (decompression bomb)
+MAX_IMAGE_PIXELS = 50_000_000  # 50 MP (phone cameras top out around 48 MP)
+MAX_IMAGE_DIMENSION = 12000
+
+# Pillow's own guard, as a last line of defence for any other decode path
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
 # Image magic numbers (file signatures)
 IMAGE_SIGNATURES = {
     b'\xFF\xD8\xFF': 'jpeg',  # JPEG
@@ -50,6 +60,15 @@ def detect_image_type(file_path):
         return None
 
 
+def image_dimensions_error(width, height):
+    """Return an error message if the dimensions exceed the limits, else None"""
+    if width > MAX_IMAGE_DIMENSION or height > MAX_IMAGE_DIMENSION:
+        return f"Image dimensions too large (max {MAX_IMAGE_DIMENSION}px per side)"
+    if width * height > MAX_IMAGE_PIXELS:
+        return f"Image has too many pixels (max {MAX_IMAGE_PIXELS // 1_000_000} MP)"
+    return None
+
+
 def validate_image(file_path):
     """Validate image file using extension and file signature"""
     try:
@@ -67,6 +86,15 @@ def validate_image(file_path):
         if not img_type:
             return False, "File is not a valid image"
         
+        # Check dimensions (Image.open only parses the header)
+        try:
+            with Image.open(file_path) as img:
+                error = image_dimensions_error(*img.size)
+        except Image.DecompressionBombError:
+            error = f"Image has too many pixels (max {MAX_IMAGE_PIXELS // 1_000_000} MP)"
+        if error:
+            return False, error
+        
         return True, f"image/{img_type}"
     except Exception as e:
         return False, f"Error validating image: {str(e)}"
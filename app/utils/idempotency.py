@@ -0,0 +1,204 @@
+"""
+``Idempotency-Key`` support for retried POSTs.
+
+The first request with a given key claims it by inserting a ``pending`` row
+(the primary key makes the claim atomic across workers), runs the view and
+stores its response. Retries within ``IDEMPOTENCY_TTL`` seconds get that
+stored response back (with ``Idempotent-Replayed: true``) without running
+validation, queries or file writes again; a retry that arrives while the
+first request is still running gets a 409.
+
+Keys are scoped to the route and the client (JWT identity, or IP for
+anonymous requests), so two clients that happen to send the same key never
+see each other's responses. The row also keeps a SHA-256 of the request
+body (form fields and file contents for forms): reusing a key with a
+different body is answered 422 instead of replaying a response to another
+request, e.g. the 400 of a form the client has since corrected. Server errors and 429s are not
+stored so the client can retry them. Expired keys are evicted lazily.
+
+A ``pending`` claim only lasts ``IDEMPOTENCY_LEASE`` seconds: if the worker
+dies mid-request (timeout, recycling) the key can be claimed again after
+that instead of answering 409 for the whole TTL. The view's session is
+rolled back before the response is stored, so an error response that left
+a flush uncommitted does not hold the SQLite write lock against the store.
+"""
+import hashlib
+import logging
+import random
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import delete, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models.idempotency import IdempotencyKey
+from .rate_limit import client_ip
+
+logger = logging.getLogger("app.idempotency")
+
+MAX_KEY_LENGTH = 128
+
+_table = IdempotencyKey.__table__
+
+
+def _error(message, status):
+    return jsonify({"error": message}), status
+
+
+def _client():
+    """Identidad del cliente para el scope: usuario del JWT o, sin sesión, la IP."""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    return f"user:{identity}" if identity else f"ip:{client_ip()}"
+
+
+def _fingerprint():
+    """SHA-256 del cuerpo; en formularios, de los campos y el contenido de los archivos."""
+    digest = hashlib.sha256()
+    if request.mimetype in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"{name}={value}\n".encode())
+        for name, file in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f"{name}:{file.filename}\n".encode())
+            for chunk in iter(lambda: file.stream.read(64 * 1024), b""):
+                digest.update(chunk)
+            # La vista vuelve a leer el archivo desde el principio
+            file.stream.seek(0)
+    else:
+        digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _claim(key_hash, scope, request_hash, now, lease):
+    """Inserta la fila ``pending`` por ``lease`` segundos. Devuelve None si se obtuvo la clave o la fila existente."""
+    with db.engine.begin() as conn:
+        try:
+            conn.execute(insert(_table).values(
+                key_hash=key_hash, scope=scope, request_hash=request_hash, status="pending",
+                created_at=now, expires_at=now + timedelta(seconds=lease),
+            ))
+            return None
+        except IntegrityError:
+            pass
+    with db.engine.begin() as conn:
+        # Si expiró (o venció la reserva de un worker caído) se reutiliza como una
+        # clave nueva; el UPDATE es condicional: sólo un worker la toma
+        renewed = conn.execute(update(_table).where(
+            _table.c.key_hash == key_hash, _table.c.expires_at <= now,
+        ).values(
+            status="pending", request_hash=request_hash,
+            response_status=None, response_body=None, response_mimetype=None,
+            created_at=now, expires_at=now + timedelta(seconds=lease),
+        ))
+        if renewed.rowcount:
+            return None
+        return conn.execute(select(_table).where(_table.c.key_hash == key_hash)).first()
+
+
+def _release(key_hash):
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(delete(_table).where(_table.c.key_hash == key_hash))
+    except Exception as e:
+        # La reserva vence sola tras IDEMPOTENCY_LEASE
+        logger.warning("idempotency release failed: %s", e)
+
+
+def _store(key_hash, response, expires_at):
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(update(_table).where(_table.c.key_hash == key_hash).values(
+                status="done",
+                response_status=response.status_code,
+                response_body=response.get_data(as_text=True),
+                response_mimetype=response.mimetype,
+                expires_at=expires_at,
+            ))
+    except Exception as e:
+        # Sin respuesta guardada un reintento vuelve a ejecutar la vista: mejor que 409 por horas
+        logger.warning("idempotency store failed: %s", e)
+        _release(key_hash)
+
+
+def _replay(row):
+    response = current_app.response_class(row.response_body, status=row.response_status,
+                                          mimetype=row.response_mimetype)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def purge_expired(now=None):
+    with db.engine.begin() as conn:
+        result = conn.execute(delete(_table).where(_table.c.expires_at <= (now or datetime.utcnow())))
+    return result.rowcount
+
+
+def idempotent(view):
+    """Decorador de vista: repite la primera respuesta para reintentos con la misma ``Idempotency-Key``."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return view(*args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return _error("Idempotency-Key inválida", 400)
+
+        scope = f"{request.method} {request.path} {_client()}"
+        key_hash = hashlib.sha256(f"{scope}\n{key}".encode()).hexdigest()
+        request_hash = _fingerprint()
+        now = datetime.utcnow()
+        row = _claim(key_hash, scope[:100], request_hash, now, current_app.config["IDEMPOTENCY_LEASE"])
+        if row is not None:
+            if row.request_hash != request_hash:
+                return _error("Idempotency-Key ya usada con otro contenido; envíe una clave nueva", 422)
+            if row.status != "done":
+                response = make_response(_error("La solicitud original sigue en proceso", 409))
+                response.headers["Retry-After"] = "1"
+                return response
+            return _replay(row)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            db.session.rollback()
+            _release(key_hash)
+            raise
+        # Lo que la vista no confirmó se descarta: un flush pendiente retiene el
+        # lock de escritura de SQLite y el UPDATE de abajo esperaría el busy timeout
+        db.session.rollback()
+        if response.status_code >= 500 or response.status_code == 429:
+            _release(key_hash)
+        else:
+            _store(key_hash, response, now + timedelta(seconds=current_app.config["IDEMPOTENCY_TTL"]))
+
+        if random.random() < 0.01:
+            try:
+                purge_expired(now)
+            except Exception as e:
+                logger.warning("idempotency purge failed: %s", e)
+        return response
+    return wrapper
+
+
+def ensure_schema():
+    """Recrea la tabla si le falta ``request_hash`` (create_all no agrega columnas).
+
+    Solo guarda respuestas de reintentos por IDEMPOTENCY_TTL: perderlas en
+    la actualización equivale a que hayan vencido.
+    """
+    columns = {c["name"] for c in inspect(db.engine).get_columns(_table.name)}
+    if "request_hash" not in columns:
+        _table.drop(db.engine)
+        _table.create(db.engine)
+
+
+def init_idempotency(app):
+    app.config.setdefault("IDEMPOTENCY_TTL", 86400)
+    app.config.setdefault("IDEMPOTENCY_LEASE", 60)
@@ -0,0 +1,209 @@
+"""
+Format-aware image encoder.
+
+Chooses the output format from the content instead of always flattening to
+JPEG: photos without transparency become progressive JPEG, photos with
+transparency lossy WebP (keeps the alpha channel), and graphics (few
+distinct colours: logos, diagrams, screenshots) lossless PNG, palettised
+when they fit in 256 colours. For the lossy formats the quality is
+binary-searched to land under a byte budget. EXIF orientation is applied to
+the pixels and no metadata (EXIF, XMP, ICC, comments) is written. The file
+is written atomically with the extension that matches its format; animated
+images are left untouched.
+
+Large uploads are never decoded at full size when it can be avoided: the
+header dimensions are checked against ``MAX_IMAGE_PIXELS`` /
+``MAX_IMAGE_DIMENSION`` before any pixel is read, JPEGs are decoded through
+``draft()`` (libjpeg DCT scaling to 1/2, 1/4 or 1/8) at the smallest scale
+that still covers the target size, and the final resize uses ``reducing_gap`` so most of the shrinking is
+a cheap box reduce before the LANCZOS pass.
+"""
+import math
+import os
+import tempfile
+from collections import namedtuple
+from io import BytesIO
+
+from PIL import ExifTags, Image, ImageOps
+
+from .file_validation import image_dimensions_error
+
+EncodeResult = namedtuple("EncodeResult", "path format quality bytes width height")
+
+EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png", "GIF": ".gif"}
+
+# Un gráfico tiene a lo sumo tantos colores distintos en una miniatura de 128px
+# y sus colores más frecuentes cubren gran parte de la superficie (zonas planas);
+# lo segundo separa los gráficos de las fotos en escala de grises
+GRAPHIC_MAX_COLORS = 256
+GRAPHIC_FLAT_COLORS = 8
+GRAPHIC_FLAT_SHARE = 0.5
+
+# Decodificar/reducir con reduce() hasta ~2x el tamaño final y terminar con
+# LANCZOS: visualmente igual a LANCZOS directo y varias veces más rápido
+REDUCING_GAP = 2.0
+
+# Orientaciones EXIF que rotan 90°: el ancho final sale del alto almacenado
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+MIN_QUALITY = 50
+# La búsqueda de calidad avanza en pasos de 5: cada prueba es una codificación completa
+QUALITY_STEP = 5
+
+
+def has_alpha(img):
+    """True si la imagen tiene algún pixel no opaco."""
+    if img.mode == "P":
+        if "transparency" not in img.info:
+            return False
+        img = img.convert("RGBA")
+    if img.mode in ("RGBA", "LA", "PA"):
+        low, _ = img.getchannel("A").getextrema()
+        return low < 255
+    return False
+
+
+def is_graphic(img):
+    """Pocos colores distintos (logos, diagramas, capturas) => codificación sin pérdida."""
+    # resize NEAREST toma pixeles sin copiar ni convertir la imagen completa
+    scale = min(1, 128 / max(img.size))
+    sample = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.Resampling.NEAREST)
+    if sample.mode not in ("RGB", "RGBA"):
+        sample = sample.convert("RGBA")
+    colors = sample.getcolors(maxcolors=GRAPHIC_MAX_COLORS)
+    if colors is None:
+        return False
+    flat = sum(count for count, _ in sorted(colors, reverse=True)[:GRAPHIC_FLAT_COLORS])
+    return flat >= GRAPHIC_FLAT_SHARE * sample.width * sample.height
+
+
+def _encode(img, fmt, quality, probe=False):
+    buffer = BytesIO()
+    if fmt == "JPEG":
+        img.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "WEBP":
+        # Las pruebas de la búsqueda usan el método rápido: pesa algo más que
+        # el método 4, así que la calidad elegida sigue cabiendo en el presupuesto
+        img.save(buffer, "WEBP", quality=quality, method=0 if probe else 4)
+    else:
+        img.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _search_quality(img, fmt, max_quality, byte_budget):
+    """Mayor calidad en [MIN_QUALITY, max_quality] cuyo resultado cabe en ``byte_budget``."""
+    data = _encode(img, fmt, max_quality)
+    if not byte_budget or len(data) <= byte_budget:
+        return data, max_quality
+    levels = list(range(MIN_QUALITY, max_quality, QUALITY_STEP))
+    best = None
+    low, high = 0, len(levels) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        candidate = _encode(img, fmt, levels[mid], probe=True)
+        if len(candidate) <= byte_budget:
+            best = (candidate, levels[mid])
+            low = mid + 1
+        else:
+            high = mid - 1
+    # Ni la calidad mínima cabe: se entrega la mínima (el presupuesto es un objetivo, no un rechazo)
+    data, quality = best or (None, MIN_QUALITY)
+    if data is None or fmt == "WEBP":
+        data = _encode(img, fmt, quality)
+    return data, quality
+
+
+def draft(img, max_width, max_height):
+    """Pide al decodificador JPEG la menor escala que siga cubriendo el destino.
+
+    Debe llamarse antes de cargar pixeles; en otros formatos no hace nada.
+    Tiene en cuenta la rotación EXIF, que se aplica después.
+    """
+    if img.format != "JPEG":
+        return
+    width, height = img.size
+    if img.getexif().get(ExifTags.Base.Orientation) in _ROTATED_ORIENTATIONS:
+        max_width, max_height = max_height, max_width
+    scale = min(max_width / width, max_height / height)
+    if scale >= 1:
+        return
+    # El escalado DCT de libjpeg ya promedia bien: basta no quedar bajo el destino
+    img.draft(img.mode, (math.ceil(width * scale), math.ceil(height * scale)))
+
+
+def prepare(img, max_width, max_height):
+    """Orientación EXIF aplicada, modo normalizado y tamaño acotado. Devuelve (imagen, formato)."""
+    draft(img, max_width, max_height)
+    ImageOps.exif_transpose(img, in_place=True)
+    alpha = has_alpha(img)
+    graphic = is_graphic(img)
+
+    # Reducir antes de convertir: la conversión es una copia completa y así
+    # se hace sobre la imagen chica (resize no interpola en modo P ni 1)
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGBA" if alpha else "RGB")
+    if img.width > max_width or img.height > max_height:
+        img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+    if graphic:
+        fmt = "PNG"
+        img = img.convert("RGBA" if alpha else "RGB")
+    elif alpha:
+        fmt = "WEBP"
+        img = img.convert("RGBA")
+    else:
+        fmt = "JPEG"
+        img = img.convert("RGB")
+
+    if graphic:
+        # Paleta adaptativa: mismo aspecto, bastante menos bytes. Tras reducir,
+        # el suavizado de bordes agrega tonos intermedios; 256 colores los cubren.
+        colors = img.getcolors(maxcolors=GRAPHIC_MAX_COLORS)
+        method = Image.Quantize.FASTOCTREE if alpha else Image.Quantize.MEDIANCUT
+        img = img.quantize(colors=len(colors) if colors else GRAPHIC_MAX_COLORS, method=method)
+    return img, fmt
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".encode-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def encode_image(image_path, max_width=1920, max_height=1080, max_quality=85, byte_budget=None):
+    """Re-codifica ``image_path`` en el formato adecuado.
+
+    Devuelve (EncodeResult, imagen preparada). Si la extensión cambia el
+    archivo original se elimina y ``result.path`` apunta al nuevo.
+    """
+    with Image.open(image_path) as img:
+        # Solo lee el encabezado: las bombas de descompresión se rechazan sin decodificar
+        error = image_dimensions_error(*img.size)
+        if error:
+            raise ValueError(error)
+        if getattr(img, "is_animated", False):
+            img.load()
+            return EncodeResult(image_path, img.format, None, os.path.getsize(image_path),
+                                img.width, img.height), img.convert("RGBA")
+        prepared, fmt = prepare(img, max_width, max_height)
+
+    if fmt == "PNG":
+        data, quality = _encode(prepared, fmt, None), None
+    else:
+        data, quality = _search_quality(prepared, fmt, max_quality, byte_budget)
+
+    stem, ext = os.path.splitext(image_path)
+    target = image_path if EXTENSIONS[fmt] == ext.lower() or (fmt == "JPEG" and ext.lower() == ".jpeg") else stem + EXTENSIONS[fmt]
+    _write_atomic(target, data)
+    if target != image_path:
+        os.remove(image_path)
+    return EncodeResult(target, fmt, quality, len(data), prepared.width, prepared.height), prepared
@@ -0,0 +1,75 @@
+"""
+Image metadata stored alongside records that reference uploaded images.
+
+The upload routes collect width, height, byte size, dominant colour and a
+tiny LQIP from the image ``optimize_image`` already prepared and store
+them keyed by ``/uploads/...`` URL. ``embed`` adds them to list/detail
+payloads with a single ``IN`` query and swaps the URL for the storage
+backend's public one when it has a stable URL (CDN).
+"""
+import os
+
+from PIL import Image
+
+from ..extensions import db
+from ..models.image_metadata import ImageMetadata
+from . import storage
+from .image_processing import describe_image
+
+UPLOADS_PREFIX = storage.UPLOADS_PREFIX
+
+
+def record(file_url, metadata):
+    """Agrega/actualiza la fila en la sesión actual (se guarda con el commit de la ruta)."""
+    if not file_url or not metadata:
+        return None
+    row = db.session.get(ImageMetadata, file_url) or ImageMetadata(file_url=file_url)
+    row.width = metadata.get("width")
+    row.height = metadata.get("height")
+    row.bytes = metadata.get("bytes")
+    row.dominant_color = metadata.get("dominant_color")
+    row.lqip = metadata.get("lqip")
+    db.session.add(row)
+    return row
+
+
+def forget(file_url):
+    if file_url and file_url.startswith(UPLOADS_PREFIX):
+        ImageMetadata.query.filter_by(file_url=file_url).delete(synchronize_session=False)
+
+
+def embed(items, url_key="image_url", field="image"):
+    """Agrega ``field`` con la metadata de ``item[url_key]`` a cada dict de ``items``."""
+    urls = {item.get(url_key) for item in items if (item.get(url_key) or "").startswith(UPLOADS_PREFIX)}
+    found = {}
+    if urls:
+        found = {m.file_url: m.to_dict() for m in ImageMetadata.query.filter(ImageMetadata.file_url.in_(urls))}
+    for item in items:
+        item[field] = found.get(item.get(url_key))
+        item[url_key] = storage.public_url(item.get(url_key))
+    return items
+
+
+def describe_file(key):
+    """Metadata de un archivo ya guardado (para imágenes subidas antes de esta tabla)."""
+    with storage.get_storage().local_copy(key) as path, Image.open(path) as img:
+        width, height = img.size
+        # Color y placeholder salen de una miniatura: JPEG puede decodificar a escala reducida
+        img.draft("RGB", (max(1, width // 8), max(1, height // 8)))
+        metadata = describe_image(img)
+        metadata.update(width=width, height=height, bytes=os.path.getsize(path))
+    return metadata
+
+
+def backfill(urls):
+    """Genera metadata para las URLs locales que no la tengan. Devuelve (creadas, fallidas)."""
+    existing = {m.file_url for m in ImageMetadata.query.with_entities(ImageMetadata.file_url)}
+    created, failed = 0, []
+    for url in sorted({u for u in urls if storage.key_from_url(u)} - existing):
+        try:
+            record(url, describe_file(storage.key_from_url(url)))
+            created += 1
+        except (OSError, ValueError, storage.StorageError) as e:
+            failed.append((url, str(e)))
+    db.session.commit()
+    return created, failed
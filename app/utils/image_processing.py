@@ -1,49 +1,100 @@
 """
 Image processing utilities for optimizing uploaded images.
 """
+import base64
+import logging
 import os
+import time
+from flask import current_app, has_app_context
 from PIL import Image
 from io import BytesIO
+from .image_encoder import encode_image
+from .request_timing import track
+from . import metrics
 
+logger = logging.getLogger(__name__)
 
-def optimize_image(image_path, max_width=1920, max_height=1080, quality=85):
+
+def flatten(img, background=(255, 255, 255)):
+    """
+    RGB copy of ``img`` with any transparency composited onto ``background``.
+    
+    ``img.convert("RGB")`` drops the alpha channel and keeps whatever colour
+    the transparent pixels happen to store (often black).
+    """
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        canvas = Image.new("RGB", rgba.size, background)
+        canvas.paste(rgba, mask=rgba.getchannel("A"))
+        return canvas
+    return img.convert("RGB")
+
+
+def describe_image(img):
+    """
+    Extract layout metadata from an already decoded image.
+    
+    Transparent areas are composited onto white first, as the site shows
+    them, so they do not count as their stored (usually black) colour.
+    
+    Returns:
+        dict: width, height, dominant_color ("#rrggbb") and lqip (a tiny
+        base64 WebP data URI usable as a blurred placeholder)
+    """
+    img = flatten(img)
+    # Dominant colour: most frequent entry of a 4-colour palette of a small copy
+    small = img.copy()
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=4)
+    count, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    
+    placeholder = img.copy()
+    placeholder.thumbnail((16, 16))
+    buffer = BytesIO()
+    placeholder.save(buffer, 'WEBP', quality=40)
+    
+    return {
+        "width": img.width,
+        "height": img.height,
+        "dominant_color": f"#{r:02x}{g:02x}{b:02x}",
+        "lqip": "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode(),
+    }
+
+
+def optimize_image(image_path, max_width=1920, max_height=1080, quality=85, metadata=None, byte_budget=None):
     """
-    Optimize an image by resizing and compressing it.
+    Optimize an image by resizing and re-encoding it in the format that fits
+    its content (see image_encoder): progressive JPEG for photos, WebP for
+    photos with transparency, PNG for graphics. EXIF orientation is applied
+    and metadata stripped.
     
     Args:
         image_path: Path to the image file
         max_width: Maximum width in pixels
         max_height: Maximum height in pixels
-        quality: JPEG quality (1-100, higher is better)
+        quality: Maximum quality for lossy formats (1-100)
+        metadata: Optional dict filled with describe_image() output and the
+            final byte size, reusing this decode
+        byte_budget: Optional target size in bytes; quality is lowered (down
+            to image_encoder.MIN_QUALITY) until the output fits
     
     Returns:
-        bool: True if optimization succeeded, False otherwise
+        str | None: Final path (the extension may change with the format),
+        or None if optimization failed
     """
     try:
-        with Image.open(image_path) as img:
-            # Convert RGBA to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize if image is larger than max dimensions
-            if img.width > max_width or img.height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # Save optimized image
-            img.save(image_path, 'JPEG', quality=quality, optimize=True)
-            return True
+        result, img = encode_image(image_path, max_width, max_height, quality, byte_budget)
+        if metadata is not None:
+            metadata.update(describe_image(img))
+            metadata["bytes"] = result.bytes
+        return result.path
     except Exception as e:
-        print(f"Error optimizing image: {e}")
-        return False
+        logger.warning("Error optimizing image %s: %s", image_path, e)
+        return None
 
 
-def process_uploaded_image(file_path, max_width=1920, max_height=1080, quality=85):
+def process_uploaded_image(file_path, max_width=1920, max_height=1080, quality=85, metadata=None, byte_budget=None):
     """
     Process an uploaded image file by optimizing it.
     
@@ -52,24 +103,32 @@ def process_uploaded_image(file_path, max_width=1920, max_height=1080, quality=8
         max_width: Maximum width in pixels
         max_height: Maximum height in pixels
         quality: JPEG quality (1-100)
+        metadata: Optional dict filled with the image metadata (see optimize_image)
+        byte_budget: Target size in bytes (defaults to IMAGE_BYTE_BUDGET)
     
     Returns:
-        tuple: (success: bool, message: str)
+        tuple: (success: bool, message: str, path: str) where path is the
+        final file (its extension follows the chosen format)
     """
     if not os.path.exists(file_path):
-        return False, "File not found"
+        return False, "File not found", file_path
+    if byte_budget is None and has_app_context():
+        byte_budget = current_app.config.get("IMAGE_BYTE_BUDGET")
     
     # Get file size before optimization
     size_before = os.path.getsize(file_path)
     
     # Optimize the image
-    success = optimize_image(file_path, max_width, max_height, quality)
+    start = time.perf_counter()
+    with track("image"):
+        final_path = optimize_image(file_path, max_width, max_height, quality, metadata, byte_budget)
+    metrics.observe("image_processing_duration_seconds", time.perf_counter() - start)
     
-    if not success:
-        return False, "Failed to optimize image"
+    if not final_path:
+        return False, "Failed to optimize image", file_path
     
     # Get file size after optimization
-    size_after = os.path.getsize(file_path)
+    size_after = os.path.getsize(final_path)
     reduction = ((size_before - size_after) / size_before) * 100 if size_before > 0 else 0
     
-    return True, f"Image optimized (reduced by {reduction:.1f}%)"
+    return True, f"Image optimized (reduced by {reduction:.1f}%)", final_path
@@ -0,0 +1,186 @@
+"""
+On-demand resized variants of uploaded images.
+
+``/uploads/<file>?w=400&fmt=webp`` renders the image at one of the allowed
+widths (``IMAGE_VARIANT_WIDTHS``) and formats, caching the result under
+``IMAGE_CACHE_DIR`` (a hidden directory on the local volume, whatever the
+storage backend). The cache file name hashes the source name and its storage
+version (size and mtime locally), so replacing a source invalidates its
+variants. Rendering takes an ``flock`` on a per-variant lock
+file: concurrent requests for the same variant, in any worker, wait for the
+first one and then serve its file. Hits refresh the file mtime (at most once
+a minute) and, after each render, the least recently used variants are
+evicted until the cache fits ``IMAGE_CACHE_MAX_BYTES``.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+from . import metrics, storage
+from .image_encoder import REDUCING_GAP, draft
+from .request_timing import track
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+    "png": ("PNG", "image/png", {"optimize": True}),
+}
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+_TOUCH_INTERVAL = 60
+
+
+class VariantError(Exception):
+    pass
+
+
+def cache_dir():
+    return current_app.config["IMAGE_CACHE_DIR"]
+
+
+def parse_request(filename, args):
+    """Valida ``w``/``fmt`` de la query. Devuelve (ancho, formato) o None si no se pidió variante."""
+    if "w" not in args and "fmt" not in args:
+        return None
+    if os.path.splitext(filename)[1].lower() not in SOURCE_EXTENSIONS:
+        raise VariantError("El archivo no es una imagen")
+    try:
+        width = int(args.get("w", 0))
+    except ValueError:
+        raise VariantError("Ancho inválido")
+    if width and width not in current_app.config["IMAGE_VARIANT_WIDTHS"]:
+        allowed = ", ".join(str(w) for w in current_app.config["IMAGE_VARIANT_WIDTHS"])
+        raise VariantError(f"Ancho no permitido (usa {allowed})")
+    fmt = (args.get("fmt") or "webp").lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in FORMATS:
+        raise VariantError("Formato no permitido (webp, jpeg, png)")
+    return width, fmt
+
+
+def _variant_name(filename, version, width, fmt):
+    key = f"{filename}:{version}:{width}:{fmt}"
+    return f"{hashlib.sha1(key.encode()).hexdigest()[:20]}.{fmt}"
+
+
+def _render(source, target, width, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(source) as img:
+        if width:
+            draft(img, width, float("inf"))
+        img = ImageOps.exif_transpose(img)
+        if width and img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+        if pil_format == "JPEG" and img.mode != "RGB":
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            else:
+                img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".render-", suffix=f".{fmt}")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                img.save(f, pil_format, **options)
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+def _touch(path):
+    try:
+        if time.time() - os.stat(path).st_mtime > _TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def evict(directory, max_bytes, keep=None):
+    """Borra las variantes menos usadas hasta quedar bajo el 90% del presupuesto (salvo ``keep``)."""
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.startswith(".") or entry.name.endswith(".lock"):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    target = max_bytes * 0.9
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        if path == keep:
+            continue
+        for stale in (path, path + ".lock"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed += 1
+    metrics.inc("image_variant_evictions_total", removed)
+    return removed
+
+
+def get_variant(filename, width, fmt):
+    """Ruta de la variante en cache, renderizándola (una sola vez entre workers) si falta.
+
+    FileNotFoundError si el original no existe en el almacenamiento.
+    """
+    store = storage.get_storage()
+    version = store.version(filename)
+    if version is None:
+        raise FileNotFoundError(filename)
+    directory = cache_dir()
+    name = _variant_name(filename, version, width, fmt)
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        metrics.inc("image_variant_requests_total", outcome="hit")
+        _touch(path)
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        if os.path.exists(path):
+            # Otro request la renderizó mientras esperábamos el lock
+            metrics.inc("image_variant_requests_total", outcome="coalesced")
+            return path
+        start = time.perf_counter()
+        with track("image"), store.local_copy(filename) as source:
+            _render(source, path, width, fmt)
+        metrics.observe("image_processing_duration_seconds", time.perf_counter() - start)
+        metrics.inc("image_variant_requests_total", outcome="miss")
+    evict(directory, current_app.config["IMAGE_CACHE_MAX_BYTES"], keep=path)
+    return path
+
+
+def mimetype(fmt):
+    return FORMATS[fmt][1]
+
+
+def init_image_variants(app):
+    app.config.setdefault("IMAGE_VARIANT_WIDTHS", (160, 320, 400, 640, 960, 1280))
+    app.config.setdefault("IMAGE_CACHE_DIR", os.path.join(os.path.abspath(app.config["UPLOAD_DIR"]), ".cache", "variants"))
+    app.config.setdefault("IMAGE_CACHE_MAX_BYTES", 100 * 1024 * 1024)
@@ -0,0 +1,195 @@
+"""
+Load shedding and per-request deadlines.
+
+Every request gets a deadline ``REQUEST_DEADLINE_MS`` after it reached the
+proxy (``X-Request-Start``) or, without that header, after the worker picked
+it up. The header is only read with ``SHED_TRUST_REQUEST_START``, i.e. when
+the proxy in front strips the client's copy and sets its own; otherwise any
+client could claim to have waited an hour. Queue wait is smoothed per worker
+over non-exempt requests, each sample capped at ``SHED_MAX_WAIT_SAMPLE_MS``
+so a few outliers cannot pin the average above the limit. When it or the
+number of requests in flight in this process goes over budget, low-priority endpoints
+(``SHED_LOW_PRIORITY``) are answered right away with 503 + ``Retry-After``
+instead of queuing behind the database. A request whose deadline already
+passed while queued is shed no matter its priority.
+
+The remaining time is propagated downstream: SQLite statements are
+interrupted through a progress handler (``statement_timeout`` is set on
+PostgreSQL connections) and outbound HTTP calls take ``http_timeout()``.
+``/api/health`` and admin writes are never shed and have no deadline.
+"""
+import contextvars
+import logging
+import threading
+import time
+
+from flask import g, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import Pool
+
+from . import metrics
+
+logger = logging.getLogger("app.load_shedding")
+
+# Deadline (time.time()) de la request en curso; None si no tiene
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+_lock = threading.Lock()
+_state = {"in_flight": 0, "queue_wait": 0.0}
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def parse_request_start(value, now=None):
+    """``X-Request-Start`` (``t=<epoch>`` en s, ms o µs) -> epoch en segundos, o None."""
+    if not value:
+        return None
+    try:
+        stamp = float(value.strip().removeprefix("t="))
+    except ValueError:
+        return None
+    if stamp > 1e14:
+        stamp /= 1e6
+    elif stamp > 1e11:
+        stamp /= 1e3
+    now = time.time() if now is None else now
+    # Relojes desfasados: un inicio en el futuro o de hace más de una hora no sirve
+    if stamp > now + 1 or stamp < now - 3600:
+        return None
+    return stamp
+
+
+def remaining(default=None):
+    """Segundos hasta el deadline de la request actual (``default`` si no hay deadline)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return deadline - time.time()
+
+
+def deadline_exceeded():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def http_timeout(default):
+    """Timeout para llamadas HTTP salientes: el menor entre ``default`` y el tiempo restante."""
+    left = remaining()
+    if left is None:
+        return default
+    return max(0.1, min(default, left))
+
+
+def _exempt():
+    if request.path == "/api/health":
+        return True
+    return request.blueprint == "admin" and request.method not in READ_METHODS
+
+
+def _shed(reason, retry_after):
+    metrics.inc("requests_shed_total", reason=reason,
+                route=request.url_rule.rule if request.url_rule else "unmatched")
+    logger.warning("request shed", extra={"data": {
+        "reason": reason,
+        "path": request.path,
+        "queue_wait_ms": round(_state["queue_wait"] * 1000, 1),
+        "in_flight": _state["in_flight"],
+    }})
+    response = jsonify({"error": "Servidor sobrecargado, intenta nuevamente en unos segundos"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def _progress_handler():
+    # SQLite la llama cada N instrucciones de la VM; distinto de 0 interrumpe la sentencia
+    deadline = _deadline.get()
+    return 1 if deadline is not None and time.time() > deadline else 0
+
+
+def _on_connect(dbapi_conn, conn_record):
+    if hasattr(dbapi_conn, "set_progress_handler"):
+        dbapi_conn.set_progress_handler(_progress_handler, 10000)
+
+
+def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+    if not type(dbapi_conn).__module__.startswith("psycopg"):
+        return
+    left = remaining()
+    cursor = dbapi_conn.cursor()
+    try:
+        if left is None:
+            cursor.execute("SET statement_timeout = 0")
+        else:
+            cursor.execute(f"SET statement_timeout = {max(1, int(left * 1000))}")
+    finally:
+        cursor.close()
+
+
+def init_load_shedding(app):
+    app.config.setdefault("REQUEST_DEADLINE_MS", 25000)
+    app.config.setdefault("SHED_QUEUE_WAIT_MS", 1000)
+    app.config.setdefault("SHED_TRUST_REQUEST_START", False)
+    app.config.setdefault("SHED_MAX_WAIT_SAMPLE_MS", 2000)
+    app.config.setdefault("SHED_MAX_IN_FLIGHT", 0)
+    app.config.setdefault("SHED_LOW_PRIORITY", ("public.instagram_recent", "public.members_list"))
+
+    if not event.contains(Engine, "connect", _on_connect):
+        event.listen(Engine, "connect", _on_connect)
+        event.listen(Pool, "checkout", _on_checkout)
+
+    @app.before_request
+    def _admit_request():
+        now = time.time()
+        started = now
+        if app.config["SHED_TRUST_REQUEST_START"]:
+            started = parse_request_start(request.headers.get("X-Request-Start"), now) or now
+        wait = min(now - started, app.config["SHED_MAX_WAIT_SAMPLE_MS"] / 1000.0)
+        exempt = _exempt()
+        with _lock:
+            if not exempt:
+                # Media móvil: una sola request lenta no basta para declarar sobrecarga
+                _state["queue_wait"] = 0.8 * _state["queue_wait"] + 0.2 * wait
+            _state["in_flight"] += 1
+        g.load_shedding_admitted = True
+        if exempt:
+            return None
+
+        budget_ms = app.config["REQUEST_DEADLINE_MS"]
+        if budget_ms:
+            deadline = started + budget_ms / 1000.0
+            if deadline <= now:
+                return _shed("deadline", 5)
+            g.load_shedding_token = _deadline.set(deadline)
+
+        if request.endpoint in app.config["SHED_LOW_PRIORITY"]:
+            max_wait = app.config["SHED_QUEUE_WAIT_MS"] / 1000.0
+            max_in_flight = app.config["SHED_MAX_IN_FLIGHT"]
+            if max_wait and max(wait, _state["queue_wait"]) > max_wait:
+                return _shed("queue_wait", 10)
+            if max_in_flight and _state["in_flight"] > max_in_flight:
+                return _shed("in_flight", 5)
+        return None
+
+    @app.teardown_request
+    def _release_request(exc):
+        if g.pop("load_shedding_admitted", False):
+            with _lock:
+                _state["in_flight"] -= 1
+        token = g.pop("load_shedding_token", None)
+        if token is not None:
+            _deadline.reset(token)
+
+    @app.errorhandler(OperationalError)
+    def _deadline_error(e):
+        # Sentencia SQLite interrumpida por el progress handler (o statement_timeout)
+        if deadline_exceeded():
+            metrics.inc("requests_shed_total", reason="deadline_sql",
+                        route=request.url_rule.rule if request.url_rule else "unmatched")
+            response = jsonify({"error": "La solicitud excedió el tiempo máximo"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            return response
+        raise e
@@ -0,0 +1,219 @@
+"""
+Structured, non-blocking logging.
+
+Handlers on the request path only enqueue records: a ``QueueHandler`` on the
+root logger feeds a ``QueueListener`` thread that does the actual formatting
+and stdout/file I/O. Records carry the request id (taken from
+``X-Request-ID`` or generated) and are rendered as one JSON object per line.
+Per-logger levels come from ``LOG_LEVELS`` and low-severity lines can be
+sampled (``LOG_DEBUG_SAMPLE_RATE`` for DEBUG, ``LOG_SAMPLING`` per logger).
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+_REQUEST_ID = re.compile(r"^[\w.-]{1,64}$")
+_listener = None
+_queue_handler = None
+
+# Atributos estándar de LogRecord: todo lo demás llegó por ``extra``
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def parse_mapping(value, cast=str):
+    """'a=1,b.c=2' -> {'a': cast('1'), 'b.c': cast('2')}"""
+    result = {}
+    for part in (value or "").split(","):
+        if "=" not in part:
+            continue
+        key, raw = part.split("=", 1)
+        result[key.strip()] = cast(raw.strip())
+    return result
+
+
+class RequestContextFilter(logging.Filter):
+    """Agrega ``request_id`` al record en el thread que loguea (antes de encolar)."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id", "-")
+        else:
+            record.request_id = "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Descarta una fracción de los records de baja severidad."""
+
+    def __init__(self, debug_rate=1.0, per_logger=None):
+        super().__init__()
+        self.debug_rate = debug_rate
+        self.per_logger = per_logger or {}
+
+    def _rate_for(self, name):
+        while name:
+            if name in self.per_logger:
+                return self.per_logger[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate_for(record.name)
+        if rate is None and record.levelno <= logging.DEBUG:
+            rate = self.debug_rate
+        return rate is None or rate >= 1.0 or random.random() < rate
+
+
+def _extra_fields(record):
+    fields = {k: v for k, v in vars(record).items() if k not in _RESERVED}
+    data = fields.pop("data", None)
+    if isinstance(data, dict):
+        fields.update(data)
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Ya formateado por DroppingQueueHandler.prepare en el thread de la request
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("[%(asctime)s] %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + json.dumps(fields, default=str, ensure_ascii=False)
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta el record si la cola está llena (nunca bloquea)."""
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        # El prepare de la librería formatea el record completo y pega el
+        # traceback al mensaje; aquí solo se resuelven los args y el traceback
+        # va aparte en exc_text, para que el formatter del listener los separe
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(level="INFO", fmt="json", levels=None, debug_sample_rate=1.0,
+                      sampling=None, log_file=None, queue_size=10000, stream="stdout"):
+    """Instala QueueHandler en el root logger y arranca el QueueListener."""
+    global _listener, _queue_handler
+
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    _stop_listener()
+
+    formatter = JsonFormatter() if fmt == "json" else TextFormatter()
+    outputs = [logging.StreamHandler(sys.stderr if stream == "stderr" else sys.stdout)]
+    if log_file:
+        outputs.append(logging.handlers.WatchedFileHandler(log_file))
+    for handler in outputs:
+        handler.setFormatter(formatter)
+
+    # Cola acotada: si el listener se atrasa se pierden líneas en vez de bloquear requests
+    log_queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestContextFilter())
+    _queue_handler.addFilter(SamplingFilter(debug_sample_rate, sampling))
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *outputs, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def init_logging(app):
+    app.config.setdefault("LOG_LEVEL", "INFO")
+    app.config.setdefault("LOG_FORMAT", "json")
+    app.config.setdefault("LOG_LEVELS", {})
+    app.config.setdefault("LOG_DEBUG_SAMPLE_RATE", 1.0)
+    app.config.setdefault("LOG_SAMPLING", {})
+    app.config.setdefault("LOG_FILE", None)
+    app.config.setdefault("LOG_STREAM", "stdout")
+
+    configure_logging(
+        level=app.config["LOG_LEVEL"],
+        fmt=app.config["LOG_FORMAT"],
+        levels=app.config["LOG_LEVELS"],
+        debug_sample_rate=app.config["LOG_DEBUG_SAMPLE_RATE"],
+        sampling=app.config["LOG_SAMPLING"],
+        log_file=app.config["LOG_FILE"],
+        stream=app.config["LOG_STREAM"],
+    )
+    # Flask agrega su propio StreamHandler síncrono al logger "app": quitarlo
+    # para que todo pase por la cola del root logger.
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(logging.NOTSET)
+
+    @app.before_request
+    def _assign_request_id():
+        incoming = request.headers.get("X-Request-ID", "")
+        g.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+    @app.after_request
+    def _return_request_id(response):
+        if "request_id" in g:
+            response.headers["X-Request-ID"] = g.request_id
+        return response
+
+
+atexit.register(_stop_listener)
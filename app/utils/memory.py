@@ -0,0 +1,229 @@
+"""
+Worker memory diagnostics.
+
+Each worker periodically publishes its RSS through a per-worker snapshot so
+an admin request served by any worker can report all of them.
+
+``tracemalloc`` is controlled through ``MEMORY_DIR/control.json``: the admin
+endpoints write the desired state (tracing on or off, and a snapshot
+sequence number), and every worker applies it before its next request,
+whichever worker the admin request happened to reach. Snapshots are dumped
+to ``tracemalloc-<pid>-<ms>.snap`` (the two most recent per worker), so any
+worker can list or diff the allocation sites of any other.
+"""
+import glob
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from .worker_store import pid_alive, read_json, read_snapshots, write_json, write_snapshot
+
+CONTROL_FILE = "control.json"
+
+_lock = threading.Lock()
+_state = {
+    "started_at": datetime.utcnow().isoformat(),
+    "requests": 0,
+    "last_publish": 0.0,
+    "directory": os.path.join(tempfile.gettempdir(), "slacc-memory"),
+    "control_mtime": None,
+    "snapshot_seq": 0,
+}
+
+
+def rss_bytes():
+    """RSS actual del proceso (Linux /proc; en otros sistemas el pico de getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _worker_info():
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "requests": _state["requests"],
+        "started_at": _state["started_at"],
+        "tracemalloc": tracemalloc.is_tracing(),
+        "snapshots": len(_snapshot_files(os.getpid())),
+        "updated_at": datetime.utcnow().isoformat(),
+    }
+
+
+def publish(force=False, interval=10.0):
+    now = time.monotonic()
+    if not force and now - _state["last_publish"] < interval:
+        return
+    _state["last_publish"] = now
+    try:
+        write_snapshot(_state["directory"], _worker_info(), prefix="mem")
+    except OSError:
+        pass
+
+
+def workers():
+    """RSS de todos los workers vivos (el actual siempre fresco)."""
+    publish(force=True)
+    items = []
+    for pid, info in read_snapshots(_state["directory"], prefix="mem"):
+        if not pid_alive(pid):
+            for path in [os.path.join(_state["directory"], f"mem-{pid}.json")] + _snapshot_files(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            continue
+        info["current"] = pid == os.getpid()
+        items.append(info)
+    items.sort(key=lambda i: i["rss_bytes"], reverse=True)
+    return items
+
+
+def _snapshot_files(pid):
+    """Snapshots de tracemalloc de un worker, del más viejo al más nuevo."""
+    return sorted(glob.glob(os.path.join(_state["directory"], f"tracemalloc-{pid}-*.snap")))
+
+
+def _control():
+    return read_json(os.path.join(_state["directory"], CONTROL_FILE)) or {"tracing": False, "nframes": 10, "snapshot": 0}
+
+
+def set_tracing(enabled, nframes=10):
+    """Pide a todos los workers activar o desactivar tracemalloc; este lo aplica ya."""
+    with _lock:
+        control = _control()
+        control.update(tracing=bool(enabled), nframes=nframes)
+        write_json(os.path.join(_state["directory"], CONTROL_FILE), control)
+    apply_control(force=True)
+    return control
+
+
+def request_snapshot():
+    """Pide un snapshot a todos los workers; este lo toma ya. Devuelve el de este worker."""
+    with _lock:
+        control = _control()
+        if not control["tracing"]:
+            raise RuntimeError("tracemalloc no está activo")
+        control["snapshot"] += 1
+        write_json(os.path.join(_state["directory"], CONTROL_FILE), control)
+    apply_control(force=True)
+    files = _snapshot_files(os.getpid())
+    current, peak = tracemalloc.get_traced_memory()
+    return {"pid": os.getpid(), "snapshot": control["snapshot"], "snapshots": len(files),
+            "traced_bytes": current, "traced_peak_bytes": peak}
+
+
+def apply_control(force=False):
+    """Lleva este worker al estado de ``control.json`` si cambió desde la última vez."""
+    path = os.path.join(_state["directory"], CONTROL_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return
+    if not force and mtime == _state["control_mtime"]:
+        return
+    _state["control_mtime"] = mtime
+    control = read_json(path)
+    if control is None:
+        return
+    if not control["tracing"]:
+        if tracemalloc.is_tracing():
+            _stop_tracing()
+    elif not tracemalloc.is_tracing():
+        tracemalloc.start(control["nframes"])
+        # Los snapshots pedidos antes de empezar a trazar no aplican a este worker
+        _state["snapshot_seq"] = control["snapshot"]
+    elif control["snapshot"] > _state["snapshot_seq"]:
+        _state["snapshot_seq"] = control["snapshot"]
+        _take_snapshot()
+    # /memory muestra el estado nuevo de este worker sin esperar al próximo publish
+    publish(force=True)
+
+
+def _stop_tracing():
+    tracemalloc.stop()
+    for path in _snapshot_files(os.getpid()):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _take_snapshot():
+    """Toma un snapshot de tracemalloc a disco y conserva los dos últimos de este worker."""
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    os.makedirs(_state["directory"], exist_ok=True)
+    path = os.path.join(_state["directory"], f"tracemalloc-{os.getpid()}-{int(time.time() * 1000)}.snap")
+    snapshot.dump(path)
+    for old in _snapshot_files(os.getpid())[:-2]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def _taken_at(path):
+    ms = int(os.path.basename(path).rsplit("-", 1)[1].split(".")[0])
+    return datetime.utcfromtimestamp(ms / 1000).isoformat()
+
+
+def top_allocations(limit=20, compare=False, group_by="lineno", pid=None):
+    """Sitios con más memoria del último snapshot de ``pid``, o la diferencia contra el anterior."""
+    pid = pid or os.getpid()
+    if not pid_alive(pid):
+        raise RuntimeError(f"No hay un worker con pid {pid}")
+    files = _snapshot_files(pid)
+    if not files:
+        raise RuntimeError(f"No hay snapshots del worker {pid}")
+    latest = tracemalloc.Snapshot.load(files[-1])
+    result = {"pid": pid, "taken_at": _taken_at(files[-1]), "group_by": group_by, "items": []}
+    if compare:
+        if len(files) < 2:
+            raise RuntimeError("Se necesitan dos snapshots para comparar")
+        result["compared_to"] = _taken_at(files[0])
+        for stat in latest.compare_to(tracemalloc.Snapshot.load(files[0]), group_by)[:limit]:
+            frame = stat.traceback[0]
+            result["items"].append({
+                "site": f"{frame.filename}:{frame.lineno}",
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            })
+    else:
+        for stat in latest.statistics(group_by)[:limit]:
+            frame = stat.traceback[0]
+            result["items"].append({
+                "site": f"{frame.filename}:{frame.lineno}",
+                "size_bytes": stat.size,
+                "count": stat.count,
+            })
+    return result
+
+
+def init_memory_diagnostics(app):
+    app.config.setdefault("MEMORY_DIR", _state["directory"])
+    _state["directory"] = app.config["MEMORY_DIR"]
+
+    @app.before_request
+    def _apply_memory_control():
+        apply_control()
+
+    @app.teardown_request
+    def _count_request(exc):
+        _state["requests"] += 1
+        publish()
@@ -0,0 +1,339 @@
+"""
+Multi-worker Prometheus metrics.
+
+Each worker keeps counters, gauges and histograms in an in-process registry
+(a dict update under a lock on the hot path) and periodically dumps a
+snapshot to ``METRICS_DIR/worker-<pid>.json`` with an atomic rename. The
+``/api/metrics`` endpoint merges every worker's snapshot and renders the
+Prometheus text exposition format. Counters and histograms of workers that
+already exited are folded into ``totals.json`` and their snapshot removed,
+so totals stay monotonic even when the OS hands the same pid to a new
+worker (its first flush folds the previous owner's file before replacing
+it). Their gauges are dropped.
+
+``http_requests_in_flight`` does not go through the snapshot: it changes
+twice per request, after the last flush. Each worker rewrites its value
+in place in ``inflight-<pid>.json`` (one ``pwrite``, no rename) on every
+change, and the endpoint adds up the files of live workers.
+"""
+import fcntl
+import os
+import secrets
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from .request_timing import on_query
+from .worker_store import pid_alive, read_json, read_snapshots, snapshot_path, write_json, write_snapshot
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "http_requests_total": ("counter", "Requests atendidas por ruta, método y status"),
+    "http_request_duration_seconds": ("histogram", "Latencia de requests por ruta"),
+    "http_requests_in_flight": ("gauge", "Requests en curso"),
+    "db_pool_checkouts_total": ("counter", "Conexiones obtenidas del pool de SQLAlchemy"),
+    "db_query_duration_seconds": ("histogram", "Duración de sentencias SQL"),
+    "image_processing_duration_seconds": ("histogram", "Duración de la optimización de imágenes"),
+    "instagram_fetch_total": ("counter", "Resultados de la consulta a Instagram"),
+    "rate_limited_total": ("counter", "Requests rechazadas por rate limiting"),
+    "requests_shed_total": ("counter", "Requests rechazadas por sobrecarga o deadline vencido"),
+    "image_variant_requests_total": ("counter", "Variantes de imagen servidas (hit, miss, coalesced)"),
+    "image_variant_evictions_total": ("counter", "Variantes de imagen eliminadas del cache por LRU"),
+    "upload_gc_files_total": ("counter", "Archivos subidos en cuarentena, borrados o restaurados por el GC"),
+    "views_recorded_total": ("counter", "Vistas de noticias y eventos registradas en memoria"),
+    "view_counts_flushed_total": ("counter", "Filas de contadores de vistas escritas en lote (UPSERT)"),
+}
+
+
+class Registry:
+    """Métricas de este proceso. Las claves son (nombre, labels ordenados)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge_add(self, name, amount, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+                    break
+            hist[1] += 1
+            hist[2] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "buckets": list(self.buckets),
+                "counters": _encode(self.counters.items()),
+                "gauges": _encode(self.gauges.items()),
+                "histograms": _encode((k, [list(v[0]), v[1], v[2]]) for k, v in self.histograms.items()),
+            }
+
+
+def _encode(items):
+    return [[name, [list(pair) for pair in labels], value] for (name, labels), value in items]
+
+
+def _key_of(metric, labels):
+    return metric, tuple(tuple(p) for p in labels)
+
+
+registry = Registry()
+
+TOTALS_FILE = "totals.json"
+
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+# Identidad de este proceso: el pid solo no alcanza si el sistema lo reutiliza
+_process = {"pid": None, "token": None, "claimed": False}
+_inflight = {"pid": None, "fd": None, "value": 0}
+_inflight_lock = threading.Lock()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def inflight_add(directory, amount):
+    """Actualiza el in-flight de este worker en su archivo, sin esperar al próximo flush."""
+    pid = os.getpid()
+    with _inflight_lock:
+        if _inflight["pid"] != pid:
+            # Primer uso en este proceso (o worker recién forkeado): el fd heredado no es nuestro
+            _inflight.update(pid=pid, fd=None, value=0)
+        _inflight["value"] += amount
+        try:
+            if _inflight["fd"] is None:
+                os.makedirs(directory, exist_ok=True)
+                _inflight["fd"] = os.open(snapshot_path(directory, pid, "inflight"), os.O_WRONLY | os.O_CREAT, 0o644)
+            # Ancho fijo: cada escritura pisa entera a la anterior y el JSON sigue siendo válido
+            os.pwrite(_inflight["fd"], f"{_inflight['value']:<20}".encode(), 0)
+        except OSError:
+            pass
+
+
+@contextmanager
+def _totals_lock(directory):
+    """``flock`` exclusivo para mover snapshots a ``totals.json`` sin sumarlos dos veces."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".totals.lock"), "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def _accumulate(counters, histograms, snap):
+    for metric, labels, value in snap.get("counters", ()):
+        key = _key_of(metric, labels)
+        counters[key] = counters.get(key, 0) + value
+    for metric, labels, (counts, count, total) in snap.get("histograms", ()):
+        merged = histograms.setdefault(_key_of(metric, labels), [[0] * len(counts), 0, 0.0])
+        merged[0] = [a + b for a, b in zip(merged[0], counts)]
+        merged[1] += count
+        merged[2] += total
+
+
+def _fold(directory, pids_snapshots):
+    """Suma snapshots a ``totals.json`` y borra sus archivos. Se llama con el lock tomado."""
+    path = os.path.join(directory, TOTALS_FILE)
+    totals = read_json(path) or {}
+    counters, histograms = {}, {}
+    _accumulate(counters, histograms, totals)
+    buckets = totals.get("buckets", list(DEFAULT_BUCKETS))
+    for _, snap in pids_snapshots:
+        buckets = snap.get("buckets", buckets)
+        _accumulate(counters, histograms, snap)
+    write_json(path, {
+        "buckets": buckets,
+        "counters": _encode(counters.items()),
+        "histograms": _encode(histograms.items()),
+    })
+    for pid, _ in pids_snapshots:
+        try:
+            os.remove(snapshot_path(directory, pid))
+        except FileNotFoundError:
+            pass
+
+
+def _claim(directory, token):
+    """Antes del primer flush: si el archivo de este pid es de un proceso anterior, lo pasa a los totales."""
+    pid = os.getpid()
+    previous = read_json(snapshot_path(directory, pid))
+    if previous is not None and previous.get("token") != token:
+        _fold(directory, [(pid, previous)])
+
+
+def flush(directory, force=False, interval=5.0):
+    """Escribe el snapshot de este worker si pasó ``interval`` desde el último."""
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < interval:
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = now
+        if _process["pid"] != os.getpid():
+            _process.update(pid=os.getpid(), token=secrets.token_hex(8), claimed=False)
+        snap = registry.snapshot()
+        snap["token"] = _process["token"]
+        if _process["claimed"]:
+            write_snapshot(directory, snap)
+        else:
+            with _totals_lock(directory):
+                _claim(directory, _process["token"])
+                write_snapshot(directory, snap)
+            _process["claimed"] = True
+    except OSError:
+        pass
+    finally:
+        _flush_lock.release()
+
+
+def collect(directory):
+    """Combina los totales de workers terminados con los snapshots de todos los vivos."""
+    counters, gauges, histograms = {}, {}, {}
+    with _totals_lock(directory):
+        snapshots = list(read_snapshots(directory))
+        dead = [(pid, snap) for pid, snap in snapshots if not pid_alive(pid)]
+        if dead:
+            _fold(directory, dead)
+        totals = read_json(os.path.join(directory, TOTALS_FILE)) or {}
+    buckets = totals.get("buckets", list(DEFAULT_BUCKETS))
+    _accumulate(counters, histograms, totals)
+    folded = {pid for pid, _ in dead}
+    for pid, snap in snapshots:
+        if pid in folded:
+            continue
+        buckets = snap.get("buckets", buckets)
+        _accumulate(counters, histograms, snap)
+        for metric, labels, value in snap["gauges"]:
+            key = _key_of(metric, labels)
+            gauges[key] = gauges.get(key, 0) + value
+    for pid, value in read_snapshots(directory, prefix="inflight"):
+        if pid_alive(pid):
+            key = ("http_requests_in_flight", ())
+            gauges[key] = gauges.get(key, 0) + value
+        else:
+            try:
+                os.remove(snapshot_path(directory, pid, "inflight"))
+            except FileNotFoundError:
+                pass
+    return buckets, counters, gauges, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render(buckets, counters, gauges, histograms):
+    lines = []
+    seen = set()
+
+    def header(metric):
+        if metric in seen:
+            return
+        seen.add(metric)
+        kind, text = HELP.get(metric, ("untyped", metric))
+        lines.append(f"# HELP {metric} {text}")
+        lines.append(f"# TYPE {metric} {kind}")
+
+    for (metric, labels), value in sorted(counters.items()):
+        header(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for (metric, labels), value in sorted(gauges.items()):
+        header(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for (metric, labels), (counts, count, total) in sorted(histograms.items()):
+        header(metric)
+        cumulative = 0
+        for bound, n in zip(buckets, counts):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+    registry.inc("db_pool_checkouts_total")
+
+
+def _observe_query(conn, statement, parameters, executemany, elapsed):
+    registry.observe("db_query_duration_seconds", elapsed)
+
+
+def init_metrics(app):
+    """Registra hooks de request y listeners de SQLAlchemy."""
+    app.config.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "slacc-metrics"))
+    app.config.setdefault("METRICS_TOKEN", None)
+    app.config.setdefault("METRICS_FLUSH_INTERVAL", 5.0)
+
+    if not event.contains(Pool, "checkout", _on_checkout):
+        event.listen(Pool, "checkout", _on_checkout)
+    on_query(_observe_query)
+
+    directory = app.config["METRICS_DIR"]
+    interval = app.config["METRICS_FLUSH_INTERVAL"]
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_start = time.perf_counter()
+        inflight_add(directory, 1)
+
+    @app.teardown_request
+    def _metrics_end(exc):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        inflight_add(directory, -1)
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        status = g.pop("metrics_status", 500 if exc else 200)
+        registry.inc("http_requests_total", method=request.method, route=route, status=status)
+        registry.observe("http_request_duration_seconds", time.perf_counter() - start, route=route)
+        flush(directory, interval=interval)
+
+    @app.after_request
+    def _metrics_status(response):
+        g.metrics_status = response.status_code
+        return response
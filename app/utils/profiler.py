@@ -0,0 +1,215 @@
+"""
+Opt-in sampling profiler for live requests.
+
+A request is profiled when it carries a valid signed token in the
+``X-Profile`` header or when it is picked by the low-rate random sampling
+mode (``PROFILE_SAMPLE_RATE``). Tokens are issued by an admin for one method
+and path and are single-use: their nonce is recorded under
+``PROFILE_DIR/.used`` the first time they are accepted, so a leaked token
+cannot be replayed to profile other requests. A background
+thread samples the handler thread's stack every ``PROFILE_INTERVAL_MS`` and
+the result is written in folded-stack format (one ``frame;frame;frame count``
+line per stack, ready for flamegraph tools) to ``PROFILE_DIR``, keeping at
+most ``PROFILE_MAX_FILES`` files.
+"""
+import hashlib
+import hmac
+import os
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+SAFE_NAME = re.compile(r"^[\w.-]+\.folded$")
+
+
+class SamplingProfiler:
+    """Muestrea periódicamente el stack de un thread."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+            self.count += 1
+
+    def folded(self):
+        return "\n".join(f"{stack} {n}" for stack, n in self.samples.most_common())
+
+
+def _secret(app):
+    return (app.config.get("PROFILE_SECRET") or app.config["JWT_SECRET_KEY"]).encode()
+
+
+def _sign(app, expires, nonce, method, path):
+    message = "\n".join((str(expires), nonce, method.upper(), path)).encode()
+    return hmac.new(_secret(app), message, hashlib.sha256).hexdigest()
+
+
+def issue_token(app, method, path, ttl=600):
+    """Token firmado ``<expira>.<nonce>.<hmac>`` para perfilar una request a ``method path``."""
+    expires = int(time.time()) + int(ttl)
+    nonce = secrets.token_hex(8)
+    return f"{expires}.{nonce}.{_sign(app, expires, nonce, method, path)}", expires
+
+
+def _consume(directory, expires, nonce):
+    """Registra el nonce; False si ya se había usado. Borra de paso los de tokens vencidos."""
+    used = os.path.join(directory, ".used")
+    os.makedirs(used, exist_ok=True)
+    now = time.time()
+    for name in os.listdir(used):
+        try:
+            if int(name.split("-", 1)[0]) < now:
+                os.remove(os.path.join(used, name))
+        except (ValueError, OSError):
+            pass
+    try:
+        os.close(os.open(os.path.join(used, f"{expires}-{nonce}"), os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return False
+    return True
+
+
+def verify_token(app, token, method, path):
+    """True si el token es válido para ``method path``; lo marca como usado."""
+    try:
+        expires, nonce, sig = token.split(".", 2)
+        if int(expires) < time.time() or not re.fullmatch(r"[0-9a-f]{16}", nonce):
+            return False
+    except (AttributeError, ValueError):
+        return False
+    if not hmac.compare_digest(sig, _sign(app, int(expires), nonce, method, path)):
+        return False
+    try:
+        return _consume(app.config["PROFILE_DIR"], int(expires), nonce)
+    except OSError:
+        return False
+
+
+def list_profiles(directory):
+    try:
+        names = [n for n in os.listdir(directory) if SAFE_NAME.match(n)]
+    except FileNotFoundError:
+        return []
+    items = []
+    for name in names:
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Rotado por otro worker entre listdir y stat
+            continue
+        items.append({
+            "name": name,
+            "size": st.st_size,
+            "created_at": datetime.utcfromtimestamp(st.st_mtime).isoformat(),
+        })
+    items.sort(key=lambda i: i["created_at"], reverse=True)
+    return items
+
+
+def _rotate(directory, max_files):
+    items = list_profiles(directory)
+    for item in items[max_files:]:
+        try:
+            os.remove(os.path.join(directory, item["name"]))
+        except OSError:
+            pass
+
+
+def _write_profile(app, profiler, reason, status):
+    directory = app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r"[^\w.-]", "_", request.endpoint or "unmatched")
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{endpoint}.folded"
+    header = [
+        f"# method: {request.method}",
+        f"# path: {request.path}",
+        f"# status: {status}",
+        f"# reason: {reason}",
+        f"# duration_ms: {profiler.elapsed * 1000:.1f}",
+        f"# samples: {profiler.count}",
+        f"# interval_ms: {profiler.interval * 1000:.1f}",
+    ]
+    tmp = os.path.join(directory, f".{name}.tmp")
+    with open(tmp, "w") as f:
+        f.write("\n".join(header) + "\n" + profiler.folded() + "\n")
+    os.replace(tmp, os.path.join(directory, name))
+    _rotate(directory, app.config["PROFILE_MAX_FILES"])
+    return name
+
+
+def init_profiler(app):
+    # Fuera de UPLOAD_DIR: /uploads es público
+    app.config.setdefault("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "slacc-profiles"))
+    app.config.setdefault("PROFILE_SECRET", None)
+    app.config.setdefault("PROFILE_SAMPLE_RATE", 0.0)
+    app.config.setdefault("PROFILE_INTERVAL_MS", 5.0)
+    app.config.setdefault("PROFILE_MAX_FILES", 50)
+
+    @app.before_request
+    def _maybe_start_profiler():
+        token = request.headers.get("X-Profile")
+        reason = None
+        if token and verify_token(app, token, request.method, request.path):
+            reason = "requested"
+        elif app.config["PROFILE_SAMPLE_RATE"] and random.random() < app.config["PROFILE_SAMPLE_RATE"]:
+            reason = "sampled"
+        if reason is None:
+            return
+        profiler = SamplingProfiler(threading.get_ident(), app.config["PROFILE_INTERVAL_MS"] / 1000.0)
+        profiler.start()
+        g.profiler = profiler
+        g.profiler_reason = reason
+
+    @app.after_request
+    def _stop_profiler(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        try:
+            name = _write_profile(app, profiler, g.pop("profiler_reason", ""), response.status_code)
+            response.headers["X-Profile-Id"] = name
+        except OSError as e:
+            app.logger.error(f"No se pudo guardar el perfil: {e}")
+        return response
+
+    @app.teardown_request
+    def _abort_profiler(exc):
+        # Si la request falló antes de after_request, detener el thread igual
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
@@ -0,0 +1,201 @@
+"""
+Token-bucket rate limiting shared across workers.
+
+Buckets live in a small SQLite file outside the application database
+(``RATELIMIT_DB``, WAL with ``synchronous=OFF``): one row per key holding
+the remaining tokens and the time of the last refill. A hit refills the
+bucket for the elapsed time and takes one token inside a single
+``BEGIN IMMEDIATE`` transaction, so every gunicorn worker sees the same
+state. Routes opt in with ``@rate_limit("<name>")``; the rules for each
+name (per client IP, per submitted email, or per email and IP together)
+come from ``RATELIMIT_RULES`` and rejected requests get a 429 with
+``Retry-After``. Login uses the email+IP pair: a bucket keyed on the email
+alone would let anyone lock a member out by failing logins with their
+address from elsewhere.
+If the limiter store fails the request is let through.
+"""
+import logging
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+from . import metrics
+
+logger = logging.getLogger("app.rate_limit")
+
+# nombre -> [(dimensión, capacidad, segundos para rellenar la capacidad completa)]
+DEFAULT_RULES = {
+    "login": [("ip", 20, 60), ("email_ip", 5, 300)],
+    "applications": [("ip", 5, 3600), ("email", 3, 86400)],
+    "enroll": [("ip", 20, 600), ("email", 5, 3600)],
+    "uploads": [("ip", 30, 3600)],
+}
+
+_local = threading.local()
+_SCHEMA = "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+
+
+def parse_rules(value):
+    """'login.ip=10/60,login.email=5/300' -> {'login': [('ip', 10, 60), ('email', 5, 300)]}"""
+    rules = {}
+    for part in (value or "").split(","):
+        if "=" not in part:
+            continue
+        name, spec = part.split("=", 1)
+        route, _, by = name.strip().partition(".")
+        limit, _, period = spec.strip().partition("/")
+        rules.setdefault(route, []).append((by or "ip", int(limit), float(period or 60)))
+    return rules
+
+
+def merge_rules(defaults, overrides):
+    """Aplica ``overrides`` sobre ``defaults`` por (ruta, dimensión): lo no mencionado se conserva."""
+    rules = {name: list(items) for name, items in defaults.items()}
+    for name, items in (overrides or {}).items():
+        current = rules.setdefault(name, [])
+        for rule in items:
+            # Reemplaza en su lugar: el orden decide qué bucket se cobra primero
+            index = next((i for i, (by, _, _) in enumerate(current) if by == rule[0]), None)
+            if index is None:
+                current.append(rule)
+            else:
+                current[index] = rule
+    return rules
+
+
+def _connection(path):
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == path:
+        return conn
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Estado descartable: no vale la pena un fsync por request
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(_SCHEMA)
+    _local.conn, _local.path = conn, path
+    return conn
+
+
+def hit(path, key, capacity, period, cost=1.0):
+    """Consume ``cost`` tokens del bucket ``key``. Devuelve (permitido, segundos a esperar)."""
+    rate = capacity / period
+    now = time.time()
+    conn = _connection(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        conn.execute(
+            "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+            (key, tokens, now),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if allowed:
+        return True, 0
+    return False, max(1, math.ceil((cost - tokens) / rate))
+
+
+def purge(path, older_than=86400):
+    """Elimina buckets sin actividad (a esa altura ya están llenos)."""
+    conn = _connection(path)
+    conn.execute("DELETE FROM buckets WHERE updated < ?", (time.time() - older_than,))
+
+
+def client_ip():
+    """IP del cliente, confiando sólo en los ``RATELIMIT_PROXY_COUNT`` proxies más cercanos."""
+    proxies = current_app.config["RATELIMIT_PROXY_COUNT"]
+    if proxies:
+        hops = [h.strip() for h in request.headers.get("X-Forwarded-For", "").split(",") if h.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.remote_addr or "unknown"
+
+
+def _submitted_email():
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        email = data.get("email") if isinstance(data, dict) else None
+    else:
+        email = request.form.get("email")
+    return (email or "").strip().lower() or None
+
+
+def _dimension(by):
+    """Valor de la request para la dimensión ``by`` (ip, email o email_ip), o None si falta."""
+    if by == "ip":
+        return client_ip()
+    email = _submitted_email()
+    if by == "email_ip":
+        return f"{email}|{client_ip()}" if email else None
+    return email
+
+
+def _too_many(retry_after):
+    response = jsonify({"error": "Demasiadas solicitudes, intenta nuevamente más tarde"})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def check(name):
+    """Aplica las reglas de ``name`` a la request actual. Devuelve una respuesta 429 o None."""
+    config = current_app.config
+    if not config["RATELIMIT_ENABLED"]:
+        return None
+    path = config["RATELIMIT_DB"]
+    retry_after = 0
+    try:
+        for by, capacity, period in config["RATELIMIT_RULES"].get(name, ()):
+            value = _dimension(by)
+            if not value:
+                continue
+            allowed, wait = hit(path, f"{name}:{by}:{value}", capacity, period)
+            if not allowed:
+                metrics.inc("rate_limited_total", route=name, by=by)
+                retry_after = max(retry_after, wait)
+                # Las reglas siguientes no se cobran si ya se rechazó
+                break
+        if random.random() < 0.001:
+            purge(path)
+    except sqlite3.Error as e:
+        logger.warning("rate limiter unavailable: %s", e)
+        return None
+    if retry_after:
+        logger.info("rate limited", extra={"data": {"route": name, "ip": client_ip(), "retry_after": retry_after}})
+        return _too_many(retry_after)
+    return None
+
+
+def rate_limit(name):
+    """Decorador de vista: limita la ruta según ``RATELIMIT_RULES[name]``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limited = check(name)
+            if limited is not None:
+                return limited
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_rate_limit(app):
+    app.config.setdefault("RATELIMIT_ENABLED", True)
+    app.config.setdefault("RATELIMIT_DB", os.path.join(tempfile.gettempdir(), "slacc-ratelimit.db"))
+    app.config.setdefault("RATELIMIT_PROXY_COUNT", 0)
+    app.config["RATELIMIT_RULES"] = merge_rules(DEFAULT_RULES, app.config.get("RATELIMIT_RULES"))
@@ -0,0 +1,173 @@
+"""
+Per-request timing instrumentation.
+
+Records wall time, SQL query count/time (via SQLAlchemy engine events) and
+time spent in tracked sections such as image processing and outbound HTTP.
+The result is emitted as a ``Server-Timing`` header and a structured log line
+(fields in ``extra["data"]``) on the ``app.request`` logger. Requests issuing more statements than
+``REQUEST_QUERY_BUDGET`` are logged as warnings so N+1 regressions stand out.
+
+This module owns the only ``before/after_cursor_execute`` pair in the app:
+metrics and the slow-query log subscribe through ``on_query`` and receive
+the elapsed time of every successful statement. A ``handle_error`` listener
+drops the start time of a failed statement, which ``after_cursor_execute``
+never sees.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("app.request")
+
+_current = ContextVar("request_timing", default=None)
+
+# conn.info: pila de (execution context, inicio) de las sentencias en curso
+_QUERY_START = "query_start"
+_observers = []
+
+
+class RequestTiming:
+    __slots__ = ("start", "queries", "sql_time", "sections")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.sections = {}
+
+    def add(self, name, elapsed):
+        self.sections[name] = self.sections.get(name, 0.0) + elapsed
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+def current_timing():
+    """Timing de la request en curso, o None fuera de una request."""
+    return _current.get()
+
+
+@contextmanager
+def track(name):
+    """Acumula el tiempo del bloque en la sección ``name`` de la request actual.
+
+    Fuera de una request es un no-op, así que puede usarse en utilidades
+    compartidas con scripts.
+    """
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+def on_query(callback):
+    """Llama ``callback(conn, statement, parameters, executemany, elapsed)`` tras cada sentencia exitosa."""
+    install_listeners()
+    if callback not in _observers:
+        _observers.append(callback)
+
+
+def install_listeners():
+    """Registra los listeners del engine una sola vez."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START, []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_QUERY_START)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()[1]
+    timing = _current.get()
+    if timing is not None:
+        timing.queries += 1
+        timing.sql_time += elapsed
+    for callback in _observers:
+        callback(conn, statement, parameters, executemany, elapsed)
+
+
+def _handle_error(exception_context):
+    # Sentencia fallida: after_cursor_execute no corre y el inicio quedaría en la pila
+    conn = exception_context.connection
+    starts = conn.info.get(_QUERY_START) if conn is not None else None
+    if starts and starts[-1][0] is exception_context.execution_context:
+        starts.pop()
+
+
+def _server_timing_header(timing, total):
+    parts = [
+        f"total;dur={total * 1000:.1f}",
+        f'db;dur={timing.sql_time * 1000:.1f};desc="{timing.queries} queries"',
+    ]
+    for name, elapsed in sorted(timing.sections.items()):
+        parts.append(f"{name};dur={elapsed * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def init_request_timing(app):
+    """Registra los hooks de Flask y los listeners del engine."""
+    app.config.setdefault("SERVER_TIMING_ENABLED", True)
+    app.config.setdefault("REQUEST_QUERY_BUDGET", 20)
+    app.config.setdefault("REQUEST_LOG_LEVEL", "INFO")
+    logger.setLevel(app.config["REQUEST_LOG_LEVEL"])
+
+    install_listeners()
+
+    @app.before_request
+    def _start_request_timing():
+        timing = RequestTiming()
+        g.request_timing = timing
+        g._request_timing_token = _current.set(timing)
+
+    @app.after_request
+    def _finish_request_timing(response):
+        timing = g.get("request_timing")
+        if timing is None:
+            return response
+        total = timing.elapsed
+        if app.config["SERVER_TIMING_ENABLED"]:
+            response.headers["Server-Timing"] = _server_timing_header(timing, total)
+
+        budget = app.config["REQUEST_QUERY_BUDGET"]
+        over_budget = bool(budget) and timing.queries > budget
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 2),
+            "db_queries": timing.queries,
+            "db_ms": round(timing.sql_time * 1000, 2),
+        }
+        for name, elapsed in timing.sections.items():
+            record[f"{name}_ms"] = round(elapsed * 1000, 2)
+        if over_budget:
+            record["query_budget"] = budget
+            record["query_budget_exceeded"] = True
+            logger.warning("request over query budget", extra={"data": record})
+        else:
+            logger.info("request", extra={"data": record})
+        return response
+
+    @app.teardown_request
+    def _reset_request_timing(exc):
+        token = g.pop("_request_timing_token", None)
+        if token is not None:
+            _current.reset(token)
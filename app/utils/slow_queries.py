@@ -0,0 +1,205 @@
+"""
+Slow-query log with automatic query plan capture.
+
+Every statement is timed by the engine listeners in ``request_timing``. Statements slower
+than ``SLOW_QUERY_MS`` are aggregated per fingerprint (literals and IN-lists
+normalised away) with count, total and max time, the calling route and the
+last parameters. The first occurrence of a fingerprint, and then at most one
+per ``SLOW_QUERY_LOG_INTERVAL`` seconds, is logged on ``app.slow_query``
+together with ``EXPLAIN QUERY PLAN`` (SQLite) or ``EXPLAIN`` output.
+Aggregates are shared across workers through per-worker snapshots so the
+admin endpoint can list the top offenders by total time.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from flask import has_request_context, request
+
+from .request_timing import on_query
+from .worker_store import read_snapshots, write_snapshot
+
+logger = logging.getLogger("app.slow_query")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+|'\?')\s*,?)+\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_stats = {}
+_last_logged = {}
+_last_flush = 0.0
+_config = {
+    "threshold": 0.1,
+    "log_interval": 60.0,
+    "directory": os.path.join(tempfile.gettempdir(), "slacc-slow-queries"),
+    "max_fingerprints": 500,
+}
+
+
+def fingerprint(statement):
+    """Normaliza la sentencia (literales, listas IN, espacios) y devuelve (hash, texto)."""
+    text = _STRING.sub("?", statement)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    text = _SPACES.sub(" ", text).strip()
+    return hashlib.sha1(text.encode()).hexdigest()[:12], text
+
+
+def _explain(conn, statement, parameters):
+    """Plan de ejecución usando un cursor crudo (sin disparar los listeners).
+
+    Corre en la conexión y la transacción de la request. En SQLite un error
+    de EXPLAIN no afecta a la transacción; en los demás motores (Postgres)
+    la abortaría, así que va dentro de un SAVEPOINT que se deshace si falla.
+    """
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    sqlite = conn.dialect.name == "sqlite"
+    prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if not sqlite:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters or ())
+            rows = cursor.fetchall()
+        except Exception as e:
+            if not sqlite:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            if not sqlite:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+    if conn.dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [" ".join(str(c) for c in row) for row in rows]
+
+
+def _short_params(parameters, limit=500):
+    text = repr(parameters)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _observe_query(conn, statement, parameters, executemany, elapsed):
+    if elapsed < _config["threshold"]:
+        return
+
+    key, normalized = fingerprint(statement)
+    route = None
+    if has_request_context():
+        route = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+    params = None if executemany else _short_params(parameters)
+    now = time.time()
+
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            if len(_stats) >= _config["max_fingerprints"]:
+                return
+            entry = _stats[key] = {
+                "fingerprint": key,
+                "statement": normalized,
+                "count": 0,
+                "total_s": 0.0,
+                "max_s": 0.0,
+                "plan": None,
+            }
+        entry["count"] += 1
+        entry["total_s"] += elapsed
+        entry["max_s"] = max(entry["max_s"], elapsed)
+        entry["last_route"] = route
+        entry["last_params"] = params
+        entry["last_seen"] = now
+        should_log = now - _last_logged.get(key, 0.0) >= _config["log_interval"]
+        if should_log:
+            _last_logged[key] = now
+
+    if not should_log:
+        _flush()
+        return
+    plan = None if executemany else _explain(conn, statement, parameters)
+    with _lock:
+        entry["plan"] = plan
+        previous = entry.get("logged_count", 0)
+        entry["logged_count"] = entry["count"]
+    logger.warning("slow query", extra={"data": {
+        "event": "slow_query",
+        "fingerprint": key,
+        "duration_ms": round(elapsed * 1000, 2),
+        "route": route,
+        "statement": statement,
+        "params": params,
+        "plan": plan,
+        "occurrences_since_last_log": entry["count"] - previous,
+    }})
+    _flush(force=True)
+
+
+def _flush(force=False, interval=5.0):
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < interval:
+        return
+    _last_flush = now
+    with _lock:
+        data = {k: dict(v) for k, v in _stats.items()}
+    try:
+        write_snapshot(_config["directory"], data, prefix="slow")
+    except OSError:
+        pass
+
+
+def top_offenders(limit=20):
+    """Fingerprints con mayor tiempo total, combinando todos los workers."""
+    _flush(force=True)
+    merged = {}
+    for _, snap in read_snapshots(_config["directory"], prefix="slow"):
+        for key, entry in snap.items():
+            current = merged.get(key)
+            if current is None:
+                merged[key] = dict(entry)
+                continue
+            current["count"] += entry["count"]
+            current["total_s"] += entry["total_s"]
+            current["max_s"] = max(current["max_s"], entry["max_s"])
+            if entry.get("last_seen", 0) > current.get("last_seen", 0):
+                for field in ("last_route", "last_params", "last_seen"):
+                    current[field] = entry.get(field)
+            current["plan"] = current.get("plan") or entry.get("plan")
+    items = sorted(merged.values(), key=lambda e: e["total_s"], reverse=True)[:limit]
+    result = []
+    for e in items:
+        result.append({
+            "fingerprint": e["fingerprint"],
+            "statement": e["statement"],
+            "count": e["count"],
+            "total_ms": round(e["total_s"] * 1000, 2),
+            "mean_ms": round(e["total_s"] / e["count"] * 1000, 2) if e["count"] else 0.0,
+            "max_ms": round(e["max_s"] * 1000, 2),
+            "last_route": e.get("last_route"),
+            "last_params": e.get("last_params"),
+            "plan": e.get("plan"),
+        })
+    return result
+
+
+def init_slow_query_log(app):
+    app.config.setdefault("SLOW_QUERY_MS", 100.0)
+    app.config.setdefault("SLOW_QUERY_LOG_INTERVAL", 60.0)
+    app.config.setdefault("SLOW_QUERY_DIR", os.path.join(tempfile.gettempdir(), "slacc-slow-queries"))
+    _config["threshold"] = app.config["SLOW_QUERY_MS"] / 1000.0
+    _config["log_interval"] = app.config["SLOW_QUERY_LOG_INTERVAL"]
+    _config["directory"] = app.config["SLOW_QUERY_DIR"]
+
+    on_query(_observe_query)
@@ -0,0 +1,221 @@
+"""
+Incrementally maintained aggregates for the admin dashboard.
+
+A ``before_flush`` listener inspects pending Application, User and
+EventEnrollment changes, turns them into deltas against ``StatSummary`` rows
+and applies them in ``after_flush`` on the same connection, so the summaries
+commit (or roll back) together with the write that produced them.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models.application import Application
+from ..models.event import EventEnrollment
+from ..models.stats import StatSummary
+from ..models.user import User
+
+_DELTAS_KEY = "stat_summary_deltas"
+
+
+def _column_default(model, attr):
+    column = model.__table__.c[attr]
+    if column.default is not None and column.default.is_scalar:
+        return column.default.arg
+    return None
+
+
+def _current(obj, attr):
+    value = getattr(obj, attr)
+    if value is None:
+        value = _column_default(type(obj), attr)
+    return value
+
+
+def _previous(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        value = history.deleted[0]
+    elif history.unchanged:
+        value = history.unchanged[0]
+    else:
+        value = getattr(obj, attr)
+    if value is None:
+        value = _column_default(type(obj), attr)
+    return value
+
+
+def _application_contrib(values):
+    return [(("applications", values["status"]), 1, 0.0)]
+
+
+def _member_contrib(values):
+    if values["role"] == "member" and values["is_active"] and values["payment_status"] == "paid":
+        return [(("members", values["membership_type"] or "normal"), 1, 0.0)]
+    return []
+
+
+def _enrollment_contrib(values):
+    count = 0 if values["payment_status"] == "cancelled" else 1
+    revenue = float(values["payment_amount"] or 0) if values["payment_status"] == "paid" else 0.0
+    if not count and not revenue:
+        return []
+    return [(("event", str(values["event_id"])), count, revenue)]
+
+
+_TRACKED = {
+    Application: (("status",), _application_contrib),
+    User: (("role", "is_active", "payment_status", "membership_type"), _member_contrib),
+    EventEnrollment: (("event_id", "payment_status", "payment_amount"), _enrollment_contrib),
+}
+
+
+def _collect(session, flush_context, instances):
+    deltas = session.info.setdefault(_DELTAS_KEY, defaultdict(lambda: [0, 0.0]))
+
+    def apply(contribs, sign):
+        for key, count, total in contribs:
+            deltas[key][0] += sign * count
+            deltas[key][1] += sign * total
+
+    for obj in session.new:
+        tracked = _TRACKED.get(type(obj))
+        if tracked:
+            attrs, contrib = tracked
+            apply(contrib({a: _current(obj, a) for a in attrs}), 1)
+
+    for obj in session.deleted:
+        tracked = _TRACKED.get(type(obj))
+        if tracked:
+            attrs, contrib = tracked
+            apply(contrib({a: _previous(obj, a) for a in attrs}), -1)
+
+    for obj in session.dirty:
+        tracked = _TRACKED.get(type(obj))
+        if not tracked or not session.is_modified(obj, include_collections=False):
+            continue
+        attrs, contrib = tracked
+        apply(contrib({a: _previous(obj, a) for a in attrs}), -1)
+        apply(contrib({a: _current(obj, a) for a in attrs}), 1)
+
+
+def _flush_deltas(session, flush_context):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {"scope": scope, "key": key, "count": count, "total": total, "updated_at": now}
+        for (scope, key), (count, total) in deltas.items()
+        if count or total
+    ]
+    if rows:
+        _upsert(session.connection(), rows)
+
+
+def _upsert(conn, rows):
+    # UPDATE y luego INSERT si no había fila compite entre transacciones (en
+    # Postgres dos primeras inscripciones a un evento chocan en la PK): UPSERT
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = StatSummary.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.scope, table.c.key],
+        set_={
+            "count": table.c.count + stmt.excluded.count,
+            "total": table.c.total + stmt.excluded.total,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    conn.execute(stmt, rows)
+
+
+def _discard_deltas(session, *args):
+    session.info.pop(_DELTAS_KEY, None)
+
+
+def init_stats_listeners():
+    """Registra los listeners una sola vez (idempotente)."""
+    if not event.contains(Session, "before_flush", _collect):
+        event.listen(Session, "before_flush", _collect)
+        event.listen(Session, "after_flush", _flush_deltas)
+        event.listen(Session, "after_soft_rollback", _discard_deltas)
+
+
+def drop_event_stats(event_id):
+    """Elimina el resumen de un evento (para borrados masivos que no pasan por el ORM)."""
+    StatSummary.query.filter_by(scope="event", key=str(event_id)).delete()
+
+
+def rebuild_stats():
+    """Recalcula todos los agregados desde cero. Devuelve el número de filas escritas."""
+    rows = []
+
+    for status, count in db.session.query(Application.status, func.count(Application.id)).group_by(Application.status):
+        rows.append({"scope": "applications", "key": status or "pending", "count": count, "total": 0.0})
+
+    members = (
+        db.session.query(User.membership_type, func.count(User.id))
+        .filter(User.role == "member", User.is_active == True, User.payment_status == "paid")
+        .group_by(User.membership_type)
+    )
+    for membership_type, count in members:
+        rows.append({"scope": "members", "key": membership_type or "normal", "count": count, "total": 0.0})
+
+    enrollments = (
+        db.session.query(
+            EventEnrollment.event_id,
+            func.sum(db.case((EventEnrollment.payment_status != "cancelled", 1), else_=0)),
+            func.sum(db.case((EventEnrollment.payment_status == "paid", EventEnrollment.payment_amount), else_=0)),
+        )
+        .group_by(EventEnrollment.event_id)
+    )
+    for event_id, count, revenue in enrollments:
+        rows.append({"scope": "event", "key": str(event_id), "count": int(count or 0), "total": float(revenue or 0)})
+
+    now = datetime.utcnow()
+    for row in rows:
+        row["updated_at"] = now
+
+    conn = db.session.connection()
+    conn.execute(StatSummary.__table__.delete())
+    if rows:
+        conn.execute(StatSummary.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def ensure_stats():
+    """Construye los agregados si la tabla está vacía (primer arranque o BD existente)."""
+    if db.session.query(StatSummary.scope).first() is None:
+        rebuild_stats()
+
+
+def get_stats():
+    """Lee todos los agregados en una sola consulta y los organiza para el dashboard."""
+    applications = {}
+    members = {}
+    events = []
+    for row in StatSummary.query.all():
+        if not row.count and not row.total:
+            continue
+        if row.scope == "applications":
+            applications[row.key] = row.count
+        elif row.scope == "members":
+            members[row.key] = row.count
+        elif row.scope == "event":
+            events.append({"event_id": int(row.key), "enrolled_count": row.count, "revenue": row.total})
+    events.sort(key=lambda e: e["event_id"])
+    return {
+        "applications": applications,
+        "pending_applications": applications.get("pending", 0),
+        "members": members,
+        "paid_members": sum(members.values()),
+        "events": events,
+    }
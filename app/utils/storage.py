@@ -0,0 +1,342 @@
+"""
+Where uploaded files live once they are accepted.
+
+Routes keep receiving, validating and processing files on local disk
+(``UPLOAD_DIR`` and its ``.incoming`` staging area) and then hand the
+finished file to ``store()``. Records always keep the canonical
+``/uploads/<key>`` URL, whatever the backend, so existing rows, image
+metadata and variant URLs do not depend on where the bytes are.
+
+Backends (``STORAGE_BACKEND``):
+
+- ``local`` (default): files stay in ``UPLOAD_DIR`` and ``/uploads/<key>``
+  serves them, as before.
+- ``s3``: any S3-compatible service (AWS S3, Cloudflare R2, MinIO, moto in
+  server mode...). ``store()`` uploads the file and removes the local copy;
+  ``/uploads/<key>`` answers with a redirect to ``STORAGE_PUBLIC_URL/<key>``
+  (CDN or public bucket) or, without one, to a presigned GET URL valid for
+  ``STORAGE_URL_TTL`` seconds. With a public URL configured, image payloads
+  carry it directly (see ``public_url``), so the app never sees those
+  requests. Several app instances can share the bucket.
+
+``boto3`` is only imported when the s3 backend is configured.
+``python -m scripts.check_storage`` exercises the s3 driver against moto, or
+against a real endpoint (MinIO, R2) with ``--endpoint``.
+"""
+import bisect
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from flask import current_app
+from werkzeug.utils import safe_join
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_PREFIX = "/uploads/"
+
+# Los nombres subidos son únicos (uuid) y nunca se sobrescriben
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StorageError(Exception):
+    pass
+
+
+class LocalStorage:
+    """Archivos en un directorio local (el disco de Render)."""
+
+    name = "local"
+    serves_files = True
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        path = safe_join(self.root, key)
+        if path is None:
+            raise StorageError(f"Clave inválida: {key}")
+        return path
+
+    def put(self, local_path, key):
+        target = self.path(key)
+        if os.path.abspath(local_path) != target:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(local_path, target)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def list(self, prefix="", start_after=None, limit=None):
+        """(clave, bytes, mtime) ordenados por clave, desde ``start_after``.
+
+        Sin ``prefix`` se omiten los directorios ocultos (.incoming, .cache,
+        .quarantine): no son archivos publicados.
+        """
+        base = self.path(prefix) if prefix else self.root
+        keys = []
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            rel = os.path.relpath(dirpath, self.root)
+            for name in filenames:
+                if not name.startswith("."):
+                    keys.append(name if rel == "." else f"{rel}/{name}")
+        keys.sort()
+        if start_after is not None:
+            keys = keys[bisect.bisect_right(keys, start_after):]
+        entries = []
+        for key in keys:
+            if limit is not None and len(entries) >= limit:
+                break
+            try:
+                st = os.stat(os.path.join(self.root, key))
+            except FileNotFoundError:
+                continue
+            entries.append((key, st.st_size, st.st_mtime))
+        return entries
+
+    def move(self, key, new_key):
+        """Renombra dentro del almacenamiento; el mtime pasa a ser el del movimiento."""
+        target = self.path(new_key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.path(key), target)
+        os.utime(target)
+
+    def version(self, key):
+        """Identifica el contenido actual (para nombres de cache) o None si no existe."""
+        try:
+            st = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+        return f"{st.st_size}:{st.st_mtime_ns}"
+
+    @contextmanager
+    def local_copy(self, key):
+        path = self.path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        yield path
+
+    def url(self, key):
+        return UPLOADS_PREFIX + key
+
+
+class S3Storage:
+    """Bucket S3 o compatible (R2, MinIO). Las claves van bajo ``prefix``."""
+
+    name = "s3"
+    serves_files = False
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, region=None,
+                 access_key_id=None, secret_access_key=None, public_url=None, url_ttl=3600):
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise StorageError("STORAGE_BACKEND=s3 requiere boto3 (pip install boto3)")
+        if not bucket:
+            raise StorageError("STORAGE_BACKEND=s3 requiere S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.public_url = (public_url or "").rstrip("/") or None
+        self.url_ttl = url_ttl
+        self._client_error = ClientError
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+            config=Config(
+                signature_version="s3v4",
+                # MinIO y la mayoría de los compatibles no resuelven bucket.host
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+                retries={"max_attempts": 3, "mode": "standard"},
+                connect_timeout=5,
+                read_timeout=30,
+            ),
+        )
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def _missing(self, error):
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, local_path, key):
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        self.client.upload_file(local_path, self.bucket, self._key(key), ExtraArgs={
+            "ContentType": content_type,
+            "CacheControl": CACHE_CONTROL,
+        })
+        os.remove(local_path)
+
+    def delete(self, key):
+        # DeleteObject no falla si la clave no existe
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return True
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except self._client_error as e:
+            if self._missing(e):
+                return False
+            raise
+
+    def list(self, prefix="", start_after=None, limit=None):
+        """(clave, bytes, mtime) ordenados por clave; sin ``prefix`` omite las claves ocultas."""
+        entries = []
+        kwargs = {"Bucket": self.bucket, "Prefix": self._key(prefix)}
+        if start_after is not None:
+            kwargs["StartAfter"] = self._key(start_after)
+        for page in self.client.get_paginator("list_objects_v2").paginate(**kwargs):
+            for obj in page.get("Contents", []):
+                key = obj["Key"][len(self.prefix):]
+                if not prefix and any(part.startswith(".") for part in key.split("/")):
+                    continue
+                entries.append((key, obj["Size"], obj["LastModified"].timestamp()))
+                if limit is not None and len(entries) >= limit:
+                    return entries
+        return entries
+
+    def move(self, key, new_key):
+        # La copia toma LastModified = ahora, igual que el utime del driver local
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket, Key=self._key(new_key),
+                CopySource={"Bucket": self.bucket, "Key": self._key(key)},
+            )
+        except self._client_error as e:
+            if self._missing(e):
+                raise FileNotFoundError(key)
+            raise
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def version(self, key):
+        # Claves de escritura única: el nombre basta y un hit de cache no consulta el bucket
+        return ""
+
+    @contextmanager
+    def local_copy(self, key):
+        fd, path = tempfile.mkstemp(prefix="slacc-storage-", suffix=os.path.splitext(key)[1])
+        try:
+            with os.fdopen(fd, "wb") as f:
+                try:
+                    self.client.download_fileobj(self.bucket, self._key(key), f)
+                except self._client_error as e:
+                    if self._missing(e):
+                        raise FileNotFoundError(key)
+                    raise
+            yield path
+        finally:
+            os.remove(path)
+
+    def url(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{quote(self._key(key))}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._key(key)}, ExpiresIn=self.url_ttl,
+        )
+
+
+def get_storage():
+    return current_app.extensions["storage"]
+
+
+def key_from_url(url):
+    """Clave de un ``/uploads/<key>`` propio; None para URLs externas (p. ej. Unsplash)."""
+    if not url or not url.startswith(UPLOADS_PREFIX):
+        return None
+    key = url[len(UPLOADS_PREFIX):]
+    if not key or any(part in ("", ".", "..") or part.startswith(".") for part in key.split("/")):
+        return None
+    return key
+
+
+def store(local_path, key=None):
+    """Guarda el archivo procesado y devuelve su URL canónica ``/uploads/<key>``."""
+    key = key or os.path.basename(local_path)
+    get_storage().put(local_path, key)
+    return UPLOADS_PREFIX + key
+
+
+def delete_url(url):
+    """Borra el archivo de una URL propia. Los errores se registran: el registro ya no lo usa."""
+    key = key_from_url(url)
+    if key is None:
+        return False
+    try:
+        return get_storage().delete(key)
+    except Exception as e:
+        logger.warning("No se pudo borrar %s: %s", url, e)
+        return False
+
+
+def public_url(url):
+    """URL para los payloads: la del CDN si el backend tiene una estable, si no la misma."""
+    key = key_from_url(url)
+    storage = get_storage()
+    if key is None or storage.serves_files or not getattr(storage, "public_url", None):
+        return url
+    return storage.url(key)
+
+
+def create_storage(app):
+    backend = app.config["STORAGE_BACKEND"]
+    if backend == "local":
+        return LocalStorage(app.config["UPLOAD_DIR"])
+    if backend == "s3":
+        return S3Storage(
+            app.config["S3_BUCKET"],
+            prefix=app.config["S3_PREFIX"],
+            endpoint_url=app.config["S3_ENDPOINT_URL"],
+            region=app.config["S3_REGION"],
+            access_key_id=app.config["S3_ACCESS_KEY_ID"],
+            secret_access_key=app.config["S3_SECRET_ACCESS_KEY"],
+            public_url=app.config["STORAGE_PUBLIC_URL"],
+            url_ttl=app.config["STORAGE_URL_TTL"],
+        )
+    raise StorageError(f"STORAGE_BACKEND desconocido: {backend}")
+
+
+def copy_tree(source, target, keys):
+    """Copia ``keys`` de un backend a otro (migración local -> s3). Devuelve (copiadas, fallidas)."""
+    copied, failed = 0, []
+    for key in keys:
+        try:
+            with source.local_copy(key) as path:
+                fd, staged = tempfile.mkstemp(prefix="slacc-storage-", suffix=os.path.splitext(key)[1])
+                os.close(fd)
+                shutil.copyfile(path, staged)
+                target.put(staged, key)
+            copied += 1
+        except Exception as e:
+            failed.append((key, str(e)))
+    return copied, failed
+
+
+def init_storage(app):
+    app.config.setdefault("STORAGE_BACKEND", "local")
+    app.config.setdefault("S3_BUCKET", None)
+    app.config.setdefault("S3_PREFIX", "")
+    app.config.setdefault("S3_ENDPOINT_URL", None)
+    app.config.setdefault("S3_REGION", None)
+    app.config.setdefault("S3_ACCESS_KEY_ID", None)
+    app.config.setdefault("S3_SECRET_ACCESS_KEY", None)
+    app.config.setdefault("STORAGE_PUBLIC_URL", None)
+    app.config.setdefault("STORAGE_URL_TTL", 3600)
+    app.extensions["storage"] = create_storage(app)
@@ -0,0 +1,362 @@
+"""
+Garbage collection and disk accounting for uploaded files.
+
+Files stop being referenced when a record is deleted (events, applications
+and their attachments through the cascade) or when its image is replaced.
+Two mechanisms clean them up:
+
+- Session listeners collect the old URLs of deleted rows and changed URL
+  columns (``URL_COLUMNS``) before each flush, and drop the ones that are
+  still referenced once the flush has run. After the commit, those files
+  are moved to quarantine. A rollback discards the list.
+- An incremental sweep walks the storage in key order, ``GC_BATCH_SIZE``
+  files at a time. It checks each batch against every URL column with one
+  ``IN`` query per column. Unreferenced files older than ``GC_MIN_AGE`` go
+  to quarantine; the age check skips uploads that are stored but not yet
+  committed. Quarantined files older than ``GC_QUARANTINE_DAYS`` are then
+  deleted, unless something references them again, in which case they are
+  restored.
+
+Quarantine is the hidden ``.quarantine/`` key prefix of the same storage,
+so a file referenced by a restored backup can still be recovered. Only
+files with an upload extension are considered: the SQLite database and
+other state that share the Render disk are never touched.
+
+The periodic mode needs no cron job, which could not mount the disk
+anyway. Every ``GC_INTERVAL`` seconds, one worker wins a non-blocking
+``flock`` and runs a single batch from ``call_on_close``, after its
+response has been sent. The cursor is kept in ``GC_STATE_PATH``, so a pass
+resumes where the previous batch stopped, across workers and restarts.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+from ..extensions import db
+from ..models.application import ApplicationAttachment
+from ..models.event import Event
+from ..models.image_metadata import ImageMetadata
+from ..models.news import News
+from . import chunked_uploads, metrics, storage
+from .file_validation import ALLOWED_DOCUMENT_EXTENSIONS, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS
+from .uploads import INCOMING_DIR
+
+logger = logging.getLogger(__name__)
+
+# Columnas que referencian archivos subidos -> categoría del reporte de uso
+URL_COLUMNS = (
+    (News.image_url, "news"),
+    (Event.image_url, "events"),
+    (ApplicationAttachment.file_url, "applications"),
+)
+
+QUARANTINE = ".quarantine"
+
+UPLOAD_EXTENSIONS = ALLOWED_IMAGE_EXTENSIONS | ALLOWED_DOCUMENT_EXTENSIONS | ALLOWED_VIDEO_EXTENSIONS
+
+_PENDING_KEY = "upload_gc_orphans"
+
+_last_check = float("-inf")
+
+
+def _is_upload(key):
+    return os.path.splitext(key)[1].lower() in UPLOAD_EXTENSIONS
+
+
+def referenced(urls, session=None):
+    """Subconjunto de ``urls`` que alguna columna todavía referencia."""
+    session = session or db.session
+    urls = list(urls)
+    found = set()
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        for column, _ in URL_COLUMNS:
+            found.update(u for (u,) in session.query(column).filter(column.in_(chunk)).distinct())
+    return found
+
+
+def quarantine(key):
+    """Mueve un archivo publicado a cuarentena. Devuelve False si ya no existía."""
+    try:
+        storage.get_storage().move(key, f"{QUARANTINE}/{key}")
+    except FileNotFoundError:
+        return False
+    metrics.inc("upload_gc_files_total", action="quarantined")
+    return True
+
+
+def restore(key):
+    """Devuelve a su lugar un archivo en cuarentena (``key`` sin el prefijo)."""
+    storage.get_storage().move(f"{QUARANTINE}/{key}", key)
+    metrics.inc("upload_gc_files_total", action="restored")
+
+
+def _forget_metadata(urls):
+    if urls:
+        ImageMetadata.query.filter(ImageMetadata.file_url.in_(urls)).delete(synchronize_session=False)
+
+
+def sweep_batch(start_after=None, batch_size=200, min_age=3600, dry_run=False):
+    """Revisa un lote de archivos publicados. Devuelve (cursor siguiente o None, resumen).
+
+    Con ``dry_run`` solo informa los huérfanos (en ``resumen["orphans"]``).
+    """
+    entries = storage.get_storage().list(start_after=start_after, limit=batch_size)
+    now = time.time()
+    candidates = {
+        storage.UPLOADS_PREFIX + key: key
+        for key, _, mtime in entries
+        if _is_upload(key) and now - mtime >= min_age
+    }
+    orphans = set(candidates) - referenced(candidates)
+    cursor = entries[-1][0] if len(entries) == batch_size else None
+    if dry_run:
+        return cursor, {"scanned": len(entries), "orphans": sorted(orphans)}
+    moved = [url for url in sorted(orphans) if quarantine(candidates[url])]
+    _forget_metadata(moved)
+    db.session.commit()
+    return cursor, {"scanned": len(entries), "quarantined": len(moved)}
+
+
+def purge_batch(start_after=None, batch_size=200, retention=7 * 86400):
+    """Borra (o restaura, si volvieron a referenciarse) archivos en cuarentena vencidos."""
+    store = storage.get_storage()
+    entries = store.list(prefix=f"{QUARANTINE}/", start_after=start_after, limit=batch_size)
+    now = time.time()
+    expired = {
+        storage.UPLOADS_PREFIX + key[len(QUARANTINE) + 1:]: key
+        for key, _, mtime in entries
+        if now - mtime >= retention
+    }
+    back = referenced(expired)
+    deleted = 0
+    for url, key in sorted(expired.items()):
+        if url in back:
+            restore(storage.key_from_url(url))
+            continue
+        store.delete(key)
+        deleted += 1
+        metrics.inc("upload_gc_files_total", action="deleted")
+    cursor = entries[-1][0] if len(entries) == batch_size else None
+    return cursor, {"scanned": len(entries), "deleted": deleted, "restored": len(back)}
+
+
+def run_pass(batch_size=200, min_age=3600, retention=7 * 86400, pause=0.0):
+    """Pasada completa (sweep y luego purga) en lotes, con ``pause`` segundos entre lotes."""
+    totals = {"scanned": 0, "quarantined": 0, "deleted": 0, "restored": 0}
+    for step, kwargs in ((sweep_batch, {"min_age": min_age}), (purge_batch, {"retention": retention})):
+        cursor = None
+        while True:
+            cursor, summary = step(cursor, batch_size, **kwargs)
+            for name, value in summary.items():
+                totals[name] += value
+            if cursor is None:
+                break
+            time.sleep(pause)
+    return totals
+
+
+# -- Listeners: archivos que dejan de referenciarse en un commit -------------
+
+def _collect_orphans(session, flush_context, instances):
+    urls = session.info.setdefault(_PENDING_KEY, set())
+    for column, _ in URL_COLUMNS:
+        model, attr = column.class_, column.key
+        for obj in session.deleted:
+            if isinstance(obj, model):
+                history = attributes.get_history(obj, attr)
+                urls.update(history.unchanged or ())
+                urls.update(history.deleted or ())
+        for obj in session.dirty:
+            if isinstance(obj, model):
+                urls.update(attributes.get_history(obj, attr).deleted or ())
+    urls.discard(None)
+
+
+def _keep_unreferenced(session, flush_context):
+    # Una URL puede haber pasado a otra fila (o volver a la misma) en este flush
+    urls = session.info.get(_PENDING_KEY)
+    if urls:
+        with session.no_autoflush:
+            urls -= referenced(urls, session)
+            if urls:
+                # Metadata de imágenes que ya nadie muestra, en la misma transacción
+                session.query(ImageMetadata).filter(ImageMetadata.file_url.in_(urls)).delete(synchronize_session=False)
+
+
+def _quarantine_orphans(session):
+    urls = session.info.pop(_PENDING_KEY, None)
+    keys = [storage.key_from_url(u) for u in urls or ()]
+    keys = [k for k in keys if k and _is_upload(k)]
+    if not keys:
+        return
+    for key in keys:
+        try:
+            quarantine(key)
+        except Exception as e:
+            # El sweep periódico lo volverá a intentar
+            logger.warning("No se pudo poner en cuarentena %s: %s", key, e)
+
+
+def _discard_orphans(session, *args):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# -- Modo periódico ------------------------------------------------------------
+
+def _read_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".gc-", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def tick(app):
+    """Un lote del GC si toca y ningún otro worker lo está corriendo."""
+    config = app.config
+    path = config["GC_STATE_PATH"]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        state = _read_state(path)
+        if time.time() - state.get("last_run", 0) < config["GC_INTERVAL"]:
+            return
+        phase = state.get("phase", "sweep")
+        with app.app_context():
+            try:
+                # Subidas por fragmentos abandonadas: no dependen de que llegue otra sesión
+                chunked_uploads.purge_expired()
+            except OSError:
+                logger.exception("No se pudieron purgar las subidas vencidas")
+            try:
+                if phase == "sweep":
+                    cursor, summary = sweep_batch(state.get("cursor"), config["GC_BATCH_SIZE"], config["GC_MIN_AGE"])
+                else:
+                    cursor, summary = purge_batch(
+                        state.get("cursor"), config["GC_BATCH_SIZE"], config["GC_QUARANTINE_DAYS"] * 86400,
+                    )
+            except Exception:
+                db.session.rollback()
+                logger.exception("Falló el lote del GC de uploads")
+                cursor, summary = state.get("cursor"), {}
+        if summary.get("quarantined") or summary.get("deleted"):
+            logger.info("GC de uploads (%s)", phase, extra={"data": summary})
+        if summary and cursor is None:
+            phase = "purge" if phase == "sweep" else "sweep"
+        _write_state(path, {"phase": phase, "cursor": cursor, "last_run": time.time()})
+
+
+def _schedule_tick(response):
+    global _last_check
+    app = current_app._get_current_object()
+    interval = app.config["GC_INTERVAL"]
+    now = time.monotonic()
+    # Cada worker mira el estado compartido a lo sumo cada ~interval/10
+    if interval > 0 and now - _last_check >= min(interval / 10, 30):
+        _last_check = now
+        # Después de enviar la respuesta: el cliente no espera el lote
+        response.call_on_close(lambda: tick(app))
+    return response
+
+
+# -- Uso de disco --------------------------------------------------------------
+
+def _dir_size(path):
+    total = files = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+                files += 1
+            except OSError:
+                pass
+    return total, files
+
+
+def usage_report():
+    """Bytes y archivos por categoría frente a la cuota del volumen."""
+    config = current_app.config
+    categories = {}
+
+    def add(name, size, count=1):
+        entry = categories.setdefault(name, {"bytes": 0, "files": 0})
+        entry["bytes"] += size
+        entry["files"] += count
+
+    owners = {}
+    for column, category in URL_COLUMNS:
+        for (url,) in db.session.query(column).filter(column.like(storage.UPLOADS_PREFIX + "%")).distinct():
+            owners.setdefault(url, category)
+
+    store = storage.get_storage()
+    for key, size, _ in store.list():
+        url = storage.UPLOADS_PREFIX + key
+        if url in owners:
+            add(owners[url], size)
+        elif _is_upload(key):
+            add("unreferenced", size)
+        elif key.endswith((".db", ".db-wal", ".db-shm", ".sqlite")):
+            add("database", size)
+        else:
+            add("other", size)
+    for key, size, _ in store.list(prefix=f"{QUARANTINE}/"):
+        add("quarantine", size)
+
+    # Directorios locales de trabajo (existen con cualquier backend)
+    upload_dir = os.path.abspath(config["UPLOAD_DIR"])
+    for name, path in (("variant_cache", config["IMAGE_CACHE_DIR"]), ("incoming", os.path.join(upload_dir, INCOMING_DIR)),
+                       ("backups", config["BACKUP_DIR"])):
+        if not path:
+            continue
+        size, count = _dir_size(path)
+        if count:
+            add(name, size, count)
+
+    used = sum(entry["bytes"] for entry in categories.values())
+    quota = config["STORAGE_QUOTA_BYTES"]
+    report = {
+        "backend": store.name,
+        "categories": categories,
+        "used_bytes": used,
+        "quota_bytes": quota,
+        "quota_used_pct": round(used * 100 / quota, 1) if quota else None,
+    }
+    if store.serves_files:
+        disk = shutil.disk_usage(upload_dir)
+        report["volume"] = {"total_bytes": disk.total, "free_bytes": disk.free}
+    return report
+
+
+def init_upload_gc(app):
+    app.config.setdefault("GC_INTERVAL", 300)
+    app.config.setdefault("GC_BATCH_SIZE", 200)
+    app.config.setdefault("GC_MIN_AGE", 3600)
+    app.config.setdefault("GC_QUARANTINE_DAYS", 7)
+    app.config.setdefault("GC_STATE_PATH", os.path.join(os.path.abspath(app.config["UPLOAD_DIR"]), ".cache", "upload-gc.json"))
+    app.config.setdefault("STORAGE_QUOTA_BYTES", 1024 * 1024 * 1024)
+    if not event.contains(Session, "before_flush", _collect_orphans):
+        event.listen(Session, "before_flush", _collect_orphans)
+        event.listen(Session, "after_flush_postexec", _keep_unreferenced)
+        event.listen(Session, "after_commit", _quarantine_orphans)
+        event.listen(Session, "after_soft_rollback", _discard_orphans)
+    app.after_request(_schedule_tick)
@@ -0,0 +1,107 @@
+"""
+Per-route body limits and disk-backed multipart parsing.
+
+``UploadRequest`` replaces Flask's request class: its ``max_content_length``
+comes from ``BODY_LIMITS[endpoint]`` (``BODY_LIMIT_DEFAULT`` for routes not
+listed), so JSON endpoints only accept small bodies while the upload routes
+keep their larger limits, and requests whose ``Content-Length`` already
+exceeds the limit are rejected with 413 before any other hook runs.
+File parts are streamed straight into ``UPLOAD_DIR/.incoming`` (same volume
+as the final location) instead of memory, and ``save_upload`` moves them
+into place with an atomic rename. Leftover temp files are removed when the
+request ends.
+"""
+import os
+import tempfile
+
+from flask import Request, current_app, jsonify, request
+
+INCOMING_DIR = ".incoming"
+
+
+def incoming_dir(app=None):
+    app = app or current_app
+    return os.path.join(os.path.abspath(app.config["UPLOAD_DIR"]), INCOMING_DIR)
+
+
+class UploadRequest(Request):
+    """Request con límite de cuerpo por endpoint y archivos de multipart en disco."""
+
+    @property
+    def max_content_length(self):
+        if not current_app:
+            return None
+        limit = current_app.config["BODY_LIMITS"].get(self.endpoint, current_app.config["BODY_LIMIT_DEFAULT"])
+        ceiling = current_app.config["MAX_CONTENT_LENGTH"]
+        return min(limit, ceiling) if ceiling else limit
+
+    @property
+    def max_form_memory_size(self):
+        # Los campos de texto del formulario quedan en memoria: nunca más que el cuerpo permitido
+        if not current_app:
+            return None
+        limit = current_app.config["MAX_FORM_MEMORY_SIZE"]
+        body = self.max_content_length
+        return min(limit, body) if limit and body else (limit or body)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        directory = incoming_dir()
+        os.makedirs(directory, exist_ok=True)
+        stream = tempfile.NamedTemporaryFile(dir=directory, prefix="upload-", suffix=".part", delete=False)
+        self.__dict__.setdefault("_incoming_files", []).append(stream.name)
+        return stream
+
+
+def save_upload(file_storage, path):
+    """Guarda un archivo subido en ``path`` de forma atómica (rename si ya está en disco)."""
+    stream = file_storage.stream
+    tmp_name = getattr(stream, "name", None)
+    if isinstance(tmp_name, str) and os.path.dirname(tmp_name) == incoming_dir():
+        stream.flush()
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+        return path
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            file_storage.save(f)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def _too_large(limit):
+    response = jsonify({"error": f"El cuerpo de la solicitud excede el máximo permitido ({limit // (1024 * 1024) or 1} MB)"})
+    response.status_code = 413
+    return response
+
+
+def init_uploads(app):
+    app.config.setdefault("BODY_LIMIT_DEFAULT", 1024 * 1024)
+    app.config.setdefault("BODY_LIMITS", {})
+    app.config.setdefault("UPLOAD_STAGING_MAX_BYTES", 200 * 1024 * 1024)
+    app.config.setdefault("UPLOAD_STAGING_PER_CLIENT_BYTES", 60 * 1024 * 1024)
+    app.request_class = UploadRequest
+
+    @app.before_request
+    def _check_content_length():
+        limit = request.max_content_length
+        if limit and request.content_length and request.content_length > limit:
+            return _too_large(limit)
+        return None
+
+    @app.teardown_request
+    def _remove_incoming(exc):
+        for name in request.__dict__.get("_incoming_files", ()):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                app.logger.warning("No se pudo borrar el temporal %s: %s", name, e)
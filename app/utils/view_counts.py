@@ -0,0 +1,140 @@
+"""
+Write-behind view counters for news and events.
+
+Recording a view only adds 1 to a dict in the worker's memory (under a lock,
+as in metrics), so a popular article never turns reads into SQLite writes.
+The first view recorded in a worker starts a daemon thread that flushes
+every ``VIEW_FLUSH_INTERVAL`` seconds, off the request path. It does not
+depend on later traffic, so a worker that goes idle still writes what it
+holds. The flush writes every pending count in one transaction of batched UPSERTs
+(``INSERT ... ON CONFLICT DO UPDATE SET count = count + excluded.count``)
+into ``view_count``. Workers also flush on exit (gunicorn ``worker_exit``),
+so a crash loses at most the views of one interval in that worker. A failed
+flush puts its counts back for the next attempt.
+
+Counts are kept per hour, so rankings can use any rolling window; hours
+older than ``VIEW_RETENTION_DAYS`` are deleted lazily. Rankings are cached
+per worker for ``POPULAR_CACHE_TTL`` seconds.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from ..extensions import db
+from ..models.view_count import ViewCount
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Fracción de flushes que además borra las horas fuera de la retención
+PRUNE_PROBABILITY = 0.05
+
+_table = ViewCount.__table__
+_lock = threading.Lock()
+_pending = {}
+_flusher_pid = None
+_rankings = {}
+
+
+def current_hour(now=None):
+    return int((time.time() if now is None else now) // 3600)
+
+
+def record(entity, entity_id):
+    """Suma una vista en memoria; la escribe el hilo de flush de este worker."""
+    global _flusher_pid
+    key = (entity, entity_id, current_hour())
+    start = False
+    with _lock:
+        _pending[key] = _pending.get(key, 0) + 1
+        # Un hilo por proceso: un worker forkeado no hereda el hilo del padre
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            start = True
+    metrics.inc("views_recorded_total", entity=entity)
+    if start:
+        app = current_app._get_current_object()
+        threading.Thread(target=_flush_loop, args=(app,), name="view-counts-flush", daemon=True).start()
+
+
+def _flush_loop(app):
+    interval = max(app.config["VIEW_FLUSH_INTERVAL"], 1)
+    while True:
+        time.sleep(interval)
+        try:
+            flush(app)
+        except Exception:
+            logger.exception("Error en el hilo de flush de vistas")
+
+
+def _upsert(conn, rows):
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.entity, _table.c.entity_id, _table.c.hour],
+        set_={"count": _table.c["count"] + stmt.excluded["count"]},
+    )
+    conn.execute(stmt, rows)
+
+
+def flush(app):
+    """Escribe las vistas pendientes de este worker. Devuelve las filas escritas."""
+    global _pending
+    with _lock:
+        batch, _pending = _pending, {}
+    if not batch:
+        return 0
+    rows = [
+        {"entity": entity, "entity_id": entity_id, "hour": hour, "count": count}
+        for (entity, entity_id, hour), count in batch.items()
+    ]
+    try:
+        with app.app_context(), db.engine.begin() as conn:
+            _upsert(conn, rows)
+            if random.random() < PRUNE_PROBABILITY:
+                oldest = current_hour() - app.config["VIEW_RETENTION_DAYS"] * 24
+                conn.execute(delete(_table).where(_table.c.hour < oldest))
+    except Exception:
+        # Se reintenta en el próximo flush junto con las vistas nuevas
+        with _lock:
+            for key, count in batch.items():
+                _pending[key] = _pending.get(key, 0) + count
+        logger.exception("No se pudieron escribir %s contadores de vistas", len(rows))
+        return 0
+    metrics.inc("view_counts_flushed_total", len(rows))
+    return len(rows)
+
+
+def window_totals(entity, hours):
+    """Subquery (entity_id, views) con las vistas de las últimas ``hours`` horas."""
+    return (
+        select(_table.c.entity_id, func.sum(_table.c["count"]).label("views"))
+        .where(_table.c.entity == entity, _table.c.hour > current_hour() - hours)
+        .group_by(_table.c.entity_id)
+        .subquery()
+    )
+
+
+def cached_ranking(key, build):
+    """Resultado de ``build()`` cacheado por worker durante POPULAR_CACHE_TTL segundos."""
+    now = time.monotonic()
+    entry = _rankings.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    value = build()
+    _rankings[key] = (now + current_app.config["POPULAR_CACHE_TTL"], value)
+    return value
+
+
+def init_view_counts(app):
+    app.config.setdefault("VIEW_FLUSH_INTERVAL", 30)
+    app.config.setdefault("VIEW_RETENTION_DAYS", 90)
+    app.config.setdefault("POPULAR_CACHE_TTL", 300)
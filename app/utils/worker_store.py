@@ -0,0 +1,72 @@
+"""
+Per-worker JSON snapshots shared through a directory.
+
+Each gunicorn worker owns one ``<prefix>-<pid>.json`` file that it replaces
+atomically; readers merge every file they find. Used by the metrics and
+slow-query diagnostics so any worker can answer for all of them.
+"""
+import json
+import os
+import tempfile
+
+
+def snapshot_path(directory, pid, prefix="worker"):
+    return os.path.join(directory, f"{prefix}-{pid}.json")
+
+
+def write_snapshot(directory, data, prefix="worker"):
+    """Reemplaza atómicamente el snapshot de este proceso."""
+    write_json(snapshot_path(directory, os.getpid(), prefix), data)
+
+
+def write_json(path, data):
+    """Escribe ``path`` con un rename atómico: los lectores ven el archivo viejo o el nuevo."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def read_json(path):
+    """Contenido de ``path`` o None si no existe o no se puede leer."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_snapshots(directory, prefix="worker"):
+    """Itera (pid, data) de todos los snapshots legibles del directorio."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not (name.startswith(f"{prefix}-") and name.endswith(".json")):
+            continue
+        try:
+            pid = int(name[len(prefix) + 1:-len(".json")])
+            with open(os.path.join(directory, name)) as f:
+                yield pid, json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
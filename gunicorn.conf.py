@@ -0,0 +1,43 @@
+"""Configuración de gunicorn (render.yaml: gunicorn -c gunicorn.conf.py ...).
+
+Además del reciclaje por número de requests, los workers se reciclan cuando
+su RSS supera MAX_WORKER_RSS_MB: terminan la request en curso y el master
+levanta uno nuevo, antes de que el plan free los mate por OOM.
+
+Al salir, cada worker escribe los contadores de vistas que tenga pendientes
+y un último snapshot de métricas, para no perder lo contado desde el último
+flush.
+"""
+import os
+
+# Reciclaje clásico por cantidad de requests (0 = desactivado)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# Techo de memoria por worker en MB (0 = desactivado)
+max_worker_rss_mb = int(os.getenv("MAX_WORKER_RSS_MB", "0"))
+
+
+def post_request(worker, req, environ, resp):
+    if not max_worker_rss_mb:
+        return
+    from app.utils.memory import rss_bytes
+
+    rss_mb = rss_bytes() / (1024 * 1024)
+    if rss_mb > max_worker_rss_mb:
+        worker.log.warning(
+            "Worker %s usa %.0f MB (límite %s MB); reciclando tras esta request",
+            worker.pid, rss_mb, max_worker_rss_mb,
+        )
+        worker.alive = False
+
+
+def worker_exit(server, worker):
+    app = getattr(worker, "wsgi", None)
+    if not hasattr(app, "app_context"):
+        return
+    from app.utils import metrics
+    from app.utils.view_counts import flush
+
+    flush(app)
+    metrics.flush(app.config["METRICS_DIR"], force=True)
@@ -0,0 +1,14 @@
+from app import create_app
+from app.models.event import Event
+from app.models.news import News
+from app.utils.image_metadata import backfill
+
+app = create_app()
+
+with app.app_context():
+    urls = [u for (u,) in News.query.with_entities(News.image_url)]
+    urls += [u for (u,) in Event.query.with_entities(Event.image_url)]
+    created, failed = backfill(urls)
+    print(f"[backfill_image_metadata] {created} imágenes procesadas.")
+    for url, error in failed:
+        print(f"[backfill_image_metadata] {url}: {error}")
@@ -0,0 +1,62 @@
+"""
+Respaldos en línea de la base SQLite y los archivos subidos.
+
+    python -m scripts.backup create                  # snapshot (el sitio sigue atendiendo)
+    python -m scripts.backup list
+    python -m scripts.backup verify ID               # hash + integrity_check + tar legibles
+    python -m scripts.backup restore ID --db /tmp/slac.db --uploads /tmp/uploads
+
+BACKUP_DIR debe estar configurado y en otro disco que UPLOAD_DIR.
+restore nunca sobrescribe: escribe en rutas nuevas. Para volver a producción
+se detiene el servicio, se mueven los archivos restaurados a DATABASE_URL y
+UPLOAD_DIR y se arranca de nuevo. Los snapshots quedan en BACKUP_DIR.
+"""
+import argparse
+import json
+import sys
+
+from app import create_app
+from app.utils import backup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Respaldos de la base y los archivos subidos")
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="Crear un snapshot y aplicar la retención")
+    create.add_argument("--id", help="Id del snapshot (default: fecha UTC)")
+    sub.add_parser("list", help="Listar snapshots")
+    verify = sub.add_parser("verify", help="Verificar un snapshot")
+    verify.add_argument("id")
+    restore = sub.add_parser("restore", help="Restaurar un snapshot en rutas nuevas")
+    restore.add_argument("id")
+    restore.add_argument("--db", required=True, help="Ruta de la base restaurada (no debe existir)")
+    restore.add_argument("--uploads", help="Directorio para los archivos (vacío o inexistente)")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        try:
+            if args.command == "create":
+                with backup.BackupLock():
+                    manifest = backup.create_snapshot(args.id)
+                uploads = manifest["uploads"]
+                kind = "sin archivos" if not uploads else "completo" if uploads["base"] is None else f"incremental sobre {uploads['base']}"
+                print(f"[backup] {manifest['id']} ({kind}): base {manifest['database']['bytes']} bytes, "
+                      f"{uploads['archived'] if uploads else 0} archivos en {manifest['duration_s']}s.")
+            elif args.command == "list":
+                for manifest in backup.list_snapshots():
+                    uploads = manifest["uploads"] or {}
+                    print(f"{manifest['id']}  base={uploads.get('base') or '-'}  "
+                          f"db={manifest['database']['bytes']}  archivos={uploads.get('archived', 0)}")
+            elif args.command == "verify":
+                print(json.dumps(backup.verify_snapshot(args.id), indent=2))
+            else:
+                print(json.dumps(backup.restore_snapshot(args.id, args.db, args.uploads), indent=2))
+        except backup.BackupError as e:
+            print(f"[backup] {e}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Prueba de humo del driver S3 (utils/storage.py): put, exists, list,
+local_copy, url firmada y pública, move y delete contra un bucket.
+
+    python -m scripts.check_storage                      # bucket simulado con moto
+    python -m scripts.check_storage --endpoint http://localhost:9000 \\
+        --bucket slacc-test --access-key minio --secret-key minio123   # MinIO real
+
+Sin --endpoint usa moto (pip install moto), que no está en requirements.txt
+porque solo hace falta para esta prueba. Con --endpoint el bucket debe
+existir; el script solo escribe bajo un prefijo al azar y lo borra al final.
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+from contextlib import nullcontext
+from urllib.parse import parse_qs, urlparse
+
+from app.utils.storage import S3Storage
+
+CONTENT = b"slacc storage check\n"
+
+
+def _staged(content=CONTENT):
+    fd, path = tempfile.mkstemp(prefix="slacc-check-", suffix=".txt")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return path
+
+
+def run_checks(store):
+    """Ejecuta las verificaciones; devuelve la lista de fallas (vacía si todo pasó)."""
+    failures = []
+
+    def check(name, ok):
+        print(f"[check_storage] {'ok   ' if ok else 'FALLA'} {name}")
+        if not ok:
+            failures.append(name)
+
+    path = _staged()
+    store.put(path, "check/a.txt")
+    check("put sube el archivo y borra la copia local", store.exists("check/a.txt") and not os.path.exists(path))
+    check("exists es False para una clave inexistente", not store.exists("check/missing.txt"))
+    check("list devuelve la clave con su tamaño",
+          [(k, size) for k, size, _ in store.list("check/")] == [("check/a.txt", len(CONTENT))])
+    with store.local_copy("check/a.txt") as copy:
+        with open(copy, "rb") as f:
+            check("local_copy descarga el contenido", f.read() == CONTENT)
+    try:
+        with store.local_copy("check/missing.txt"):
+            pass
+        check("local_copy de una clave inexistente da FileNotFoundError", False)
+    except FileNotFoundError:
+        check("local_copy de una clave inexistente da FileNotFoundError", True)
+
+    signed = urlparse(store.url("check/a.txt"))
+    query = parse_qs(signed.query)
+    check("url sin STORAGE_PUBLIC_URL es una URL firmada con vencimiento",
+          signed.path.endswith("/check/a.txt") and "X-Amz-Signature" in query
+          and query.get("X-Amz-Expires") == [str(store.url_ttl)])
+    public_url, store.public_url = store.public_url, "https://cdn.example.com"
+    try:
+        check("url con STORAGE_PUBLIC_URL es la del CDN",
+              store.url("check/a b.txt") == f"https://cdn.example.com/{store.prefix}check/a%20b.txt")
+    finally:
+        store.public_url = public_url
+
+    store.move("check/a.txt", "check/b.txt")
+    check("move copia a la clave nueva y borra la vieja",
+          store.exists("check/b.txt") and not store.exists("check/a.txt"))
+    try:
+        store.move("check/missing.txt", "check/c.txt")
+        check("move de una clave inexistente da FileNotFoundError", False)
+    except FileNotFoundError:
+        check("move de una clave inexistente da FileNotFoundError", True)
+
+    store.delete("check/b.txt")
+    check("delete borra la clave", not store.exists("check/b.txt"))
+    check("delete de una clave inexistente no falla", store.delete("check/b.txt"))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de humo del driver S3")
+    parser.add_argument("--endpoint", help="Endpoint S3 compatible (MinIO, R2); sin él se usa moto")
+    parser.add_argument("--bucket", default="slacc-check")
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument("--access-key", default=os.getenv("S3_ACCESS_KEY_ID", "testing"))
+    parser.add_argument("--secret-key", default=os.getenv("S3_SECRET_ACCESS_KEY", "testing"))
+    args = parser.parse_args(argv)
+
+    if args.endpoint:
+        mock = nullcontext()
+    else:
+        try:
+            from moto import mock_aws
+        except ImportError:
+            raise SystemExit("[check_storage] Sin --endpoint hace falta moto: pip install moto")
+        mock = mock_aws()
+
+    with mock:
+        store = S3Storage(args.bucket, prefix=f"slacc-check-{secrets.token_hex(4)}",
+                          endpoint_url=args.endpoint, region=args.region,
+                          access_key_id=args.access_key, secret_access_key=args.secret_key)
+        if not args.endpoint:
+            store.client.create_bucket(Bucket=args.bucket)
+        failures = run_checks(store)
+
+    if failures:
+        print(f"[check_storage] {len(failures)} verificaciones fallaron.")
+        return 1
+    print("[check_storage] Driver S3 OK.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
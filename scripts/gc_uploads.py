@@ -0,0 +1,60 @@
+"""
+GC de archivos subidos que ya no referencia ningún registro.
+
+    python -m scripts.gc_uploads                 # pasada completa: cuarentena + purga
+    python -m scripts.gc_uploads --dry-run       # solo listar huérfanos
+    python -m scripts.gc_uploads --report        # uso por categoría frente a la cuota
+    python -m scripts.gc_uploads --restore KEY   # sacar un archivo de cuarentena
+
+Los workers ya corren un lote cada GC_INTERVAL segundos; este script sirve
+para forzar una pasada o revisar antes de activar el GC.
+"""
+import argparse
+import json
+import sys
+
+from app import create_app
+from app.utils import upload_gc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GC de archivos subidos huérfanos")
+    parser.add_argument("--report", action="store_true", help="Mostrar uso por categoría y salir")
+    parser.add_argument("--dry-run", action="store_true", help="Listar huérfanos sin moverlos")
+    parser.add_argument("--restore", metavar="KEY", help="Restaurar un archivo en cuarentena")
+    parser.add_argument("--batch-size", type=int, help="Archivos por lote (default GC_BATCH_SIZE)")
+    parser.add_argument("--min-age", type=int, help="Edad mínima en segundos (default GC_MIN_AGE)")
+    parser.add_argument("--pause", type=float, default=0.1, help="Pausa entre lotes en segundos")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        config = app.config
+        batch_size = args.batch_size or config["GC_BATCH_SIZE"]
+        min_age = config["GC_MIN_AGE"] if args.min_age is None else args.min_age
+        if args.report:
+            print(json.dumps(upload_gc.usage_report(), indent=2, sort_keys=True))
+            return 0
+        if args.restore:
+            upload_gc.restore(args.restore)
+            print(f"[gc_uploads] {args.restore} restaurado.")
+            return 0
+        if args.dry_run:
+            cursor, total = None, 0
+            while True:
+                cursor, summary = upload_gc.sweep_batch(cursor, batch_size, min_age, dry_run=True)
+                total += summary["scanned"]
+                for url in summary["orphans"]:
+                    print(url)
+                if cursor is None:
+                    break
+            print(f"[gc_uploads] {total} archivos revisados.", file=sys.stderr)
+            return 0
+        totals = upload_gc.run_pass(batch_size, min_age, config["GC_QUARANTINE_DAYS"] * 86400, args.pause)
+        print(f"[gc_uploads] {totals['scanned']} revisados, {totals['quarantined']} a cuarentena, "
+              f"{totals['deleted']} borrados, {totals['restored']} restaurados.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
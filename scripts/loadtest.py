@@ -0,0 +1,282 @@
+"""
+HTTP load-test harness.
+
+Boots the app from ``create_app`` against a seeded temporary SQLite database,
+serves it on localhost and drives a weighted mix of read/write traffic from
+many concurrent clients. Prints (or writes) a JSON report with p50/p95/p99
+latency, throughput and error rate per route, and can compare the run
+against a stored baseline. The app's logs go to stderr, so stdout holds
+only the report.
+
+Usage:
+    python -m scripts.loadtest --clients 16 --duration 30 --out run.json
+    python -m scripts.loadtest --baseline baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+SEED_PASSWORD = "loadtest1234"
+
+# (peso, método, plantilla de ruta)
+DEFAULT_MIX = [
+    (40, "GET", "/api/events"),
+    (30, "GET", "/api/news"),
+    (10, "GET", "/api/news/<id>"),
+    (10, "POST", "/api/auth/login"),
+    (10, "POST", "/api/events/<id>/enroll"),
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def seed_database(app, users=50, news=40, events=20, seed=1):
+    """Inserta un dataset sintético pequeño con el generador de seed.py.
+
+    Devuelve solo los fixtures que las rutas aceptan: noticias publicadas,
+    eventos activos con la inscripción abierta y emails de socios activos. Con los demás el tráfico
+    mediría 404 y rechazos en vez de las rutas.
+    """
+    from datetime import datetime
+
+    from sqlalchemy import or_
+
+    from app.extensions import db
+    from app.models.event import Event
+    from app.models.news import News
+    from app.models.user import User
+    from scripts.seed_data import generate
+
+    with app.app_context():
+        created = generate(users=users, news=news, events=events, applications=users // 2,
+                           enrollments=0, seed=seed, password=SEED_PASSWORD, verbose=False)
+        fixtures = {
+            "emails": [email for (email,) in db.session.query(User.email).filter(
+                User.email.in_(created["emails"]), User.is_active.is_(True))],
+            "news_ids": [nid for (nid,) in db.session.query(News.id).filter(
+                News.id.in_(created["news_ids"]), News.status == "published")],
+            "event_ids": [eid for (eid,) in db.session.query(Event.id).filter(
+                Event.id.in_(created["event_ids"]), Event.is_active.is_(True),
+                or_(Event.registration_deadline.is_(None), Event.registration_deadline > datetime.now()))],
+        }
+    empty = [name for name, values in fixtures.items() if not values]
+    if empty:
+        raise SystemExit(f"El dataset no tiene fixtures utilizables para: {', '.join(empty)}; aumente --users/--news/--events")
+    return fixtures
+
+
+def start_server(app):
+    """Sirve la app en localhost en un puerto libre. Devuelve (server, base_url)."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route, elapsed, status):
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            self.statuses[route][str(status)] += 1
+            if status == "error" or status >= 500:
+                self.errors[route] += 1
+
+
+def _client_loop(base_url, fixtures, mix, recorder, deadline, remaining, rng_seed, counter):
+    rng = random.Random(rng_seed)
+    session = requests.Session()
+    weights = [w for w, _, _ in mix]
+    while time.perf_counter() < deadline:
+        if remaining is not None:
+            with counter["lock"]:
+                if counter["left"] <= 0:
+                    return
+                counter["left"] -= 1
+        _, method, template = rng.choices(mix, weights=weights)[0]
+        kwargs = {}
+        if template == "/api/news/<id>":
+            path = f"/api/news/{rng.choice(fixtures['news_ids'])}"
+        elif template == "/api/events/<id>/enroll":
+            with counter["lock"]:
+                counter["enroll"] += 1
+                n = counter["enroll"]
+            path = f"/api/events/{rng.choice(fixtures['event_ids'])}/enroll"
+            kwargs["json"] = {"name": f"Alumno {n}", "email": f"alumno{n}-{rng_seed}@loadtest.local"}
+        elif template == "/api/auth/login":
+            path = template
+            kwargs["json"] = {"email": rng.choice(fixtures["emails"]), "password": SEED_PASSWORD}
+        else:
+            path = template
+        route = f"{method} {template}"
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, base_url + path, timeout=30, **kwargs)
+            status = resp.status_code
+        except requests.RequestException:
+            status = "error"
+        recorder.record(route, time.perf_counter() - start, status)
+
+
+def run_load(base_url, fixtures, clients=8, duration=10.0, requests_total=None, mix=None, seed=1):
+    mix = mix or DEFAULT_MIX
+    recorder = Recorder()
+    counter = {"lock": threading.Lock(), "left": requests_total or 0, "enroll": 0}
+    deadline = time.perf_counter() + (duration if requests_total is None else 10 ** 6)
+    threads = [
+        threading.Thread(
+            target=_client_loop,
+            args=(base_url, fixtures, mix, recorder, deadline, requests_total, seed * 1000 + i, counter),
+            daemon=True,
+        )
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    return build_report(recorder, wall, clients)
+
+
+def build_report(recorder, wall, clients):
+    routes = {}
+    total = 0
+    total_errors = 0
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        count = len(values)
+        errors = recorder.errors.get(route, 0)
+        total += count
+        total_errors += errors
+        routes[route] = {
+            "count": count,
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / wall, 2) if wall else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "mean_ms": round(sum(values) / count * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+            "statuses": dict(recorder.statuses[route]),
+        }
+    return {
+        "clients": clients,
+        "duration_s": round(wall, 3),
+        "total_requests": total,
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "error_rate": round(total_errors / total, 4) if total else 0.0,
+        "routes": routes,
+    }
+
+
+def compare(report, baseline, max_regression=0.2):
+    """Compara p95, throughput y errores por ruta contra un baseline.
+
+    Devuelve (diferencias, regresiones). Una regresión es un p95 o un
+    throughput que empeora más que ``max_regression`` (fracción), o una tasa
+    de error mayor que la del baseline.
+    """
+    diff = {}
+    regressions = []
+    for route, current in report["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base:
+            continue
+        p95_change = (current["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        rps_change = (current["throughput_rps"] - base["throughput_rps"]) / base["throughput_rps"] if base["throughput_rps"] else 0.0
+        diff[route] = {
+            "p95_ms": [base["p95_ms"], current["p95_ms"]],
+            "p95_change": round(p95_change, 4),
+            "throughput_rps": [base["throughput_rps"], current["throughput_rps"]],
+            "throughput_change": round(rps_change, 4),
+            "error_rate": [base["error_rate"], current["error_rate"]],
+        }
+        if p95_change > max_regression:
+            regressions.append(f"{route}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if rps_change < -max_regression:
+            regressions.append(f"{route}: throughput {base['throughput_rps']} -> {current['throughput_rps']} rps")
+        if current["error_rate"] > base["error_rate"]:
+            regressions.append(f"{route}: error rate {base['error_rate']} -> {current['error_rate']}")
+    return diff, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test de la API en localhost")
+    parser.add_argument("--clients", type=int, default=8, help="Clientes concurrentes")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duración en segundos")
+    parser.add_argument("--requests", type=int, default=None, help="Total de requests (ignora --duration)")
+    parser.add_argument("--seed", type=int, default=1, help="Semilla del RNG de tráfico")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--news", type=int, default=40)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--out", help="Escribir el reporte JSON en este archivo")
+    parser.add_argument("--baseline", help="Reporte JSON previo para comparar")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Fracción tolerada de empeoramiento")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="slacc-loadtest-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    # Todos los clientes salen de 127.0.0.1: sin esto el rate limit domina la medición
+    os.environ.setdefault("RATELIMIT_ENABLED", "0")
+    # stdout queda solo para el reporte JSON
+    os.environ.setdefault("LOG_STREAM", "stderr")
+
+    from app import create_app
+
+    app = create_app()
+    fixtures = seed_database(app, users=args.users, news=args.news, events=args.events, seed=args.seed)
+    server, base_url = start_server(app)
+    try:
+        report = run_load(base_url, fixtures, clients=args.clients, duration=args.duration,
+                          requests_total=args.requests, seed=args.seed)
+    finally:
+        server.shutdown()
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        diff, regressions = compare(report, baseline, args.max_regression)
+        report["comparison"] = {"baseline": args.baseline, "routes": diff, "regressions": regressions}
+        if regressions:
+            exit_code = 1
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
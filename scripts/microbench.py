@@ -0,0 +1,392 @@
+"""
+Microbenchmarks for the CPU-heavy pieces in our workers.
+
+Covers model serializers (``Application/Event/News.to_dict`` over thousands
+of rows), the image pipeline (``optimize_image`` across sizes and RGB/RGBA/P
+modes), the format-aware encoder against the old "flatten to JPEG q85"
+path over a corpus of sample images (time, output bytes and chosen format),
+time and peak RSS of the upload path for 12/24/48 MP phone-sized JPEGs
+(full decode + LANCZOS vs. ``encode_image`` with draft + reducing_gap) and upload validation (``validate_image``, ``validate_document``,
+``detect_image_type``). Results are written as JSON and can be checked
+against a baseline with a regression threshold.
+
+Usage:
+    python -m scripts.microbench --out bench.json
+    python -m scripts.microbench --baseline bench.json --threshold 0.15
+    python -m scripts.microbench --only image
+    python -m scripts.microbench --only encoder --corpus ./muestras --budget-kb 300
+    python -m scripts.microbench --only decode
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+IMAGE_SIZES = ((640, 480), (1920, 1080), (4000, 3000))
+IMAGE_MODES = ("RGB", "RGBA", "P")
+# Fotos de teléfono: 12, 24 y 48 MP
+DECODE_SIZES = ((4000, 3000), (6000, 4000), (8000, 6000))
+
+
+def measure(fn, repeat=5, number=1, setup=None):
+    """Ejecuta ``fn`` ``number`` veces por ronda, ``repeat`` rondas.
+
+    ``setup`` (opcional) corre antes de cada llamada y queda fuera del tiempo.
+    Devuelve los tiempos por operación de cada ronda.
+    """
+    rounds = []
+    for _ in range(repeat):
+        elapsed = 0.0
+        for _ in range(number):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            elapsed += time.perf_counter() - start
+        rounds.append(elapsed / number)
+    return rounds
+
+
+def _rss_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return None
+
+
+def _peak_rss_child(fn_name, path):
+    """Corre en un proceso nuevo: pico de RSS (MB) de ``fn_name(path)`` sobre el nivel tras importar."""
+    import app.utils.image_encoder  # noqa: F401  (los imports no cuentan en el pico)
+
+    fn = globals()[fn_name]
+    before = _rss_kb("VmRSS")
+    fn(path)
+    return round((_rss_kb("VmHWM") - before) / 1024, 1)
+
+
+def peak_rss_mb(fn_name, path):
+    """Pico de memoria residente de una llamada, medido en un intérprete nuevo.
+
+    En el mismo proceso el heap ya liberado por rondas anteriores oculta el
+    pico; devuelve None donde /proc no está disponible.
+    """
+    import multiprocessing
+
+    try:
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            return pool.apply(_peak_rss_child, (fn_name, path))
+    except (OSError, TypeError):
+        return None
+
+
+def summarize(rounds, ops_per_call=1):
+    median = statistics.median(rounds)
+    return {
+        "median_s": round(median, 6),
+        "min_s": round(min(rounds), 6),
+        "max_s": round(max(rounds), 6),
+        "rounds": len(rounds),
+        "ops_per_call": ops_per_call,
+        "per_op_us": round(median / ops_per_call * 1e6, 3),
+    }
+
+
+def _make_image(path, size, mode):
+    """Imagen sintética con degradado + ruido (comprime como una foto real)."""
+    from PIL import Image
+
+    base = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    rgb = Image.merge("RGB", (base, noise, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if mode == "RGBA":
+        img = rgb.convert("RGBA")
+        img.putalpha(base)
+        img.save(path, "PNG")
+    elif mode == "P":
+        rgb.convert("P", palette=Image.Palette.ADAPTIVE).save(path, "PNG")
+    else:
+        rgb.save(path, "JPEG", quality=95)
+    return path
+
+
+def bench_serializers(results, workdir, rows, repeat):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+
+    from app import create_app
+    from app.extensions import db
+    from app.models.application import Application, ApplicationAttachment
+    from app.models.event import Event
+    from app.models.news import News
+    from scripts.seed_data import generate
+
+    app = create_app()
+    with app.app_context():
+        generate(users=max(10, rows // 10), news=rows, events=rows, applications=rows,
+                 enrollments=0, seed=7, verbose=False)
+        db.session.execute(ApplicationAttachment.__table__.insert(), [
+            {"application_id": i, "file_url": f"/uploads/doc-{i}.pdf"} for i in range(1, rows + 1)
+        ])
+        db.session.commit()
+
+        for name, model in (("Application", Application), ("Event", Event), ("News", News)):
+            holder = {}
+
+            def setup(model=model, holder=holder):
+                # Filas recién cargadas en cada ronda, como en una request nueva;
+                # los lazy loads que dispare to_dict() sí quedan dentro del tiempo.
+                db.session.expunge_all()
+                holder["items"] = model.query.all()
+
+            def run(holder=holder):
+                for item in holder["items"]:
+                    item.to_dict()
+
+            rounds = measure(run, repeat=repeat, setup=setup)
+            results[f"serializer.{name}.to_dict[{rows}]"] = summarize(rounds, rows)
+
+
+def bench_images(results, workdir, repeat):
+    from app.utils.image_processing import optimize_image
+
+    src_dir = os.path.join(workdir, "images")
+    os.makedirs(src_dir, exist_ok=True)
+    for size in IMAGE_SIZES:
+        for mode in IMAGE_MODES:
+            ext = "jpg" if mode == "RGB" else "png"
+            src = _make_image(os.path.join(src_dir, f"src-{size[0]}x{size[1]}-{mode}.{ext}"), size, mode)
+            target = os.path.join(src_dir, f"work.{ext}")
+
+            def setup(src=src, target=target):
+                shutil.copyfile(src, target)
+
+            rounds = measure(lambda target=target: optimize_image(target), repeat=repeat, setup=setup)
+            results[f"image.optimize_image[{size[0]}x{size[1]},{mode}]"] = summarize(rounds)
+
+
+def _make_corpus(directory):
+    """Muestras sintéticas: foto, foto con transparencia, gráfico plano y captura."""
+    from PIL import Image, ImageDraw
+
+    _make_image(os.path.join(directory, "photo.jpg"), (3000, 2000), "RGB")
+    _make_image(os.path.join(directory, "photo-alpha.png"), (1600, 1200), "RGBA")
+
+    logo = Image.new("RGBA", (1200, 1200), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse((100, 100, 1100, 1100), fill=(20, 70, 140, 255))
+    draw.rectangle((450, 300, 750, 900), fill=(255, 255, 255, 255))
+    logo.save(os.path.join(directory, "logo.png"), "PNG")
+
+    shot = Image.new("RGB", (1920, 1080), (245, 245, 245))
+    draw = ImageDraw.Draw(shot)
+    draw.rectangle((0, 0, 1920, 64), fill=(30, 30, 30))
+    for row in range(40):
+        y = 100 + row * 24
+        draw.text((40, y), f"Fila {row}: lorem ipsum dolor sit amet " * 3, fill=(40, 40, 40))
+    shot.save(os.path.join(directory, "screenshot.png"), "PNG")
+
+
+def _legacy_optimize(path, max_width=1920, max_height=1080, quality=85):
+    """El optimize_image anterior: aplana a RGB y guarda JPEG q85 sobre el original."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        if img.mode in ("RGBA", "LA", "P"):
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            if img.mode == "P":
+                img = img.convert("RGBA")
+            background.paste(img, mask=img.split()[-1] if img.mode in ("RGBA", "LA") else None)
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        if img.width > max_width or img.height > max_height:
+            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+        img.save(path, "JPEG", quality=quality, optimize=True)
+    return path
+
+
+def bench_encoder(results, workdir, repeat, corpus=None, budget_kb=350):
+    from app.utils.image_encoder import encode_image
+
+    if not corpus:
+        corpus = os.path.join(workdir, "corpus")
+        os.makedirs(corpus, exist_ok=True)
+        _make_corpus(corpus)
+    budget = budget_kb * 1024 if budget_kb else None
+    scratch = os.path.join(workdir, "encoder")
+    os.makedirs(scratch, exist_ok=True)
+
+    for name in sorted(os.listdir(corpus)):
+        src = os.path.join(corpus, name)
+        if name.startswith(".") or not os.path.isfile(src):
+            continue
+        ext = os.path.splitext(name)[1]
+        source_bytes = os.path.getsize(src)
+        target = os.path.join(scratch, f"work{ext}")
+        last = {}
+
+        def setup(src=src, target=target):
+            for leftover in os.listdir(scratch):
+                os.remove(os.path.join(scratch, leftover))
+            shutil.copyfile(src, target)
+
+        def legacy(target=target):
+            last["path"] = _legacy_optimize(target)
+
+        def encoder(target=target):
+            result, _ = encode_image(target, byte_budget=budget)
+            last["path"], last["result"] = result.path, result
+
+        try:
+            rounds = measure(legacy, repeat=repeat, setup=setup)
+        except OSError as e:
+            print(f"[microbench] {name}: {e}", file=sys.stderr)
+            continue
+        entry = summarize(rounds)
+        entry.update(source_bytes=source_bytes, bytes=os.path.getsize(last["path"]), format="JPEG")
+        results[f"encoder.legacy_jpeg[{name}]"] = entry
+
+        entry = summarize(measure(encoder, repeat=repeat, setup=setup))
+        result = last["result"]
+        entry.update(source_bytes=source_bytes, bytes=result.bytes, format=result.format, quality=result.quality)
+        results[f"encoder.encode_image[{name}]"] = entry
+
+
+def _full_decode_optimize(path, max_width=1920, max_height=1080, quality=85):
+    """Decodifica a tamaño completo (lo que hace exif_transpose sin draft) y reduce con LANCZOS."""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as img:
+        img.load()
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS, reducing_gap=None)
+        img.save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+    return path
+
+
+def _encode_image(path):
+    from app.utils.image_encoder import encode_image
+
+    return encode_image(path)
+
+
+def bench_decode(results, workdir, repeat):
+    from PIL import Image
+
+    src_dir = os.path.join(workdir, "decode")
+    os.makedirs(src_dir, exist_ok=True)
+    for size in DECODE_SIZES:
+        mp = size[0] * size[1] // 1_000_000
+        src = os.path.join(src_dir, f"phone-{mp}mp.jpg")
+        # Ruido suave: los bytes de una foto real sin tardar en generar 48 MP
+        noise = Image.effect_noise((size[0] // 8, size[1] // 8), 30).resize(size, Image.Resampling.BILINEAR)
+        Image.merge("RGB", (noise, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise)).save(src, "JPEG", quality=92)
+        target = os.path.join(src_dir, "work.jpg")
+
+        def setup(src=src, target=target):
+            shutil.copyfile(src, target)
+
+        cases = {"full_decode": "_full_decode_optimize", "draft_reducing_gap": "_encode_image"}
+        for name, fn_name in cases.items():
+            fn = globals()[fn_name]
+            entry = summarize(measure(lambda fn=fn, target=target: fn(target), repeat=repeat, setup=setup))
+            setup()
+            entry["peak_rss_mb"] = peak_rss_mb(fn_name, target)
+            results[f"decode.{name}[{mp}MP]"] = entry
+
+
+def bench_validation(results, workdir, repeat, number=2000):
+    from app.utils.file_validation import detect_image_type, validate_document, validate_image
+
+    files_dir = os.path.join(workdir, "files")
+    os.makedirs(files_dir, exist_ok=True)
+    jpg = _make_image(os.path.join(files_dir, "photo.jpg"), (640, 480), "RGB")
+    png = _make_image(os.path.join(files_dir, "graphic.png"), (640, 480), "P")
+    pdf = os.path.join(files_dir, "doc.pdf")
+    with open(pdf, "wb") as f:
+        f.write(b"%PDF-1.4\n" + os.urandom(256 * 1024))
+
+    cases = {
+        "validation.detect_image_type[jpg]": lambda: detect_image_type(jpg),
+        "validation.validate_image[jpg]": lambda: validate_image(jpg),
+        "validation.validate_image[png]": lambda: validate_image(png),
+        "validation.validate_document[pdf]": lambda: validate_document(pdf),
+    }
+    for name, fn in cases.items():
+        results[name] = summarize(measure(fn, repeat=repeat, number=number))
+
+
+def check_regressions(results, baseline, threshold):
+    """Lista de benchmarks cuya mediana empeoró más que ``threshold`` (fracción)."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_s"):
+            continue
+        change = (current["median_s"] - base["median_s"]) / base["median_s"]
+        current["baseline_median_s"] = base["median_s"]
+        current["change"] = round(change, 4)
+        if change > threshold:
+            regressions.append(f"{name}: {base['median_s']}s -> {current['median_s']}s (+{change:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks de serializers, imágenes y validación")
+    parser.add_argument("--only", choices=("serializers", "image", "encoder", "decode", "validation"), action="append",
+                        help="Ejecutar solo estos grupos (repetible)")
+    parser.add_argument("--rows", type=int, default=2000, help="Filas por modelo para los serializers")
+    parser.add_argument("--corpus", help="Directorio con imágenes de muestra para el grupo encoder")
+    parser.add_argument("--budget-kb", type=int, default=350, help="Presupuesto de bytes del encoder (0 = sin objetivo)")
+    parser.add_argument("--repeat", type=int, default=5, help="Rondas por benchmark")
+    parser.add_argument("--out", help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", help="Resultados previos para comparar")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Empeoramiento tolerado (fracción)")
+    args = parser.parse_args(argv)
+
+    groups = args.only or ["serializers", "image", "encoder", "decode", "validation"]
+    workdir = tempfile.mkdtemp(prefix="slacc-microbench-")
+    results = {}
+    try:
+        if "serializers" in groups:
+            bench_serializers(results, workdir, args.rows, args.repeat)
+        if "image" in groups:
+            bench_images(results, workdir, args.repeat)
+        if "encoder" in groups:
+            bench_encoder(results, workdir, args.repeat, args.corpus, args.budget_kb)
+        if "decode" in groups:
+            bench_decode(results, workdir, args.repeat)
+        if "validation" in groups:
+            bench_validation(results, workdir, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = check_regressions(results, json.load(f), args.threshold)
+        report["regressions"] = regressions
+        if regressions:
+            exit_code = 1
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
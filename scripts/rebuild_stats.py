@@ -0,0 +1,8 @@
+from app import create_app
+from app.utils.stats import rebuild_stats
+
+app = create_app()
+
+with app.app_context():
+    rows = rebuild_stats()
+    print(f"[rebuild_stats] {rows} filas de resumen recalculadas.")
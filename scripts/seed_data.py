@@ -0,0 +1,277 @@
+"""
+Parameterised synthetic data generator.
+
+Inserts users, news, events, applications and enrollments with bulk Core
+``INSERT`` statements in batches, a single precomputed password hash and a
+deterministic RNG, so the same arguments always produce the same dataset.
+Existing rows are kept (new ids continue after the current maximum) unless
+``--reset`` is given.
+
+Usage:
+    python seed.py --users 100000 --events 2000 --enrollments 1000000
+    python seed.py --reset            # drop_all + dataset pequeño por defecto
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from werkzeug.security import generate_password_hash
+
+DEFAULT_PASSWORD = "demo1234"
+
+FIRST_NAMES = ("Carlos", "Ana", "Jorge", "María", "Pedro", "Lucía", "Javier", "Sofía", "Enrique",
+               "Gabriela", "Ricardo", "Carla", "Felipe", "Valentina", "Roberto", "Andrés", "Isabel")
+LAST_NAMES = ("López", "García", "Silva", "Fernández", "Morales", "Ramírez", "Herrera", "Mendoza",
+              "Moreno", "Ortiz", "Fuentes", "Vásquez", "González", "Rodríguez", "Díaz", "Martínez")
+CITIES = (("Santiago", "Chile"), ("Buenos Aires", "Argentina"), ("Ciudad de México", "México"),
+          ("Bogotá", "Colombia"), ("Lima", "Perú"), ("São Paulo", "Brasil"), ("Madrid", "España"))
+SPECIALIZATIONS = ("Artroplastia de cadera", "Trauma de cadera", "Cirugía de preservación",
+                   "Complicaciones de cadera", "Biomecánica de implantes")
+NEWS_CATEGORIES = ("articulos-cientificos", "articulos-destacados", "editoriales")
+MEMBERSHIP_TYPES = ("normal", "normal", "joven", "gratuito")
+APPLICATION_STATUSES = ("pending", "payment_pending", "paid", "paid", "rejected")
+ENROLLMENT_STATUSES = ("paid", "paid", "pending", "cancelled")
+LOREM = ("Contenido detallado sobre técnicas quirúrgicas, resultados clínicos y experiencia "
+         "multicéntrica en el manejo de patología de cadera. ")
+
+
+def _next_id(model):
+    from app.extensions import db
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _insert_batches(model, rows_iter, total, batch_size, label, verbose=True):
+    """Inserta filas generadas por ``rows_iter`` en lotes de ``batch_size``."""
+    from app.extensions import db
+
+    table = model.__table__
+    batch = []
+    done = 0
+    started = time.perf_counter()
+    for row in rows_iter:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            done += len(batch)
+            batch = []
+            if verbose:
+                print(f"  {label}: {done}/{total}", end="\r", flush=True)
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        done += len(batch)
+    if total and verbose:
+        print(f"  {label}: {done}/{total} en {time.perf_counter() - started:.1f}s")
+    return done
+
+
+def _person(rng):
+    return f"{rng.choice(('Dr.', 'Dra.'))} {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def generate(users=6, news=6, events=6, applications=6, enrollments=8, seed=42,
+             password=DEFAULT_PASSWORD, batch_size=5000, admin_email=None, verbose=True):
+    """Genera el dataset dentro del app context actual.
+
+    Devuelve un dict con los ids y emails creados (útil para load tests).
+    """
+    from app.extensions import db
+    from app.models.application import Application
+    from app.models.event import Event, EventEnrollment
+    from app.models.news import News
+    from app.models.user import User
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    password_hash = generate_password_hash(password)
+
+    first_user = _next_id(User)
+    user_ids = range(first_user, first_user + users)
+    emails = [f"socio{uid}@example.com" for uid in user_ids]
+
+    def user_rows():
+        for uid, email in zip(user_ids, emails):
+            yield {
+                "id": uid,
+                "email": email,
+                "name": _person(rng),
+                "password_hash": password_hash,
+                "role": "member",
+                "membership_type": rng.choice(MEMBERSHIP_TYPES),
+                "is_active": rng.random() > 0.1,
+                "payment_status": rng.choices(("paid", "due", "none"), weights=(70, 25, 5))[0],
+                "auto_payment_enabled": False,
+                "created_at": now - timedelta(days=rng.randint(0, 1500)),
+            }
+
+    _insert_batches(User, user_rows(), users, batch_size, "usuarios", verbose)
+
+    if admin_email and not User.query.filter_by(email=admin_email).first():
+        admin = User()
+        admin.email = admin_email
+        admin.name = "Admin"
+        admin.password_hash = generate_password_hash(os.getenv("OWNER_INITIAL_PASSWORD", "admin1234"))
+        admin.role = "admin"
+        admin.is_active = True
+        admin.payment_status = "paid"
+        db.session.add(admin)
+        db.session.commit()
+
+    first_news = _next_id(News)
+    news_ids = range(first_news, first_news + news)
+
+    def news_rows():
+        for i, nid in enumerate(news_ids):
+            yield {
+                "id": nid,
+                "title": f"{rng.choice(SPECIALIZATIONS)}: revisión {nid}",
+                "excerpt": f"Resumen de la publicación {nid} sobre {rng.choice(SPECIALIZATIONS).lower()}",
+                "content": LOREM * rng.randint(3, 30),
+                "image_url": None,
+                "status": rng.choices(("published", "pending", "rejected"), weights=(80, 15, 5))[0],
+                "order_index": i,
+                "category": rng.choice(NEWS_CATEGORIES),
+                "created_by_user_id": rng.choice(user_ids) if users else None,
+                "created_at": now - timedelta(days=rng.randint(0, 1500)),
+            }
+
+    _insert_batches(News, news_rows(), news, batch_size, "noticias", verbose)
+
+    first_event = _next_id(Event)
+    event_ids = range(first_event, first_event + events)
+    event_prices = {}
+
+    def event_rows():
+        for eid in event_ids:
+            start = now + timedelta(days=rng.randint(-700, 180), hours=rng.randint(8, 20))
+            hours = rng.choice((1, 2, 4, 8, 24))
+            price_member = float(rng.choice((0, 30, 50, 100, 400)))
+            event_prices[eid] = (price_member, price_member * 2)
+            yield {
+                "id": eid,
+                "title": f"{rng.choice(('Webinar', 'Curso', 'Taller', 'Congreso'))}: {rng.choice(SPECIALIZATIONS)}",
+                "description": f"Actividad formativa {eid}",
+                "content": LOREM * rng.randint(1, 5),
+                "instructor": _person(rng),
+                "duration_hours": hours,
+                "format": rng.choice(("webinar", "presencial")),
+                "location": rng.choice(CITIES)[0],
+                "max_students": rng.choice((None, 20, 30, 100, 500)),
+                "price_member": price_member,
+                "price_non_member": price_member * 2,
+                "price_joven": price_member / 2,
+                "price_gratuito": 0.0,
+                "start_date": start,
+                "end_date": start + timedelta(hours=hours),
+                "registration_deadline": start - timedelta(days=2),
+                "is_active": rng.random() > 0.05,
+                "image_url": None,
+                "created_at": start - timedelta(days=60),
+                "updated_at": start - timedelta(days=60),
+            }
+
+    _insert_batches(Event, event_rows(), events, batch_size, "eventos", verbose)
+
+    first_application = _next_id(Application)
+
+    def application_rows():
+        for aid in range(first_application, first_application + applications):
+            status = rng.choice(APPLICATION_STATUSES)
+            city, country = rng.choice(CITIES)
+            created = now - timedelta(days=rng.randint(0, 1500))
+            yield {
+                "id": aid,
+                "name": _person(rng),
+                "email": f"postulante{aid}@example.com",
+                "city": city,
+                "country": country,
+                "specialization": rng.choice(SPECIALIZATIONS),
+                "motivation": "Deseo unirme para ampliar mis conocimientos y conectar con colegas",
+                "experience_years": rng.randint(1, 35),
+                "membership_type": rng.choice(MEMBERSHIP_TYPES),
+                "status": status,
+                "resolution_note": None if status == "pending" else "Resuelto",
+                "decided_at": None if status == "pending" else created + timedelta(days=rng.randint(1, 30)),
+                "created_at": created,
+            }
+
+    _insert_batches(Application, application_rows(), applications, batch_size, "postulaciones", verbose)
+
+    # Cada (evento, alumno) es único: la inscripción k va al evento k % events
+    # y al alumno k // events, así no se repiten pares.
+    first_enrollment = _next_id(EventEnrollment)
+
+    def enrollment_rows():
+        if not events:
+            return
+        for k in range(enrollments):
+            eid = event_ids[k % events]
+            student = k // events
+            is_member = users > 0 and student < users and rng.random() > 0.3
+            price_member, price_non_member = event_prices.get(eid, (0.0, 0.0))
+            status = rng.choice(ENROLLMENT_STATUSES)
+            enrolled = now - timedelta(days=rng.randint(0, 700))
+            yield {
+                "id": first_enrollment + k,
+                "event_id": eid,
+                "user_id": user_ids[student] if is_member else None,
+                "student_name": _person(rng),
+                "student_email": emails[student] if is_member else f"alumno{student}@example.com",
+                "student_phone": f"+56 9 {rng.randint(1000, 9999)} {rng.randint(1000, 9999)}",
+                "payment_status": status,
+                "payment_amount": price_member if is_member else price_non_member,
+                "membership_type": rng.choice(MEMBERSHIP_TYPES) if is_member else None,
+                "is_member": is_member,
+                "enrollment_date": enrolled,
+                "payment_date": enrolled + timedelta(days=1) if status == "paid" else None,
+            }
+
+    _insert_batches(EventEnrollment, enrollment_rows(), enrollments, batch_size, "inscripciones", verbose)
+
+    # Los inserts Core no pasan por el ORM: recalcular los agregados del dashboard
+    from app.utils.stats import rebuild_stats
+    rebuild_stats()
+
+    return {
+        "emails": emails,
+        "user_ids": list(user_ids),
+        "news_ids": list(news_ids),
+        "event_ids": list(event_ids),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de datos sintéticos para SLACC")
+    parser.add_argument("--users", type=int, default=6)
+    parser.add_argument("--news", type=int, default=6)
+    parser.add_argument("--events", type=int, default=6)
+    parser.add_argument("--applications", type=int, default=6)
+    parser.add_argument("--enrollments", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42, help="Semilla del RNG (dataset determinista)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Contraseña de todos los socios generados")
+    parser.add_argument("--admin-email", default=os.getenv("OWNER_EMAIL", "danteparodi@slacc.info"))
+    parser.add_argument("--reset", action="store_true", help="Ejecutar drop_all/create_all antes de insertar")
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+        started = time.perf_counter()
+        generate(users=args.users, news=args.news, events=args.events, applications=args.applications,
+                 enrollments=args.enrollments, seed=args.seed, password=args.password,
+                 batch_size=args.batch_size, admin_email=args.admin_email)
+        print(f"✓ Base de datos sembrada en {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
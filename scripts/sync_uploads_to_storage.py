@@ -0,0 +1,28 @@
+"""
+Copia al backend configurado (STORAGE_BACKEND) los archivos de UPLOAD_DIR
+que referencian noticias, eventos y postulaciones. Se usa una vez al pasar
+de local a s3; las claves que ya existen en destino se saltan.
+
+    STORAGE_BACKEND=s3 S3_BUCKET=... python -m scripts.sync_uploads_to_storage
+"""
+from app import create_app
+from app.models.application import ApplicationAttachment
+from app.models.event import Event
+from app.models.news import News
+from app.utils import storage
+
+app = create_app()
+
+with app.app_context():
+    target = storage.get_storage()
+    if target.serves_files:
+        raise SystemExit("[sync_uploads_to_storage] STORAGE_BACKEND es local: nada que copiar.")
+    urls = [u for (u,) in News.query.with_entities(News.image_url)]
+    urls += [u for (u,) in Event.query.with_entities(Event.image_url)]
+    urls += [u for (u,) in ApplicationAttachment.query.with_entities(ApplicationAttachment.file_url)]
+    keys = sorted({storage.key_from_url(u) for u in urls} - {None})
+    pending = [k for k in keys if not target.exists(k)]
+    copied, failed = storage.copy_tree(storage.LocalStorage(app.config["UPLOAD_DIR"]), target, pending)
+    print(f"[sync_uploads_to_storage] {copied} copiados, {len(keys) - len(pending)} ya estaban.")
+    for key, error in failed:
+        print(f"[sync_uploads_to_storage] {key}: {error}")